@@ -0,0 +1,463 @@
+"""PDF阅读器性能基准测试
+
+在本地生成合成PDF（文字密集、矢量图形密集、大尺寸扫描图片、上万页文档），
+不需要显示设备，直接调用pdf_core测量各阶段耗时（打开、光栅化、同一页的重复渲染、编码、磁盘缓存，
+可选纹理上传）的p50/p95、峰值内存和模拟阅读时的缓存命中率，以及新进程中的冷启动耗时，以JSON输出。
+指定基准文件时与之比较，有性能退化时返回非零退出码。
+
+用法:
+    python benchmark.py                          # 运行全部测试，输出JSON
+    python benchmark.py --quick                  # 缩小规模，快速检查
+    python benchmark.py --save-baseline          # 把结果保存为基准
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.25
+    python benchmark.py --texture                # 同时测量纹理上传（需要Kivy和显示环境）
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from pdf_core import (
+    CacheKey, PageCache, DiskPageCache, PageImage, PrefetchPlanner, DisplayListCache,
+    open_document, render_page_image, fit_zoom, half_page_region,
+)
+
+try:
+    import resource
+except ImportError:
+    # Windows没有resource模块，不统计峰值内存
+    resource = None
+
+# 合成文档的生成方式变化时递增，旧的文档会重新生成
+GENERATOR_VERSION = 1
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# 模拟的显示区域（手机竖屏的页面区域，像素）
+VIEW_SIZE = (1040, 1500)
+
+LOREM = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud '
+         'exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. ')
+
+# 文档名: (完整规模页数, 快速模式页数)
+DOCUMENTS = {
+    'text_heavy': (200, 50),
+    'vector_heavy': (100, 30),
+    'scanned': (20, 5),
+    'long_10k': (10000, 2000),
+}
+
+
+def generate_text_heavy(path, pages):
+    """每页排满小号文字"""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = f'Chapter {page_num // 20 + 1}, page {page_num + 1}\n' + LOREM * 40
+        page.insert_textbox(fitz.Rect(36, 36, page.rect.width - 36, page.rect.height - 36),
+                            text, fontsize=7)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def generate_vector_heavy(path, pages):
+    """每页数千条线段、曲线和填充图形（类似工程图纸）"""
+    rng = random.Random(1)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=1191, height=842)  # A3横向
+        shape = page.new_shape()
+        for i in range(800):
+            p1 = fitz.Point(rng.uniform(0, 1191), rng.uniform(0, 842))
+            p2 = fitz.Point(rng.uniform(0, 1191), rng.uniform(0, 842))
+            if i % 3 == 0:
+                shape.draw_bezier(p1, fitz.Point(p1.x + 40, p2.y), fitz.Point(p2.x, p1.y + 40), p2)
+            else:
+                shape.draw_line(p1, p2)
+        shape.finish(color=(0, 0, 0), width=0.3)
+        for i in range(150):
+            x, y = rng.uniform(0, 1150), rng.uniform(0, 800)
+            shape.draw_rect(fitz.Rect(x, y, x + rng.uniform(5, 40), y + rng.uniform(5, 40)))
+            shape.finish(color=(0.2, 0.2, 0.6), fill=(rng.random(), rng.random(), rng.random()))
+        shape.commit()
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def generate_scanned(path, pages):
+    """每页一张300dpi的A4灰度扫描图片"""
+    width, height = 2480, 3508
+    rng = random.Random(2)
+    doc = fitz.open()
+    for page_num in range(pages):
+        # 纸张底色加上随机的“文字行”和噪点
+        row = bytearray(b'\xf0' * width)
+        rows = []
+        for y in range(height):
+            if (y // 40) % 2 == 0 and y % 40 > 12:
+                line = bytearray(row)
+                for x in range(rng.randrange(200, 400), width - 200, rng.randrange(9, 15)):
+                    line[x:x + 6] = b'\x20' * 6
+                rows.append(bytes(line))
+            else:
+                rows.append(bytes(row))
+        pix = fitz.Pixmap(fitz.csGRAY, width, height, b''.join(rows), False)
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=pix.tobytes('jpeg'))
+    doc.save(path)
+    doc.close()
+
+
+def generate_long(path, pages):
+    """上万页的短文档，测试打开速度和页面索引"""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f'Page {page_num + 1}', fontsize=14)
+        page.insert_text((72, 100), LOREM[:90], fontsize=10)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+GENERATORS = {
+    'text_heavy': generate_text_heavy,
+    'vector_heavy': generate_vector_heavy,
+    'scanned': generate_scanned,
+    'long_10k': generate_long,
+}
+
+
+def ensure_document(workdir, name, pages):
+    """生成（或复用已生成的）合成文档"""
+    path = os.path.join(workdir, f'{name}_{pages}_v{GENERATOR_VERSION}.pdf')
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        GENERATORS[name](path + '.tmp', pages)
+        os.replace(path + '.tmp', path)
+        print(f'生成 {os.path.basename(path)}: {time.perf_counter() - started:.1f} s', file=sys.stderr)
+    return path
+
+
+def percentile(values, fraction):
+    """最近秩法的百分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """毫秒耗时列表 → p50/p95"""
+    return {
+        'n': len(samples),
+        'p50_ms': round(percentile(samples, 0.5), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+    }
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def simulate_reading(doc, turns, render_ms, budget_bytes, seed=3):
+    """模拟一次阅读过程，统计页面缓存和预取的命中率
+
+    大部分时间向后翻页，偶尔回翻或跳转；两次翻页之间按实测的单页渲染耗时
+    估算后台能完成多少预取。
+    """
+    rng = random.Random(seed)
+    cache = PageCache(budget_bytes)
+    planner = PrefetchPlanner()
+    total_pages = len(doc)
+    now = 0.0
+    page_num = 0
+
+    def key_for(page):
+        rect = doc[page].rect
+        return CacheKey(page, None, fit_zoom(rect.width, rect.height, VIEW_SIZE), 'rgb')
+
+    for turn in range(turns):
+        key = key_for(page_num)
+        cached = cache.get(key) is not None
+        planner.note_display(page_num, cached)
+        if not cached:
+            cache.put(key, render_page_image(doc, key))
+        cache.pin_pages(range(page_num - 1, page_num + 2))
+
+        interval = rng.uniform(0.3, 4.0)
+        budget_ms = interval * 1000
+        for prefetch_page, priority in planner.plan(page_num, total_pages, now=now):
+            if budget_ms < render_ms:
+                break
+            prefetch_key = key_for(prefetch_page)
+            if prefetch_key not in cache:
+                planner.note_prefetch(prefetch_page)
+                cache.put(prefetch_key, render_page_image(doc, prefetch_key))
+                budget_ms -= render_ms
+
+        now += interval
+        roll = rng.random()
+        if roll < 0.85:
+            direction = 1
+        elif roll < 0.97:
+            direction = -1
+        else:
+            # 跳转到随机位置
+            page_num = rng.randrange(total_pages)
+            continue
+        next_page = page_num + direction
+        if 0 <= next_page < total_pages:
+            planner.record_turn(direction, now=now)
+            page_num = next_page
+
+    stats = cache.stats()
+    return {
+        'page_cache_hit_ratio': round(stats['hit_ratio'], 4),
+        'evictions': stats['evictions'],
+        'prefetch': dict((k, round(v, 4) if isinstance(v, float) else v)
+                         for k, v in planner.stats().items()),
+    }
+
+
+def benchmark_document(path, samples, opens, disk_dir, texture_upload=None):
+    """测量一个文档各阶段的耗时"""
+    open_times = []
+    for i in range(opens):
+        started = time.perf_counter()
+        doc = open_document(path)
+        # 访问最后一页，包含页面树的加载
+        doc[len(doc) - 1].rect
+        open_times.append((time.perf_counter() - started) * 1000)
+        doc.close()
+
+    doc = open_document(path)
+    page_count = len(doc)
+    rng = random.Random(4)
+    pages = sorted(rng.sample(range(page_count), min(samples, page_count)))
+
+    disk_cache = DiskPageCache(disk_dir, 256 * 1024 * 1024)
+    stages = {'rasterize': [], 'rerender': [], 'encode': [], 'disk_write': [],
+              'disk_read': [], 'texture_upload': []}
+    # 与渲染线程相同：只有灰度内容的页面按8位灰度渲染
+    display_lists = DisplayListCache(detect_gray=True)
+    for page_num in pages:
+        rect = doc[page_num].rect
+        key = CacheKey(page_num, None, fit_zoom(rect.width, rect.height, VIEW_SIZE), 'rgb')
+        pix, elapsed = timed(doc[page_num].get_pixmap, matrix=fitz.Matrix(key.zoom, key.zoom))
+        stages['rasterize'].append(elapsed)
+
+        # 同一页的其他版本（低分辨率预览、左右半页、放大的瓦片）从显示列表渲染
+        display_lists.get(doc, page_num)
+        variants = [
+            key._replace(zoom=key.zoom * 0.3),
+            key._replace(clip=tuple(half_page_region(rect, 'left'))),
+            key._replace(clip=tuple(half_page_region(rect, 'right'))),
+            key._replace(zoom=key.zoom * 2, clip=(0, 0, rect.width / 2, rect.height / 4)),
+        ]
+        started = time.perf_counter()
+        for variant in variants:
+            render_page_image(doc, variant, display_lists=display_lists)
+        stages['rerender'].append((time.perf_counter() - started) * 1000)
+
+        # 紧凑缓存格式（PNG）的编码耗时
+        compact, elapsed = timed(PageImage.from_pixmap, pix, compact=True)
+        stages['encode'].append(elapsed)
+
+        img_data = PageImage.from_pixmap(pix)
+        ok, elapsed = timed(disk_cache.put, 'bench', key, img_data)
+        stages['disk_write'].append(elapsed)
+        cached, elapsed = timed(disk_cache.get, 'bench', key)
+        stages['disk_read'].append(elapsed)
+
+        if texture_upload:
+            texture, elapsed = timed(texture_upload, img_data)
+            stages['texture_upload'].append(elapsed)
+
+    result = {
+        'pages': page_count,
+        'stages': {'open': summarize(open_times)},
+    }
+    for stage, values in stages.items():
+        if values:
+            result['stages'][stage] = summarize(values)
+
+    render_ms = result['stages']['rasterize']['p50_ms']
+    result['cache'] = simulate_reading(doc, turns=60, render_ms=render_ms,
+                                       budget_bytes=96 * 1024 * 1024)
+    doc.close()
+    return result
+
+
+# 冷启动测量：在新的Python进程中导入pdf_core，再打开文档并渲染第一页
+STARTUP_SCRIPT = '''
+import sys, time
+started = time.perf_counter()
+import pdf_core
+imported = time.perf_counter()
+doc = pdf_core.open_document(sys.argv[1])
+rect = doc[0].rect
+zoom = pdf_core.fit_zoom(rect.width, rect.height, (int(sys.argv[2]), int(sys.argv[3])))
+pdf_core.render_page_image(doc, pdf_core.CacheKey(0, None, zoom, 'rgb'))
+print((imported - started) * 1000, (time.perf_counter() - imported) * 1000)
+'''
+
+
+def benchmark_startup(path, runs):
+    """测量冷启动（每次一个新进程）：导入pdf_core的耗时和打开文档到第一页渲染完成的耗时"""
+    stages = {'import_core': [], 'first_page': []}
+    for i in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, path, str(VIEW_SIZE[0]), str(VIEW_SIZE[1])],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, check=True, universal_newlines=True
+        ).stdout
+        import_ms, first_page_ms = (float(value) for value in output.split()[-2:])
+        stages['import_core'].append(import_ms)
+        stages['first_page'].append(first_page_ms)
+    return {'stages': dict((stage, summarize(values)) for stage, values in stages.items())}
+
+
+def load_texture_upload():
+    """纹理上传需要Kivy窗口（OpenGL环境），不可用时返回None"""
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    try:
+        from main import create_page_texture
+        return create_page_texture
+    except Exception as e:
+        print(f'无法测量纹理上传: {e}', file=sys.stderr)
+        return None
+
+
+def compare_stages(name, stages, base_stages, tolerance, min_delta_ms):
+    regressions = []
+    for stage, summary in stages.items():
+        base = base_stages.get(stage)
+        if not base:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            current, previous = summary[metric], base[metric]
+            if current > previous * (1 + tolerance) and current - previous > min_delta_ms:
+                regressions.append(f'{name}.{stage}.{metric}: {previous} -> {current}')
+    return regressions
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """与基准比较，返回退化项列表"""
+    regressions = []
+    if results.get('startup') and baseline.get('startup'):
+        regressions.extend(compare_stages('startup', results['startup']['stages'],
+                                          baseline['startup']['stages'], tolerance, min_delta_ms))
+    for name, doc_result in results['documents'].items():
+        base_doc = baseline.get('documents', {}).get(name)
+        if not base_doc or base_doc.get('pages') != doc_result['pages']:
+            continue
+        regressions.extend(compare_stages(name, doc_result['stages'], base_doc['stages'],
+                                          tolerance, min_delta_ms))
+        base_ratio = base_doc.get('cache', {}).get('page_cache_hit_ratio')
+        ratio = doc_result['cache']['page_cache_hit_ratio']
+        if base_ratio is not None and ratio < base_ratio - 0.05:
+            regressions.append(f'{name}.cache.page_cache_hit_ratio: {base_ratio} -> {ratio}')
+
+    base_rss = baseline.get('peak_rss_mb')
+    rss = results.get('peak_rss_mb')
+    if base_rss and rss and rss > base_rss * (1 + tolerance):
+        regressions.append(f'peak_rss_mb: {base_rss} -> {rss}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PDF阅读器性能基准测试')
+    parser.add_argument('--quick', action='store_true', help='缩小文档规模和采样数')
+    parser.add_argument('--documents', nargs='+', choices=sorted(DOCUMENTS), help='只测试这些文档')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'pdf_reader_bench'),
+                        help='合成文档的存放目录（重复运行时复用）')
+    parser.add_argument('--output', help='结果写入文件（默认输出到标准输出）')
+    parser.add_argument('--baseline', default=None, help=f'比较的基准文件（默认 {DEFAULT_BASELINE}，存在时比较）')
+    parser.add_argument('--save-baseline', action='store_true', help='把结果保存为基准文件')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的相对变慢比例')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='小于这个绝对差值的变化不算退化')
+    parser.add_argument('--texture', action='store_true', help='测量纹理上传（需要Kivy和显示环境）')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    samples, opens = (10, 3) if args.quick else (30, 5)
+    texture_upload = load_texture_upload() if args.texture else None
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'quick': args.quick,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'documents': {},
+    }
+
+    disk_dir = tempfile.mkdtemp(prefix='pdf_reader_bench_cache_')
+    try:
+        for name in args.documents or sorted(DOCUMENTS):
+            full_pages, quick_pages = DOCUMENTS[name]
+            path = ensure_document(args.workdir, name, quick_pages if args.quick else full_pages)
+            print(f'测试 {name} ...', file=sys.stderr)
+            results['documents'][name] = benchmark_document(path, samples, opens, disk_dir, texture_upload)
+        print('测试冷启动 ...', file=sys.stderr)
+        path = ensure_document(args.workdir, 'text_heavy', DOCUMENTS['text_heavy'][1 if args.quick else 0])
+        results['startup'] = benchmark_startup(path, opens)
+    finally:
+        shutil.rmtree(disk_dir, ignore_errors=True)
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.save_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f'已保存基准: {baseline_path}', file=sys.stderr)
+        return 0
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('quick') != args.quick:
+            print('基准的测试规模（--quick）不同，跳过比较', file=sys.stderr)
+            return 0
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print('性能退化:', file=sys.stderr)
+            for line in regressions:
+                print(f'  {line}', file=sys.stderr)
+            return 1
+        print(f'与基准 {baseline_path} 相比没有退化', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,6 +5,8 @@ package.domain = org.example
 
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,json
+source.exclude_patterns = benchmark.py,benchmark_baseline.json
+source.exclude_dirs = tests
 
 version = 1.0
 requirements = python3,kivy,pygments,pymupdf,android
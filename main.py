@@ -1,26 +1,1099 @@
+import time
+# 启动计时的起点（在导入Kivy之前）
+STARTUP_BEGIN = time.perf_counter()
+
+import json
+import os
+
+from kivy.utils import platform
+from pdf_core import RenderProcessPool
+
+# 平台检测
+IS_ANDROID = platform == 'android'
+
+# 桌面版默认的渲染进程数：CPU核数减一，最多4个（0为只用渲染线程）
+DEFAULT_RENDER_PROCESSES = 0 if IS_ANDROID else max(0, min(4, (os.cpu_count() or 1) - 1))
+
+
+def start_render_pool(config_file):
+    """读取配置文件并按其中的render_processes启动渲染进程，返回(配置, 渲染池)
+    
+    要在导入Kivy的窗口模块（创建窗口和OpenGL上下文）之前调用：这时还没有其他线程，
+    fork出的渲染进程也不继承图形驱动的状态。读到的配置交给load_config沿用，配置文件仍只读取一次。
+    """
+    config = None
+    try:
+        if os.path.exists(config_file):
+            with open(config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        processes = int(config.get('render_processes', DEFAULT_RENDER_PROCESSES)) if config else DEFAULT_RENDER_PROCESSES
+    except Exception as e:
+        print(f"读取配置失败: {e}")
+        config = None
+        processes = DEFAULT_RENDER_PROCESSES
+    return config, RenderProcessPool.create(processes)
+
+
+# 作为主程序在桌面上运行时在这里启动渲染进程，被其他模块导入时不启动（只用渲染线程）
+if __name__ == '__main__' and not IS_ANDROID:
+    STARTUP_CONFIG, STARTUP_RENDER_POOL = start_render_pool("pdf_reader_config.json")
+else:
+    STARTUP_CONFIG = STARTUP_RENDER_POOL = None
+RENDER_POOL_STARTED = time.perf_counter()
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
+from kivy.uix.widget import Widget
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.popup import Popup
-from kivy.uix.image import Image
-from kivy.graphics import Color, Rectangle
+from kivy.uix.textinput import TextInput
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recyclegridlayout import RecycleGridLayout
+from kivy.graphics import Color, Rectangle, RenderContext, InstructionGroup
 from kivy.core.window import Window
 from kivy.properties import NumericProperty, ObjectProperty, StringProperty, BooleanProperty
 from kivy.clock import Clock
 from kivy.graphics.texture import Texture
-from kivy.utils import platform
-import fitz  # PyMuPDF
-import json
-import os
-import glob
+import importlib.util
+import re
+import math
+import bisect
 import traceback
+import threading
 from collections import OrderedDict
 
-# 平台检测
-IS_ANDROID = platform == 'android'
+from perf import tracer
+from pdf_core import (
+    PRIORITY_PREVIEW, PRIORITY_CURRENT, PRIORITY_PREFETCH,
+    CacheKey, PageCache, DiskPageCache, PrefetchPlanner, RenderWorker,
+    ProcessRenderWorker, ThumbnailStore, ThumbnailWorker, ThumbnailAtlas, THUMB_CELL,
+    MemoryGovernor, MEMORY_NORMAL, MEMORY_MODERATE, MEMORY_HIGH, MEMORY_CRITICAL,
+    open_document, render_page_image, file_fingerprint, content_bbox,
+    fit_zoom, preview_key, half_page_region, half_page_pixels, fitz,
+)
+
+# 模块导入完成的时间（启动计时用）
+IMPORTS_DONE = time.perf_counter()
+
+# 同时保留的缩略图图集纹理数（每张约3MB显存）
+MAX_THUMBNAIL_TEXTURES = 4 if IS_ANDROID else 8
+
+# 双指缩放：最大放大倍数（相对适配大小），瓦片边长（像素）和瓦片的最大渲染倍数
+MAX_USER_ZOOM = 8.0
+TILE_SIZE = 512
+MAX_TILE_ZOOM = 16.0
+
+# 各内存压力等级下页面缓存预算的比例，以及CRITICAL时渲染倍数的比例
+PRESSURE_BUDGET_SCALE = {MEMORY_NORMAL: 1.0, MEMORY_MODERATE: 0.5, MEMORY_HIGH: 0.25, MEMORY_CRITICAL: 0.1}
+LOW_MEMORY_RENDER_SCALE = 0.5
+
+# 页面夜间模式的片段着色器：在GPU上把白底黑字映射为深底浅字，不需要重新渲染页面
+PAGE_NIGHT_FS = '''
+$HEADER$
+uniform float night;
+uniform vec3 night_bg;
+uniform vec3 night_fg;
+
+void main(void) {
+    vec4 color = frag_color * texture2D(texture0, tex_coord0);
+    vec3 night_color = mix(night_fg, night_bg, color.rgb);
+    gl_FragColor = vec4(mix(color.rgb, night_color, night), color.a);
+}
+'''
+
+# 夜间模式的页面底色和文字颜色
+NIGHT_PAGE_BG = (0.1, 0.1, 0.1)
+NIGHT_PAGE_FG = (0.85, 0.85, 0.85)
+
+def write_json_atomic(path, data, **dump_options):
+    """先写临时文件并同步到磁盘，再重命名替换，中途崩溃不会留下不完整的文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **dump_options)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def create_page_texture(image):
+    """将页面像素直接上传为纹理，不经过PNG编解码"""
+    colorfmt = image.colorfmt
+    with tracer.span('texture.upload', width=image.width, height=image.height):
+        texture = Texture.create(size=(image.width, image.height), colorfmt=colorfmt)
+        texture.blit_buffer(image.get_samples(), colorfmt=colorfmt, bufferfmt='ubyte')
+    # PDF像素从上到下排列，Kivy纹理原点在左下角
+    texture.flip_vertical()
+    return texture
+
+
+class ReadingPositionStore(object):
+    """阅读位置记录
+
+    第一次访问时才读取文件。修改只更新内存并标记为未保存，
+    由调用方在合适的时机（防抖定时器、应用暂停、切换文件）调用flush批量写入。
+    写入先写临时文件再重命名，中途崩溃不会损坏已有记录。
+    最后阅读的文件和页码另存一个很小的文件，启动时恢复上次的文件不必读取全部记录。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.last_path = os.path.splitext(path)[0] + '_last.json'
+        self._positions = None
+        self._dirty = False
+        self._last = None
+        self._last_dirty = False
+
+    def _ensure_loaded(self):
+        if self._positions is not None:
+            return
+        self._positions = {}
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._positions = json.load(f)
+                print(f"已加载阅读位置记录: {len(self._positions)} 个文件")
+        except Exception as e:
+            print(f"加载阅读位置失败: {e}")
+            self._positions = {}
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._positions)
+
+    def get(self, file_key, default=None):
+        self._ensure_loaded()
+        return self._positions.get(file_key, default)
+
+    def last(self):
+        """最后阅读的 (文件, 页码)，没有记录时返回None（只读取小文件）"""
+        if self._last is None:
+            try:
+                with open(self.last_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._last = (data['file'], data['page'])
+            except (OSError, ValueError, KeyError, TypeError):
+                return None
+        return self._last
+
+    def set(self, file_key, page_number):
+        """更新阅读位置（只修改内存），返回是否有变化"""
+        if self.last() != (file_key, page_number):
+            self._last = (file_key, page_number)
+            self._last_dirty = True
+        self._ensure_loaded()
+        if self._positions.get(file_key) != page_number:
+            self._positions[file_key] = page_number
+            self._dirty = True
+        return self._dirty or self._last_dirty
+
+    def flush(self):
+        """把未保存的修改原子地写入文件"""
+        if not (self._dirty or self._last_dirty):
+            return False
+        if self._dirty:
+            with tracer.span('disk.positions_write', files=len(self._positions)):
+                write_json_atomic(self.path, self._positions, separators=(',', ':'))
+            self._dirty = False
+        if self._last_dirty:
+            write_json_atomic(self.last_path, {'file': self._last[0], 'page': self._last[1]})
+            self._last_dirty = False
+        return True
+
+
+class LibraryIndex(object):
+    """PDF文件库索引
+
+    在后台线程中递归扫描配置的根目录，索引（路径、大小、修改时间、页数、标题、作者）
+    持久化保存。目录的修改时间没有变化时直接沿用上次记录的子目录和文件列表，不再重新列目录；
+    其中的PDF仍逐个stat，大小和修改时间都没变时才沿用记录，不再重新打开
+    （原地修改或替换文件不会改变目录的修改时间）。
+    """
+
+    def __init__(self, index_path, roots):
+        self.index_path = index_path
+        self.roots = roots
+        self.dirs = {}
+        self.files = {}
+        self.scanning = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.dirs = data.get('dirs', {})
+                self.files = data.get('files', {})
+        except Exception as e:
+            print(f"加载文件库索引失败: {e}")
+            self.dirs = {}
+            self.files = {}
+
+    def _save(self):
+        with self._lock:
+            data = {'dirs': dict(self.dirs), 'files': dict(self.files)}
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with tracer.span('disk.library_write', files=len(data['files'])):
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"保存文件库索引失败: {e}")
+
+    def entries(self):
+        """按文件名排序的 (路径, 信息) 列表"""
+        with self._lock:
+            items = list(self.files.items())
+        items.sort(key=lambda item: os.path.basename(item[0]).lower())
+        return items
+
+    def scan(self, on_batch, on_done, batch_size=50):
+        """启动后台扫描，新增或变化的文件分批通过on_batch返回，扫描结束调用on_done"""
+        if self.scanning:
+            return False
+        self.scanning = True
+        thread = threading.Thread(target=self._scan, args=(on_batch, on_done, batch_size),
+                                  name='LibraryScan')
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _scan(self, on_batch, on_done, batch_size):
+        seen_dirs = set()
+        seen_files = set()
+        batch = []
+        stack = [os.path.abspath(root) for root in self.roots]
+        
+        try:
+            while stack:
+                directory = stack.pop()
+                if directory in seen_dirs:
+                    continue
+                seen_dirs.add(directory)
+                
+                try:
+                    dir_mtime = os.stat(directory).st_mtime
+                except OSError:
+                    continue
+                
+                cached = self.dirs.get(directory)
+                changed = cached is None or cached['mtime'] != dir_mtime
+                if changed:
+                    subdirs, pdfs = self._list_dir(directory)
+                    with self._lock:
+                        self.dirs[directory] = {'mtime': dir_mtime, 'subdirs': subdirs, 'pdfs': pdfs}
+                else:
+                    subdirs, pdfs = cached['subdirs'], cached['pdfs']
+                
+                stack.extend(subdirs)
+                
+                for pdf_path in pdfs:
+                    old_info = self.files.get(pdf_path)
+                    info = self._file_info(pdf_path)
+                    if info is None:
+                        continue
+                    seen_files.add(pdf_path)
+                    if info is old_info:
+                        continue
+                    with self._lock:
+                        self.files[pdf_path] = info
+                    batch.append((pdf_path, info))
+                    if len(batch) >= batch_size:
+                        on_batch(batch)
+                        batch = []
+            
+            if batch:
+                on_batch(batch)
+            
+            # 删除已经不存在的目录和文件
+            with self._lock:
+                for directory in [d for d in self.dirs if d not in seen_dirs]:
+                    del self.dirs[directory]
+                for pdf_path in [p for p in self.files if p not in seen_files]:
+                    del self.files[pdf_path]
+            
+            self._save()
+            print(f"找到 {len(self.files)} 个PDF文件")
+        except Exception as e:
+            print(f"扫描错误: {e}")
+        finally:
+            self.scanning = False
+            on_done()
+
+    def _list_dir(self, directory):
+        subdirs = []
+        pdfs = []
+        try:
+            for entry in os.scandir(directory):
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith('.pdf'):
+                        pdfs.append(entry.path)
+                except OSError:
+                    continue
+        except OSError:
+            pass
+        return subdirs, pdfs
+
+    def _file_info(self, pdf_path):
+        """读取文件信息，大小和修改时间没变时沿用旧记录"""
+        try:
+            stat = os.stat(pdf_path)
+        except OSError:
+            return None
+        
+        old_info = self.files.get(pdf_path)
+        if old_info and old_info['size'] == stat.st_size and old_info['mtime'] == stat.st_mtime:
+            return old_info
+        
+        info = {'size': stat.st_size, 'mtime': stat.st_mtime, 'pages': None, 'title': '', 'author': ''}
+        try:
+            doc = fitz.open(pdf_path)
+            try:
+                info['pages'] = doc.page_count
+                metadata = doc.metadata or {}
+                info['title'] = (metadata.get('title') or '').strip()
+                info['author'] = (metadata.get('author') or '').strip()
+            finally:
+                doc.close()
+        except Exception as e:
+            print(f"读取PDF信息失败 {pdf_path}: {e}")
+        return info
+
+
+SEARCH_INDEX_VERSION = 2
+PAGE_CROP_VERSION = 2
+# 裁边记录中每页三个内容区域的顺序
+CROP_SIDES = (None, 'left', 'right')
+
+# 搜索分词：连续的字母数字为一个词，汉字（及日文假名、韩文）每个字单独成词
+CJK_CHARS = '\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff'
+SEARCH_TOKEN_RE = re.compile('[^\\W_%s]+|[%s]' % (CJK_CHARS, CJK_CHARS))
+CJK_CHAR_RE = re.compile('[%s]' % CJK_CHARS)
+
+
+def tokenize_text(text):
+    """把文本切分为搜索词，返回 (词, 起始位置, 结束位置) 列表"""
+    tokens = []
+    for match in SEARCH_TOKEN_RE.finditer(text.lower()):
+        tokens.append((match.group(), match.start(), match.end()))
+    return tokens
+
+
+class SearchIndex(object):
+    """单个文档的全文倒排索引（词 → 页码 → 词的位置框列表）
+
+    后台线程先加载已保存的索引，再逐页提取文字建立索引，每处理一批页面保存一次，
+    索引文件以文档指纹命名，中途退出后下次打开从未完成的页面继续。
+    索引文件为JSON Lines：第一行是版本和总页数，之后每行是一批页面的索引，
+    保存时只追加新的一批，不重写已保存的部分。
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.words = {}
+        self.pages = set()
+        self.total_pages = 0
+        self.building = False
+        self.loaded = False
+        self._running = False
+        self._lock = threading.Lock()
+        # 还未写入索引文件的页面：页码 → {词: 位置框列表}
+        self._unsaved = {}
+        self._header_saved = False
+
+    @property
+    def complete(self):
+        return self.total_pages > 0 and len(self.pages) >= self.total_pages
+
+    def _load(self):
+        self.loaded = True
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or '{}')
+                if header.get('version') != SEARCH_INDEX_VERSION:
+                    return
+                words = {}
+                pages = set()
+                truncated = False
+                for line in f:
+                    try:
+                        segment = json.loads(line)
+                    except ValueError:
+                        # 写入中途退出留下的不完整的一行，其中的页面下次重新索引
+                        truncated = True
+                        break
+                    for word, postings in segment['words'].items():
+                        word_postings = words.setdefault(word, {})
+                        for page, boxes in postings.items():
+                            word_postings[int(page)] = boxes
+                    pages.update(segment['pages'])
+            with self._lock:
+                self.total_pages = header.get('total', 0)
+                self.pages = pages
+                self.words = words
+                if truncated:
+                    # 不能在不完整的行后面追加，下次保存时连同已加载的页面整个重写
+                    for word, postings in words.items():
+                        for page, boxes in postings.items():
+                            self._unsaved.setdefault(page, {})[word] = boxes
+            self._header_saved = not truncated
+        except Exception as e:
+            print(f"加载搜索索引失败: {e}")
+
+    def _save(self):
+        """把上次保存后新索引的页面追加到索引文件（序列化和写文件时不持有锁）"""
+        if not self.index_path:
+            return
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+        if not unsaved:
+            return
+        words = {}
+        for page_num, postings in unsaved.items():
+            for token, boxes in postings.items():
+                words.setdefault(token, {})[page_num] = boxes
+        segment = json.dumps({'pages': sorted(unsaved), 'words': words},
+                             ensure_ascii=False, separators=(',', ':'))
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            with tracer.span('disk.search_index_write', pages=len(unsaved)):
+                if self._header_saved:
+                    with open(self.index_path, 'a', encoding='utf-8') as f:
+                        f.write(segment + '\n')
+                else:
+                    # 新文件（或旧版本的索引）整个重写
+                    header = json.dumps({'version': SEARCH_INDEX_VERSION, 'total': self.total_pages})
+                    tmp_path = self.index_path + '.tmp'
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(header + '\n' + segment + '\n')
+                    os.replace(tmp_path, self.index_path)
+                    self._header_saved = True
+        except OSError as e:
+            print(f"保存搜索索引失败: {e}")
+
+    def build(self, file_path, on_progress, on_done, batch_size=100):
+        """启动后台加载和建立索引，每完成一批页面调用on_progress(已完成页数, 总页数)"""
+        if self.building or (self.loaded and self.complete):
+            return False
+        self.building = True
+        self._running = True
+        thread = threading.Thread(target=self._build, args=(file_path, on_progress, on_done, batch_size),
+                                  name='SearchIndex')
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def stop(self):
+        self._running = False
+
+    def _build(self, file_path, on_progress, on_done, batch_size):
+        unsaved = 0
+        try:
+            if not self.loaded:
+                self._load()
+                if self.complete:
+                    return
+            # fitz.Document不能跨线程共享，索引线程使用自己打开的文档
+            doc = fitz.open(file_path)
+            self.total_pages = len(doc)
+            for page_num in range(self.total_pages):
+                if not self._running:
+                    break
+                if page_num in self.pages:
+                    continue
+                with tracer.span('search.extract', page=page_num):
+                    words = doc[page_num].get_text('words')
+                self._index_page(page_num, words)
+                unsaved += 1
+                if unsaved >= batch_size:
+                    self._save()
+                    unsaved = 0
+                    on_progress(len(self.pages), self.total_pages)
+                # 让出GIL，避免和页面渲染争抢
+                time.sleep(0.001)
+            doc.close()
+        except Exception as e:
+            print(f"建立搜索索引失败: {e}")
+        finally:
+            if unsaved:
+                self._save()
+            self.building = False
+            on_done(len(self.pages), self.total_pages)
+
+    def _index_page(self, page_num, words):
+        """words为page.get_text('words')的结果"""
+        postings = {}
+        for word in words:
+            x0, y0, x1, y1, text = word[:5]
+            length = max(len(text), 1)
+            for token, start, end in tokenize_text(text):
+                # 词框内按字符位置估算这个词的位置框
+                box = [round(x0 + (x1 - x0) * start / length), round(y0),
+                       round(x0 + (x1 - x0) * end / length), round(y1)]
+                postings.setdefault(token, []).append(box)
+        with self._lock:
+            for token, boxes in postings.items():
+                self.words.setdefault(token, {})[page_num] = boxes
+            self.pages.add(page_num)
+            self._unsaved[page_num] = postings
+
+    def search(self, query, limit=500):
+        """搜索包含所有查询词的页面，按命中次数排序，返回 [(页码, 位置框列表)]
+        
+        最后一个词按前缀匹配，便于边输入边搜索。
+        """
+        terms = [token for token, start, end in tokenize_text(query)]
+        if not terms:
+            return []
+        
+        with self._lock:
+            matched = []
+            for i, term in enumerate(terms):
+                if i == len(terms) - 1 and not CJK_CHAR_RE.match(term):
+                    postings = {}
+                    for word, word_postings in self.words.items():
+                        if word.startswith(term):
+                            for page_num, boxes in word_postings.items():
+                                postings.setdefault(page_num, []).extend(boxes)
+                else:
+                    postings = self.words.get(term, {})
+                if not postings:
+                    return []
+                matched.append(postings)
+            
+            pages = set(matched[0])
+            for postings in matched[1:]:
+                pages &= set(postings)
+            
+            results = []
+            for page_num in pages:
+                boxes = []
+                for postings in matched:
+                    boxes.extend(postings[page_num])
+                results.append((page_num, boxes))
+        
+        results.sort(key=lambda item: (-len(item[1]), item[0]))
+        return results[:limit]
+
+
+class PageCropIndex(object):
+    """单个文档每页的内容区域（自动裁边用）
+
+    后台线程从指定页开始逐页探测内容区域（pdf_core.content_bbox），
+    以文档指纹命名保存，每页只计算一次。每页记录整页、左半和右半（按页面中线分开，
+    半页模式用）三个内容区域，没有可裁剪页边的记为None。
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.crops = {}
+        self.total_pages = 0
+        self.building = False
+        self._running = False
+        self._lock = threading.Lock()
+
+    @property
+    def complete(self):
+        return self.total_pages > 0 and len(self.crops) >= self.total_pages
+
+    def load(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != PAGE_CROP_VERSION:
+                return
+            crops = dict((int(page), tuple(tuple(crop) if crop else None for crop in record))
+                         for page, record in data.get('crops', {}).items())
+            with self._lock:
+                self.total_pages = data.get('total', 0)
+                self.crops = crops
+        except Exception as e:
+            print(f"加载页边裁剪记录失败: {e}")
+
+    def get(self, page_num, side=None):
+        """页面（side为'left'/'right'时为半边）的内容区域，未计算或不需要裁剪时返回None"""
+        record = self.crops.get(page_num)
+        if record is None:
+            return None
+        return record[CROP_SIDES.index(side)]
+
+    def _save(self):
+        if not self.index_path:
+            return
+        with self._lock:
+            data = {
+                'version': PAGE_CROP_VERSION,
+                'total': self.total_pages,
+                'crops': dict((str(page), [list(crop) if crop else None for crop in record])
+                              for page, record in self.crops.items()),
+            }
+        tmp_path = self.index_path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            with tracer.span('disk.crop_index_write', pages=len(data['crops'])):
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"保存页边裁剪记录失败: {e}")
+
+    def build(self, file_path, start_page, on_progress, batch_size=20):
+        """在后台从start_page开始（到末尾后再从头）计算未记录的页面，
+        每完成一批页面调用on_progress(已完成页数, 总页数)"""
+        if self.building or self.complete:
+            return False
+        self.building = True
+        self._running = True
+        thread = threading.Thread(target=self._build, args=(file_path, start_page, on_progress, batch_size),
+                                  name='PageCrop')
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def stop(self):
+        self._running = False
+
+    def _build(self, file_path, start_page, on_progress, batch_size):
+        unsaved = 0
+        try:
+            doc = fitz.open(file_path)
+            self.total_pages = len(doc)
+            order = list(range(start_page, self.total_pages)) + list(range(min(start_page, self.total_pages)))
+            for page_num in order:
+                if not self._running:
+                    break
+                if page_num in self.crops:
+                    continue
+                record = content_bbox(doc[page_num], halves=True)
+                with self._lock:
+                    self.crops[page_num] = record
+                unsaved += 1
+                # 第一页尽快交给界面，之后按批保存
+                if unsaved >= batch_size or len(self.crops) == 1:
+                    self._save()
+                    unsaved = 0
+                    on_progress(len(self.crops), self.total_pages)
+                # 让出GIL，避免和页面渲染争抢
+                time.sleep(0.001)
+            doc.close()
+        except Exception as e:
+            print(f"计算页边裁剪失败: {e}")
+        finally:
+            if unsaved:
+                self._save()
+            self.building = False
+            on_progress(len(self.crops), self.total_pages)
+
+
+class DocumentSession(object):
+    """后台保留的已打开文档
+
+    返回文件列表或切换到其他文档时，阅读界面的文档状态（fitz文档、页面缓存、
+    预取记录、搜索索引、裁边记录、缩略图和目录）整体移到这里，再次打开时原样恢复，
+    不必重新打开文件和渲染页面。后台线程在挂起时停止，恢复时从中断处继续。
+    """
+
+    FIELDS = ('file_path', 'doc', 'fingerprint', 'total_pages', 'current_page', 'current_half_page',
+              'page_cache', 'page_rects', 'page_sizes', 'prefetch_planner',
+              'search_index', 'search_query', 'search_hits', 'page_crops', 'thumbnails', 'outline')
+
+    def __init__(self, reader):
+        for name in self.FIELDS:
+            setattr(self, name, getattr(reader, name, None))
+        if self.current_half_page is None:
+            self.current_half_page = 'right'
+
+    def restore(self, reader):
+        for name in self.FIELDS:
+            setattr(reader, name, getattr(self, name))
+
+    def close(self):
+        for index in (self.search_index, self.page_crops):
+            if index:
+                index.stop()
+        self.page_cache.clear()
+        self.doc.close()
+        self.doc = None
+
+
+def trim_memory_pressure(trim_level):
+    """Android ComponentCallbacks2.onTrimMemory的级别对应的内存压力等级"""
+    if trim_level >= 80:    # TRIM_MEMORY_COMPLETE：后台进程中最先被结束的
+        return MEMORY_CRITICAL
+    if trim_level >= 40:    # TRIM_MEMORY_BACKGROUND / MODERATE
+        return MEMORY_HIGH
+    if trim_level >= 20:    # TRIM_MEMORY_UI_HIDDEN：界面已不可见
+        return MEMORY_MODERATE
+    if trim_level >= 15:    # TRIM_MEMORY_RUNNING_CRITICAL
+        return MEMORY_CRITICAL
+    if trim_level >= 10:    # TRIM_MEMORY_RUNNING_LOW
+        return MEMORY_HIGH
+    if trim_level >= 5:     # TRIM_MEMORY_RUNNING_MODERATE
+        return MEMORY_MODERATE
+    return MEMORY_NORMAL
+
+
+def register_trim_memory_callback(on_pressure):
+    """在Android上注册ComponentCallbacks2，系统要求释放内存时调用on_pressure(压力等级)
+    
+    回调在Java线程中执行。返回的对象要一直保留引用，其他平台或注册失败时返回None。
+    """
+    if not IS_ANDROID:
+        return None
+    try:
+        from jnius import autoclass, PythonJavaClass, java_method
+        
+        class TrimMemoryCallbacks(PythonJavaClass):
+            __javainterfaces__ = ['android/content/ComponentCallbacks2']
+            __javacontext__ = 'app'
+            
+            @java_method('(I)V')
+            def onTrimMemory(self, level):
+                on_pressure(trim_memory_pressure(level))
+            
+            @java_method('()V')
+            def onLowMemory(self):
+                on_pressure(MEMORY_CRITICAL)
+            
+            @java_method('(Landroid/content/res/Configuration;)V')
+            def onConfigurationChanged(self, config):
+                pass
+        
+        callbacks = TrimMemoryCallbacks()
+        PythonActivity = autoclass('org.kivy.android.PythonActivity')
+        PythonActivity.mActivity.registerComponentCallbacks(callbacks)
+        return callbacks
+    except Exception as e:
+        print(f"注册内存回调失败: {e}")
+        return None
+
+
+def battery_is_low(threshold=15):
+    """电量低且未充电时返回True，只在Android上检测"""
+    if not IS_ANDROID:
+        return False
+    try:
+        from jnius import autoclass
+        PythonActivity = autoclass('org.kivy.android.PythonActivity')
+        Context = autoclass('android.content.Context')
+        BatteryManager = autoclass('android.os.BatteryManager')
+        manager = PythonActivity.mActivity.getSystemService(Context.BATTERY_SERVICE)
+        level = manager.getIntProperty(BatteryManager.BATTERY_PROPERTY_CAPACITY)
+        return 0 <= level <= threshold and not manager.isCharging()
+    except Exception:
+        return False
+
+
+class LibraryRow(Button):
+    """文件列表中的一行，由RecycleView复用"""
+    file_path = StringProperty('')
+    reader = ObjectProperty(None, allownone=True)
+
+    def on_release(self):
+        if self.reader and self.file_path:
+            self.reader.load_pdf_file(self.file_path)
+
+
+class SearchResultRow(Button):
+    """搜索结果列表中的一行，由RecycleView复用"""
+    page_num = NumericProperty(0)
+    reader = ObjectProperty(None, allownone=True)
+
+    def on_release(self):
+        if self.reader:
+            self.reader.jump_to_search_result(self.page_num)
+
+
+class ThumbnailCell(Button):
+    """缩略图面板中的一格，缩略图是共享图集纹理的一个区域，由RecycleView复用"""
+    page_num = NumericProperty(0)
+    reader = ObjectProperty(None, allownone=True)
+
+    def __init__(self, **kwargs):
+        super(ThumbnailCell, self).__init__(**kwargs)
+        self.valign = 'bottom'
+        with self.canvas.after:
+            Color(1, 1, 1, 1)
+            self._thumb_rect = Rectangle(size=(0, 0))
+        self.bind(size=self._update_text_size)
+        self.bind(pos=self.update_thumbnail, size=self.update_thumbnail,
+                  page_num=self.update_thumbnail, reader=self.update_thumbnail)
+
+    def _update_text_size(self, *args):
+        self.text_size = (self.width, self.height - 4)
+
+    def update_thumbnail(self, *args):
+        texture = self.reader.thumbnail_texture(self.page_num) if self.reader else None
+        self._thumb_rect.texture = texture
+        if texture is None:
+            self._thumb_rect.size = (0, 0)
+            return
+        # 按比例缩放到页码上方的区域
+        avail_width, avail_height = self.width - 8, self.height - 28
+        scale = min(avail_width / texture.width, avail_height / texture.height)
+        width, height = texture.width * scale, texture.height * scale
+        self._thumb_rect.pos = (self.center_x - width / 2, self.y + 24 + (avail_height - height) / 2)
+        self._thumb_rect.size = (width, height)
+
+    def on_release(self):
+        if self.reader:
+            self.reader.jump_to_page(self.page_num)
+
+
+class OutlineRow(Button):
+    """目录中的一行，由RecycleView复用"""
+    page_num = NumericProperty(0)
+    reader = ObjectProperty(None, allownone=True)
+
+    def __init__(self, **kwargs):
+        super(OutlineRow, self).__init__(**kwargs)
+        self.halign = 'left'
+        self.shorten = True
+        self.bind(size=lambda instance, size: setattr(self, 'text_size', (size[0] - 20, None)))
+
+    def on_release(self):
+        if self.reader:
+            self.reader.jump_to_page(self.page_num)
+
+
+class PerfHud(Label):
+    """性能面板：帧时间、缓存和命中率，叠加在阅读界面右上角"""
+
+    def __init__(self, **kwargs):
+        super(PerfHud, self).__init__(**kwargs)
+        with self.canvas.before:
+            Color(0, 0, 0, 0.6)
+            self._bg_rect = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self._update_bg, size=self._update_bg, texture_size=self._fit_text)
+
+    def _fit_text(self, *args):
+        self.size = (self.texture_size[0] + 16, self.texture_size[1] + 12)
+
+    def _update_bg(self, *args):
+        self._bg_rect.pos = self.pos
+        self._bg_rect.size = self.size
+
+
+class PageView(Widget):
+    """阅读界面中常驻的页面控件
+
+    翻页时只替换纹理，尺寸变化时重新计算位置，不再每次创建新的控件。
+    页面绘制在单独的RenderContext中，夜间模式由着色器完成，切换只需修改一个uniform。
+    """
+
+    def __init__(self, margin=20, **kwargs):
+        super(PageView, self).__init__(**kwargs)
+        self.margin = margin
+        self.texture = None
+        self.display_size = (0, 0)
+        self.is_error = False
+        # 当前显示的清晰页面的缓存键（连续滚动模式用来判断是否需要重新填充）
+        self.page_key = None
+        # 清晰页面到达前显示的预览图像，同一预览不重复上传纹理
+        self.preview_source = None
+        
+        with self.canvas:
+            self.page_context = RenderContext(
+                use_parent_projection=True,
+                use_parent_modelview=True,
+                use_parent_frag_modelview=True
+            )
+        
+        self.page_context.shader.fs = PAGE_NIGHT_FS
+        self.shader_ok = bool(self.page_context.shader.success)
+        self.page_context['night'] = 0.0
+        self.page_context['night_bg'] = NIGHT_PAGE_BG
+        self.page_context['night_fg'] = NIGHT_PAGE_FG
+        
+        with self.page_context:
+            Color(1, 1, 1, 1)
+            self.page_rect = Rectangle(size=(0, 0))
+            # 放大时叠加在页面上的清晰瓦片
+            self.tile_group = InstructionGroup()
+        
+        with self.canvas:
+            # 搜索结果高亮，不经过夜间模式着色器
+            Color(1, 0.85, 0, 0.35)
+            self.highlight_group = InstructionGroup()
+        self._tile_rects = []
+        self._highlight_rects = []
+        
+        self.label = Label(font_size='16sp', halign='center')
+        self.add_widget(self.label)
+        self.bind(pos=self.update_geometry, size=self.update_geometry)
+
+    def set_page(self, texture, display_size):
+        """显示页面纹理，display_size为显示尺寸"""
+        self.texture = texture
+        self.display_size = display_size
+        self.page_rect.texture = texture
+        self.label.text = ''
+        self.is_error = False
+        self.update_geometry()
+
+    def show_message(self, text, color, is_error=False):
+        """不显示页面，只显示一行提示（加载中或错误信息）"""
+        self.texture = None
+        self.display_size = (0, 0)
+        self.page_rect.texture = None
+        self.set_tiles({})
+        self.is_error = is_error
+        self.label.text = text
+        self.label.color = color
+        self.update_geometry()
+
+    def set_tiles(self, tiles):
+        """在页面上叠加瓦片，tiles为 {缓存键: (纹理, (u0, v0, u1, v1))}
+        
+        坐标是瓦片在显示区域中的比例位置，v从上往下。
+        """
+        self.tile_group.clear()
+        self._tile_rects = []
+        for texture, box in tiles.values():
+            rect = Rectangle(texture=texture)
+            self.tile_group.add(rect)
+            self._tile_rects.append((rect, box))
+        self._place_tiles()
+
+    def set_highlights(self, boxes):
+        """高亮页面上的区域，boxes为 (u0, v0, u1, v1) 列表，坐标含义同set_tiles"""
+        self.highlight_group.clear()
+        self._highlight_rects = []
+        for box in boxes:
+            rect = Rectangle()
+            self.highlight_group.add(rect)
+            self._highlight_rects.append((rect, box))
+        self._place_tiles()
+
+    def _place_tiles(self):
+        x, y = self.page_rect.pos
+        width, height = self.page_rect.size
+        for rect, (u0, v0, u1, v1) in self._tile_rects + self._highlight_rects:
+            rect.pos = (x + u0 * width, y + (1 - v1) * height)
+            rect.size = ((u1 - u0) * width, (v1 - v0) * height)
+
+    def set_night(self, night):
+        """切换页面内容的夜间显示"""
+        self.page_context['night'] = 1.0 if (night and self.shader_ok) else 0.0
+
+    def fit_to(self, width, height):
+        """按滚动区域大小设置自身尺寸，页面较高（或放大后较宽）时可以滚动"""
+        self.size = (max(width, self.display_size[0] + self.margin * 2),
+                     max(height, self.display_size[1] + self.margin * 2))
+
+    def update_geometry(self, *args):
+        width, height = self.display_size
+        if width + self.margin * 2 > self.width:
+            x = self.x + self.margin
+        else:
+            x = self.x + (self.width - width) / 2
+        if height + self.margin * 2 > self.height:
+            y = self.top - self.margin - height
+        else:
+            y = self.y + (self.height - height) / 2
+        self.page_rect.pos = (x, y)
+        self.page_rect.size = (width, height) if self.texture else (0, 0)
+        self._place_tiles()
+        self.label.pos = self.pos
+        self.label.size = self.size
+
+
+class ContinuousView(Widget):
+    """连续滚动模式的页面容器
+
+    所有页面的显示高度在打开时按页面尺寸一次算好，决定总滚动高度；
+    只有与视口相交（加上少量余量）的页面才占用一个PageView和纹理，
+    页面离开视口后控件回收给其他页面使用，内存占用与文档页数无关。
+    """
+
+    def __init__(self, gap=10, **kwargs):
+        super(ContinuousView, self).__init__(**kwargs)
+        self.gap = gap
+        self.page_width = 0
+        self.heights = []
+        self.offsets = []
+        self.slots = {}
+        self._free_slots = []
+        self.night = False
+
+    def set_layout(self, width, page_width, page_sizes):
+        """按宽度适配计算每页的显示高度和相对内容顶部的偏移"""
+        self.page_width = page_width
+        self.heights = [page_width * h / w for w, h in page_sizes]
+        self.offsets = []
+        offset = 0
+        for height in self.heights:
+            self.offsets.append(offset)
+            offset += height + self.gap
+        self.size = (width, max(offset - self.gap, 0))
+        for page_num, slot in self.slots.items():
+            self._place(slot, page_num)
+
+    def page_at(self, offset):
+        """距内容顶部offset处的页码"""
+        if not self.offsets:
+            return 0
+        index = bisect.bisect_right(self.offsets, offset) - 1
+        return min(max(index, 0), len(self.offsets) - 1)
+
+    def acquire(self, page_num):
+        """获取显示某页的控件，优先复用已回收的控件"""
+        slot = self.slots.get(page_num)
+        if slot is None:
+            slot = self._free_slots.pop() if self._free_slots else PageView(margin=0, size_hint=(None, None))
+            slot.page_key = None
+            slot.preview_source = None
+            slot.set_night(self.night)
+            self.slots[page_num] = slot
+            self.add_widget(slot)
+            self._place(slot, page_num)
+        return slot
+
+    def release_except(self, pages):
+        """回收不在pages中的页面控件，并释放它们的纹理"""
+        for page_num in [p for p in self.slots if p not in pages]:
+            slot = self.slots.pop(page_num)
+            slot.show_message('', (0, 0, 0, 0))
+            slot.set_highlights([])
+            slot.page_key = None
+            slot.preview_source = None
+            self.remove_widget(slot)
+            self._free_slots.append(slot)
+
+    def release_all(self):
+        self.release_except(())
+
+    def set_night(self, night):
+        self.night = night
+        for slot in list(self.slots.values()) + self._free_slots:
+            slot.set_night(night)
+
+    def _place(self, slot, page_num):
+        height = self.heights[page_num]
+        slot.size = (self.width, height)
+        slot.pos = (self.x, self.top - self.offsets[page_num] - height)
+        if slot.texture is not None:
+            slot.display_size = (self.page_width, height)
+            slot.update_geometry()
+
+    def on_pos(self, *args):
+        for page_num, slot in self.slots.items():
+            self._place(slot, page_num)
+
 
 class PDFReaderApp(App):
     title = "PDF阅读器"
@@ -31,6 +1104,17 @@ class PDFReaderApp(App):
             from kivy.config import Config
             Config.set('kivy', 'default_font', ['SimHei', 'Arial'])
         return MainLayout()
+    
+    def on_pause(self):
+        # 切到后台时写入未保存的阅读位置，应用可能随时被系统结束
+        self.root.save_reading_positions()
+        tracer.flush()
+        return True
+    
+    def on_stop(self):
+        self.root.save_reading_positions()
+        self.root.stop_render_pool()
+        tracer.flush()
 
 class MainLayout(FloatLayout):
     current_page = NumericProperty(0)
@@ -40,9 +1124,15 @@ class MainLayout(FloatLayout):
     night_mode = BooleanProperty(False)
     controls_visible = BooleanProperty(True)
     half_page_mode = BooleanProperty(False)
+    continuous_mode = BooleanProperty(False)
+    crop_mode = BooleanProperty(False)
     
     def __init__(self, **kwargs):
         super(MainLayout, self).__init__(**kwargs)
+        # 启动各阶段的耗时：(名称, 开始时间, 耗时秒数)，第一帧绘制后输出
+        self.startup_phases = [('render_pool', STARTUP_BEGIN, RENDER_POOL_STARTED - STARTUP_BEGIN),
+                               ('imports', RENDER_POOL_STARTED, IMPORTS_DONE - RENDER_POOL_STARTED)]
+        phase_start = self._startup_phase('app_init', IMPORTS_DONE)
         
         # 根据平台设置配置文件路径
         if IS_ANDROID:
@@ -51,36 +1141,200 @@ class MainLayout(FloatLayout):
                 app_data_dir = app_storage_path()
                 self.config_file = os.path.join(app_data_dir, "pdf_reader_config.json")
                 self.reading_positions_file = os.path.join(app_data_dir, "reading_positions.json")
+                self.disk_cache_dir = os.path.join(app_data_dir, "page_cache")
+                self.library_index_file = os.path.join(app_data_dir, "library_index.json")
+                self.search_index_dir = os.path.join(app_data_dir, "search_index")
+                self.page_crop_dir = os.path.join(app_data_dir, "page_crops")
+                self.thumbnail_dir = os.path.join(app_data_dir, "thumbnails")
+                self.perf_trace_file = os.path.join(app_data_dir, "perf_trace.jsonl")
             except ImportError:
                 # 如果android模块不可用，使用当前目录
                 self.config_file = "pdf_reader_config.json"
                 self.reading_positions_file = "reading_positions.json"
+                self.disk_cache_dir = "page_cache"
+                self.library_index_file = "library_index.json"
+                self.search_index_dir = "search_index"
+                self.page_crop_dir = "page_crops"
+                self.thumbnail_dir = "thumbnails"
+                self.perf_trace_file = "perf_trace.jsonl"
         else:
             # Windows/Linux 开发环境
             self.config_file = "pdf_reader_config.json"
             self.reading_positions_file = "reading_positions.json"
+            self.disk_cache_dir = "page_cache"
+            self.library_index_file = "library_index.json"
+            self.search_index_dir = "search_index"
+            self.page_crop_dir = "page_crops"
+            self.thumbnail_dir = "thumbnails"
+            self.perf_trace_file = "perf_trace.jsonl"
         
-        self.page_cache = OrderedDict()
-        self.half_page_cache = OrderedDict()
-        self.cache_size = 5
+        # 页面缓存的内存预算（MB），可在配置文件中修改
+        self.cache_budget_mb = 96 if IS_ANDROID else 256
+        self.page_cache = PageCache(self.cache_budget_mb * 1024 * 1024)
+        # 后台保留的已打开文档（文件路径 → DocumentSession，最久未看的在前），
+        # 和当前文档共用上面的内存预算，超过数量上限时关闭最久未看的文档
+        self.sessions = OrderedDict()
+        self.max_background_documents = 2 if IS_ANDROID else 5
+        # 内存压力：进程常驻内存的上限（MB），超过阈值比例时逐级释放内存，严重时降低渲染倍数
+        self.memory_limit_mb = 512 if IS_ANDROID else 2048
+        self.memory_governor = None
+        self.memory_pressure = MEMORY_NORMAL
+        self.render_scale = 1.0
+        self._trim_callbacks = None
+        # 缓存格式: 'raw' 保存原始像素（默认，最快），'png' 压缩存储（省内存）
+        self.cache_format = 'raw'
+        # 只有灰度内容的页面（黑白文字、灰度扫描）按8位灰度渲染和缓存，内存只有RGB的三分之一
+        self.gray_pages = True
+        # 磁盘缓存容量（MB），重新打开文件时直接读取已渲染的页面
+        self.disk_cache_mb = 200 if IS_ANDROID else 500
+        self.disk_cache = DiskPageCache(self.disk_cache_dir, self.disk_cache_mb * 1024 * 1024)
+        self.fingerprint = None
+        self._disk_preview = None
+        self._opening_file = None
+        self.render_worker = None
+        # 桌面版的多进程渲染：进程数（0为只用渲染线程）和翻页时向后预渲染到磁盘缓存的页数
+        self.render_processes = DEFAULT_RENDER_PROCESSES
+        self.prerender_pages = 0 if IS_ANDROID else 50
+        self.render_pool = None
+        self.prefetch_planner = PrefetchPlanner(battery_check=battery_is_low)
+        # 打开文件的开始时间，用于统计首页显示耗时
+        self._open_started = None
+        # 适配方式: 'page' 整页适配显示区域，'width' 适配宽度（可上下滚动）
+        self.fit_mode = 'page'
+        self.view_size = None
+        self.page_rects = {}
+        # 最近上传的页面纹理，半页模式下左右两半共用同一张纹理
+        self._texture_source = None
+        self._page_texture = None
+        # 双指缩放：相对适配大小的放大倍数、适配时的显示尺寸和显示的页面区域（页面坐标）
+        self.user_zoom = 1.0
+        self._fit_display_size = (0, 0)
+        self._display_region = None
+        self._shown_page = None
+        self._tile_textures = {}
+        self._active_touches = {}
+        self._pinch = None
+        self._update_tiles_trigger = Clock.create_trigger(lambda dt: self._update_tiles(), 0.1)
+        # 已提交还未完成的瓦片请求，视口移动后只作废这些请求
+        self._tile_requests = set()
+        # 全文搜索：当前文档的索引、搜索结果（页码 → 位置框列表）和搜索弹窗
+        self.search_index = None
+        self.search_query = ''
+        self.search_hits = {}
+        self.search_popup = None
+        self._search_trigger = Clock.create_trigger(lambda dt: self._run_search(), 0.3)
+        # 自动裁边：当前文档每页的内容区域，以及正在显示的页面的缓存键
+        self.page_crops = None
+        self._displayed_key = None
+        # 缩略图和目录：当前文档的缩略图图集、生成线程、图集纹理（图集序号 → 纹理）和目录（打开面板时才加载）
+        self.thumbnails = None
+        self.thumbnail_worker = None
+        self._thumb_textures = OrderedDict()
+        self.outline = None
+        self._outline_loading = False
+        self.navigation_popup = None
+        self.thumbnail_view = None
+        self.outline_view = None
+        self._thumbnail_focus_trigger = Clock.create_trigger(lambda dt: self._focus_thumbnails(), 0.2)
         self.touch_start_x = 0
         self.swipe_threshold = 50
+        self.last_page = None
+        # 文件库扫描的根目录，可在配置文件中修改
+        self.library_roots = self.default_library_roots()
+        self.library = None
+        self.library_view = None
+        self.reader_layout = None
+        self.continuous_view = None
+        self.page_sizes = None
+        # 连续滚动布局变化期间保持不变的页码，期间忽略滚动事件
+        self._continuous_anchor = None
+        # 上次分配控件时的页面范围，滚动没有跨过页面边界时不重新分配和提交渲染
+        self._continuous_window = None
+        self._continuous_scroll_trigger = Clock.create_trigger(lambda dt: self._update_continuous_view())
+        # 性能埋点：perf_trace写跟踪文件，perf_hud显示性能面板（桌面上F12切换）
+        self.perf_trace = False
+        self.perf_hud = False
+        self.perf_hud_label = None
+        self._hud_frames = []
+        self._hud_event = None
         self.load_config()
         self.load_reading_positions()
+        self._setup_instrumentation()
+        phase_start = self._startup_phase('config', phase_start)
+        # 渲染进程已在导入Kivy之前启动（配置中关闭时为None）
+        self.render_pool = STARTUP_RENDER_POOL
+        self._start_memory_governor()
+        Window.bind(on_resize=self.on_window_resize)
+        Window.bind(on_key_down=self.on_key_down)
+        Window.bind(on_flip=self._on_first_frame)
         
         # 恢复上次打开的文件
         self.restore_last_file()
+        self._startup_restored = self._startup_phase('restore', phase_start)
+
+    def _startup_phase(self, name, start):
+        """记录一个启动阶段的耗时，返回下一阶段的开始时间"""
+        now = time.perf_counter()
+        self.startup_phases.append((name, start, now - start))
+        return now
+
+    def _on_first_frame(self, *args):
+        """第一帧绘制完成后输出启动各阶段的耗时，启用埋点时写入跟踪记录"""
+        Window.unbind(on_flip=self._on_first_frame)
+        self._startup_phase('first_frame', self._startup_restored)
+        total = time.perf_counter() - STARTUP_BEGIN
+        for name, start, duration in self.startup_phases:
+            tracer.record('startup.' + name, start, duration)
+        tracer.record('startup.total', STARTUP_BEGIN, total)
+        print("启动耗时: " + ", ".join(f"{name} {duration * 1000:.0f} ms"
+                                      for name, start, duration in self.startup_phases)
+              + f", 共 {total * 1000:.0f} ms")
 
     def load_config(self):
-        """加载配置"""
+        """加载配置（配置文件只在启动时读取一次，内容保留在self.settings中）"""
+        self.settings = {}
         try:
-            if os.path.exists(self.config_file):
+            if STARTUP_CONFIG is not None and self.config_file == "pdf_reader_config.json":
+                # 启动渲染进程时已经读过
+                config = self.settings = STARTUP_CONFIG
+            elif os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    if 'theme' in config:
-                        self.night_mode = (config['theme'] == 'night')
-                    if 'half_page_mode' in config:
-                        self.half_page_mode = config['half_page_mode']
+                    config = self.settings = json.load(f)
+            else:
+                config = None
+            if config:
+                if 'theme' in config:
+                    self.night_mode = (config['theme'] == 'night')
+                if 'half_page_mode' in config:
+                    self.half_page_mode = config['half_page_mode']
+                if 'continuous_mode' in config:
+                    self.continuous_mode = config['continuous_mode']
+                if 'crop_mode' in config:
+                    self.crop_mode = config['crop_mode']
+                if config.get('cache_format') in ('raw', 'png'):
+                    self.cache_format = config['cache_format']
+                if 'gray_pages' in config:
+                    self.gray_pages = bool(config['gray_pages'])
+                if config.get('fit_mode') in ('page', 'width'):
+                    self.fit_mode = config['fit_mode']
+                if config.get('cache_budget_mb'):
+                    self.cache_budget_mb = int(config['cache_budget_mb'])
+                    self.page_cache.budget_bytes = self.cache_budget_mb * 1024 * 1024
+                if config.get('library_roots'):
+                    self.library_roots = list(config['library_roots'])
+                if config.get('disk_cache_mb'):
+                    self.disk_cache_mb = int(config['disk_cache_mb'])
+                    self.disk_cache.budget_bytes = self.disk_cache_mb * 1024 * 1024
+                self.perf_trace = bool(config.get('perf_trace', False))
+                self.perf_hud = bool(config.get('perf_hud', False))
+                if 'render_processes' in config:
+                    self.render_processes = int(config['render_processes'])
+                if 'prerender_pages' in config:
+                    self.prerender_pages = int(config['prerender_pages'])
+                if 'max_background_documents' in config:
+                    self.max_background_documents = int(config['max_background_documents'])
+                if config.get('memory_limit_mb'):
+                    self.memory_limit_mb = int(config['memory_limit_mb'])
         except:
             self.night_mode = False
             self.half_page_mode = False
@@ -90,69 +1344,81 @@ class MainLayout(FloatLayout):
         try:
             config = {
                 'theme': 'night' if self.night_mode else 'day',
-                'half_page_mode': self.half_page_mode
+                'half_page_mode': self.half_page_mode,
+                'crop_mode': self.crop_mode,
+                'continuous_mode': self.continuous_mode,
+                'cache_format': self.cache_format,
+                'gray_pages': self.gray_pages,
+                'cache_budget_mb': self.cache_budget_mb,
+                'disk_cache_mb': self.disk_cache_mb,
+                'render_processes': self.render_processes,
+                'prerender_pages': self.prerender_pages,
+                'max_background_documents': self.max_background_documents,
+                'memory_limit_mb': self.memory_limit_mb,
+                'fit_mode': self.fit_mode,
+                'library_roots': self.library_roots,
+                'perf_trace': self.perf_trace,
+                'perf_hud': self.perf_hud
             }
-            
-            # 保存当前打开的文件路径
-            if hasattr(self, 'file_path') and self.file_path:
-                config['last_file'] = self.file_path
-            
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-        except:
-            pass
+            write_json_atomic(self.config_file, config, indent=2)
+            self.settings = config
+        except Exception as e:
+            print(f"保存配置失败: {e}")
 
     def load_reading_positions(self):
-        """加载阅读位置记录"""
-        self.reading_positions = {}
-        try:
-            if os.path.exists(self.reading_positions_file):
-                with open(self.reading_positions_file, 'r', encoding='utf-8') as f:
-                    self.reading_positions = json.load(f)
-                    print(f"已加载阅读位置记录: {len(self.reading_positions)} 个文件")
-        except Exception as e:
-            print(f"加载阅读位置失败: {e}")
-            self.reading_positions = {}
+        """准备阅读位置记录（第一次使用时才读取文件）"""
+        self.reading_positions = ReadingPositionStore(self.reading_positions_file)
+        # 上次的文件和页码单独保存，启动时不必读取全部阅读记录
+        self.last_page = self.reading_positions.last()
+        if self.last_page is None and self.settings.get('last_file') and self.settings.get('last_page') is not None:
+            # 旧版本把它们保存在配置文件中
+            self.last_page = (os.path.abspath(self.settings['last_file']), self.settings['last_page'])
+        # 翻页时只更新内存，停止翻页2秒后统一写入
+        self._flush_positions_trigger = Clock.create_trigger(
+            lambda dt: self.save_reading_positions(), 2.0)
 
     def save_reading_positions(self):
         """保存阅读位置记录"""
         try:
-            with open(self.reading_positions_file, 'w', encoding='utf-8') as f:
-                json.dump(self.reading_positions, f, ensure_ascii=False, indent=2)
-            print(f"已保存阅读位置记录: {len(self.reading_positions)} 个文件")
+            if self.reading_positions.flush():
+                tracer.count('positions.flush')
         except Exception as e:
             print(f"保存阅读位置失败: {e}")
 
     def get_reading_position(self, file_path):
         """获取文件的阅读位置"""
         file_key = os.path.abspath(file_path)
-        if file_key in self.reading_positions:
-            position = self.reading_positions[file_key]
-            print(f"找到阅读位置: {file_path} -> 第 {position + 1} 页")
+        if self.last_page and self.last_page[0] == file_key:
+            return self.last_page[1]
+        position = self.reading_positions.get(file_key)
+        if position is not None:
             return position
         return 0
 
     def save_reading_position(self, file_path, page_number):
-        """保存文件的阅读位置"""
+        """保存文件的阅读位置（延迟批量写入）"""
         try:
             file_key = os.path.abspath(file_path)
-            self.reading_positions[file_key] = page_number
-            self.save_reading_positions()
-            print(f"保存阅读位置: {file_path} -> 第 {page_number + 1} 页")
+            self.last_page = (file_key, page_number)
+            if self.reading_positions.set(file_key, page_number):
+                self._flush_positions_trigger()
         except Exception as e:
             print(f"保存阅读位置失败: {e}")
 
     def restore_last_file(self):
-        """恢复上次打开的文件"""
+        """恢复上次打开的文件
+        
+        文档总是在后台线程中打开（包括导入PyMuPDF），第一帧立即显示：
+        有磁盘缓存时显示上次的页面，否则先显示正在打开的提示。
+        """
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    if 'last_file' in config and config['last_file']:
-                        last_file = config['last_file']
-                        if os.path.exists(last_file):
-                            Clock.schedule_once(lambda dt: self.load_pdf_file(last_file), 0.5)
-                            return
+            last_file = self.last_page[0] if self.last_page else None
+            if last_file and os.path.exists(last_file):
+                self._open_started = time.perf_counter()
+                if not self._show_disk_preview(last_file):
+                    self._show_splash(last_file)
+                self._open_in_background(last_file)
+                return
             
             # 如果没有上次打开的文件，显示文件列表
             self.show_file_list()
@@ -160,28 +1426,149 @@ class MainLayout(FloatLayout):
             print(f"恢复上次文件失败: {e}")
             self.show_file_list()
 
+    def _show_disk_preview(self, file_path):
+        """从磁盘缓存直接显示文件上次阅读的页面，没有缓存时返回False"""
+        try:
+            fingerprint = file_fingerprint(file_path)
+            page_num = self.get_reading_position(file_path)
+            key, img_data = self.disk_cache.find_latest(fingerprint, page_num)
+            if img_data is None:
+                return False
+            
+            self.file_path = file_path
+            self.fingerprint = fingerprint
+            self.current_page = page_num
+            if self.half_page_mode:
+                self.current_half_page = 'right'
+            self._disk_preview = (key, img_data)
+            
+            self.create_reader_interface()
+            self.page_label.text = f'{page_num + 1}/...'
+            self._show_page_image(img_data)
+            print(f"从磁盘缓存显示第 {page_num + 1} 页")
+            return True
+        except Exception as e:
+            print(f"读取磁盘缓存预览失败: {e}")
+            return False
+    
+    def _show_splash(self, file_path):
+        """启动时没有磁盘缓存可显示，文档打开前先显示提示"""
+        self.clear_widgets()
+        splash = BoxLayout()
+        with splash.canvas.before:
+            self.bg_color = Color(*self.get_bg_color())
+            self.bg_rect = Rectangle(pos=splash.pos, size=splash.size)
+        splash.bind(pos=self.update_bg_rect, size=self.update_bg_rect)
+        splash.add_widget(Label(
+            text=f'正在打开 {os.path.basename(file_path)} ...',
+            font_size='16sp',
+            color=self.get_text_color()
+        ))
+        self.add_widget(splash)
+    
+    def _open_in_background(self, file_path):
+        """在后台线程打开文档，完成后回到UI线程继续加载"""
+        self._opening_file = file_path
+        
+        def open_in_thread():
+            try:
+                doc = open_document(file_path)
+            except Exception as e:
+                print(f"加载失败: {e}")
+                Clock.schedule_once(lambda dt, error=e: self._on_background_open_failed(error), 0)
+                return
+            Clock.schedule_once(lambda dt: self._on_background_opened(file_path, doc), 0)
+        
+        thread = threading.Thread(target=open_in_thread, name='OpenDocument')
+        thread.daemon = True
+        thread.start()
+    
+    def _on_background_opened(self, file_path, doc):
+        # 打开期间用户已经返回文件列表
+        if self._opening_file != file_path:
+            doc.close()
+            return
+        self._opening_file = None
+        self._open_document(file_path, doc)
+    
+    def _on_background_open_failed(self, error):
+        self._open_started = None
+        self.show_file_list()
+        self.show_message(f"加载失败: {str(error)}")
+    
     def toggle_night_mode(self):
         """切换夜间模式"""
         self.night_mode = not self.night_mode
         self.save_config()
-        if hasattr(self, 'doc') and self.doc:
-            self.create_reader_interface()
-        else:
-            self.show_file_list()
+        self.apply_theme()
+        # 着色器不可用时需要换用反色的页面缓存
+        if self.doc and self.reader_layout and not self.pdf_display.shader_ok:
+            self.display_current_page()
+
+    def apply_theme(self):
+        """就地更新当前界面的颜色，不重建控件"""
+        night_mode_text = '夜间模式' if not self.night_mode else '日间模式'
+        
+        for color in (getattr(self, 'bg_color', None), getattr(self, 'reader_bg_color', None)):
+            if color is not None:
+                color.rgba = self.get_bg_color()
+        
+        page_label = self.pdf_display.label if self.reader_layout else None
+        for widget in self.walk(restrict=True):
+            if isinstance(widget, (LibraryRow, PerfHud)):
+                continue
+            if isinstance(widget, Button):
+                widget.background_color = self.get_button_color()
+            elif isinstance(widget, Label):
+                if widget is page_label and self.pdf_display.is_error:
+                    continue
+                widget.color = self.get_text_color()
+        
+        for button in (getattr(self, 'night_mode_btn', None), getattr(self, 'reader_night_mode_btn', None)):
+            if button is not None:
+                button.text = night_mode_text
+        
+        # 文件列表的行由数据驱动，刷新数据即可
+        if self.library_view:
+            self._refresh_library_view()
+        
+        if self.reader_layout:
+            self.pdf_display.set_night(self.night_mode)
+            self.continuous_view.set_night(self.night_mode)
 
     def toggle_half_page_mode(self):
         """切换半边页阅读模式"""
         self.half_page_mode = not self.half_page_mode
         self.save_config()
+        if self.reader_layout:
+            self.half_page_btn.text = '整页' if self.half_page_mode else '半页'
         if hasattr(self, 'doc') and self.doc:
             if self.half_page_mode and not hasattr(self, 'current_half_page'):
                 self.current_half_page = 'right'
             self.display_current_page()
 
+    def toggle_crop_mode(self):
+        """切换自动裁边（只用于翻页阅读，连续滚动模式不裁剪）"""
+        self.crop_mode = not self.crop_mode
+        self.save_config()
+        if self.reader_layout:
+            self.crop_btn.text = '原边' if self.crop_mode else '裁边'
+        if self.doc:
+            self._start_page_crops()
+            self.display_current_page()
+
+    def toggle_continuous_mode(self):
+        """切换连续滚动模式"""
+        self.continuous_mode = not self.continuous_mode
+        self.save_config()
+        if self.reader_layout:
+            self._apply_view_mode()
+            if self.doc and not self.continuous_mode:
+                self.display_current_page()
+
     def toggle_controls(self):
         """切换控制按钮显示/隐藏"""
         self.controls_visible = not self.controls_visible
-        print(f"控制栏显示: {self.controls_visible}")
         
         if hasattr(self, 'top_bar'):
             self.top_bar.opacity = 1 if self.controls_visible else 0
@@ -207,18 +1594,15 @@ class MainLayout(FloatLayout):
     def show_file_list(self, instance=None):
         """显示文件列表界面"""
         self.clear_widgets()
-        self.page_cache.clear()
-        self.half_page_cache.clear()
-        
-        if hasattr(self, 'doc') and self.doc and self.file_path:
-            self.save_reading_position(self.file_path, self.current_page)
-            self.doc.close()
-            self.doc = None
+        self.library_view = None
+        self._opening_file = None
+        self._disk_preview = None
+        self._park_document()
         
         main_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
         
         with main_layout.canvas.before:
-            Color(*self.get_bg_color())
+            self.bg_color = Color(*self.get_bg_color())
             self.bg_rect = Rectangle(pos=main_layout.pos, size=main_layout.size)
         
         main_layout.bind(pos=self.update_bg_rect, size=self.update_bg_rect)
@@ -239,7 +1623,7 @@ class MainLayout(FloatLayout):
             color=self.get_text_color()
         )
         
-        night_mode_btn = Button(
+        self.night_mode_btn = Button(
             text='夜间模式' if not self.night_mode else '日间模式',
             size_hint_x=0.4,
             font_size='16sp',
@@ -247,10 +1631,10 @@ class MainLayout(FloatLayout):
             color=(1, 1, 1, 1),
             background_normal=''
         )
-        night_mode_btn.bind(on_release=lambda x: self.toggle_night_mode())
+        self.night_mode_btn.bind(on_release=lambda x: self.toggle_night_mode())
         
         top_bar.add_widget(title_label)
-        top_bar.add_widget(night_mode_btn)
+        top_bar.add_widget(self.night_mode_btn)
         main_layout.add_widget(top_bar)
         
         # 文件列表区域
@@ -266,165 +1650,545 @@ class MainLayout(FloatLayout):
             self.bg_rect.pos = instance.pos
             self.bg_rect.size = instance.size
 
+    def default_library_roots(self):
+        """默认的文件库扫描目录"""
+        if IS_ANDROID:
+            try:
+                from android.storage import primary_external_storage_path
+                storage = primary_external_storage_path()
+            except ImportError:
+                storage = '/sdcard'
+            return [os.path.join(storage, 'Download'), os.path.join(storage, 'Documents')]
+        return [os.path.dirname(os.path.abspath(__file__))]
+
     def update_file_list(self, content_layout):
-        """更新文件列表"""
-        pdf_files = self.scan_pdf_files()
+        """更新文件列表：先显示已保存的索引，再在后台扫描变化"""
+        if self.library is None:
+            self.library = LibraryIndex(self.library_index_file, self.library_roots)
         
-        if pdf_files:
-            scroll_view = ScrollView()
-            file_list = BoxLayout(orientation='vertical', size_hint_y=None)
-            file_list.bind(minimum_height=file_list.setter('height'))
-            
-            for pdf_file in pdf_files:
-                file_name = os.path.basename(pdf_file)
-                if len(file_name) > 30:
-                    file_name = file_name[:27] + "..."
-                
-                last_position = self.get_reading_position(pdf_file)
-                if last_position > 0:
-                    file_name += f" (读到第{last_position + 1}页)"
-                    
-                file_btn = Button(
-                    text=file_name,
-                    size_hint_y=None,
-                    height=60,
-                    font_size='14sp',
-                    background_color=self.get_button_color(),
-                    color=(1, 1, 1, 1),
-                    background_normal=''
-                )
-                file_btn.bind(on_release=lambda btn, path=pdf_file: self.load_pdf_file(path))
-                file_list.add_widget(file_btn)
-            
-            scroll_view.add_widget(file_list)
-            content_layout.add_widget(scroll_view)
-        else:
-            no_files_label = Label(
-                text='未找到PDF文件\n请将PDF文件放在程序目录',
-                font_size='16sp',
-                halign='center',
-                color=self.get_text_color()
-            )
-            content_layout.add_widget(no_files_label)
+        self.library_status = Label(
+            text='',
+            size_hint_y=None,
+            height=30,
+            font_size='14sp',
+            color=self.get_text_color()
+        )
+        content_layout.add_widget(self.library_status)
+        
+        # 只为可见的行创建控件
+        self.library_view = RecycleView()
+        file_list = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 60),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=2
+        )
+        file_list.bind(minimum_height=file_list.setter('height'))
+        self.library_view.add_widget(file_list)
+        self.library_view.viewclass = LibraryRow
+        content_layout.add_widget(self.library_view)
+        
+        self._refresh_library_view()
+        if self.library.scan(self._on_library_batch, self._on_library_scan_done):
+            self.library_status.text = '正在扫描PDF文件...'
 
-    def scan_pdf_files(self):
-        """扫描PDF文件"""
-        pdf_files = []
+    def _library_row(self, pdf_file, info):
+        """生成文件列表一行的数据"""
+        file_name = info.get('title') or os.path.basename(pdf_file)
+        if len(file_name) > 30:
+            file_name = file_name[:27] + "..."
         
-        if not IS_ANDROID:
-            # 只在PC环境扫描文件
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            try:
-                pdf_files = glob.glob(os.path.join(current_dir, "*.pdf"))
-                print(f"找到 {len(pdf_files)} 个PDF文件")
-            except Exception as e:
-                print(f"扫描错误: {e}")
+        if info.get('pages'):
+            file_name += f" · {info['pages']}页"
+        
+        last_position = self.get_reading_position(pdf_file)
+        if last_position > 0:
+            file_name += f" (读到第{last_position + 1}页)"
         
-        return pdf_files[:10]
+        if pdf_file in self.sessions:
+            file_name += " · 已打开"
+        
+        return {
+            'text': file_name,
+            'file_path': pdf_file,
+            'reader': self,
+            'font_size': '14sp',
+            'background_color': self.get_button_color(),
+            'color': (1, 1, 1, 1),
+            'background_normal': ''
+        }
+
+    def _refresh_library_view(self):
+        """按索引重建列表数据"""
+        if not self.library_view:
+            return
+        entries = self.library.entries()
+        # 后台保留的文档排在最前面，最近看过的在上
+        infos = dict(entries)
+        rows = [self._library_row(path, infos.get(path, {})) for path in reversed(self.sessions)]
+        rows.extend(self._library_row(path, info) for path, info in entries if path not in self.sessions)
+        self.library_view.data = rows
+        self._library_paths = set(infos) | set(self.sessions)
+        if entries:
+            self.library_status.text = f'共 {len(entries)} 个PDF文件'
+            if self.sessions:
+                self.library_status.text += f'，{len(self.sessions)} 个已打开'
+        elif self.sessions:
+            self.library_status.text = f'{len(self.sessions)} 个已打开的文档'
+        elif not self.library.scanning:
+            self.library_status.text = '未找到PDF文件\n请将PDF文件放在程序目录'
+
+    def _on_library_batch(self, batch):
+        """后台扫描到一批新文件（在扫描线程中调用）"""
+        Clock.schedule_once(lambda dt: self._append_library_rows(batch), 0)
+
+    def _append_library_rows(self, batch):
+        if not self.library_view:
+            return
+        rows = [self._library_row(path, info) for path, info in batch
+                if path not in self._library_paths]
+        self._library_paths.update(path for path, info in batch)
+        self.library_view.data.extend(rows)
+        self.library_status.text = f'正在扫描PDF文件... 已找到 {len(self._library_paths)} 个'
+
+    def _on_library_scan_done(self):
+        Clock.schedule_once(lambda dt: self._refresh_library_view(), 0)
 
     def load_pdf_file(self, file_path):
         """加载PDF文件"""
         print(f"加载文件: {file_path}")
+        if self._open_started is None:
+            self._open_started = time.perf_counter()
         try:
             if not os.path.exists(file_path):
                 self.show_message("文件不存在")
                 return
             
-            self.file_path = file_path
-            self.doc = fitz.open(file_path)
-            self.total_pages = len(self.doc)
-            
-            self.current_page = self.get_reading_position(file_path)
-            
-            if self.current_page >= self.total_pages:
-                self.current_page = self.total_pages - 1
-            
-            print(f"跳转到上次阅读位置: 第 {self.current_page + 1} 页")
-            
-            if self.half_page_mode:
-                self.current_half_page = 'right'
+            session = self.sessions.get(file_path)
+            if session and session.fingerprint == file_fingerprint(file_path):
+                self._resume_document(session)
+                return
+            if session:
+                # 文件在保留期间被修改过，关闭旧的版本重新打开
+                self._close_session(file_path)
             
-            self.preload_pages()
-            self.create_reader_interface()
+            self._open_document(file_path, open_document(file_path))
             
         except Exception as e:
             print(f"加载失败: {e}")
+            self._open_started = None
             self.show_message(f"加载失败: {str(e)}")
     
-    def preload_pages(self):
-        """预加载页面到缓存"""
-        if not self.doc:
+    def _open_document(self, file_path, doc):
+        """使用已打开的文档进入阅读界面"""
+        # 切换文件前保留上一个文件，并写入未保存的阅读位置
+        self._park_document()
+        self.save_reading_positions()
+        self.file_path = file_path
+        self.doc = doc
+        self.total_pages = len(self.doc)
+        self.page_cache.clear()
+        self._enforce_memory_budget()
+        self.page_rects = {}
+        self.page_sizes = None
+        self._shown_page = None
+        
+        try:
+            self.fingerprint = file_fingerprint(file_path)
+        except OSError:
+            self.fingerprint = None
+        
+        # 磁盘预览留在内存缓存中，清晰页面渲染完成前继续显示
+        preview = self._disk_preview
+        self._disk_preview = None
+        if preview and preview[0].page < self.total_pages:
+            self.page_cache.put(*preview)
+        
+        self._start_render_worker()
+        self._start_search_index()
+        self._start_thumbnails()
+        self.prefetch_planner.reset()
+        
+        self.current_page = self.get_reading_position(file_path)
+        
+        if self.current_page >= self.total_pages:
+            self.current_page = self.total_pages - 1
+        
+        self._stop_page_crops()
+        self._start_page_crops()
+        
+        print(f"跳转到上次阅读位置: 第 {self.current_page + 1} 页")
+        
+        if self.half_page_mode:
+            self.current_half_page = 'right'
+        
+        self.create_reader_interface()
+        # 先渲染并显示目标页，下一帧之后再开始预加载其他页面
+        self._render_first_page()
+        Clock.schedule_once(lambda dt: self.preload_pages(), 0)
+    
+    def _park_document(self):
+        """把当前文档连同缓存和后台状态移到后台保留，阅读界面回到未打开文档的状态"""
+        self._stop_render_worker()
+        if not self.doc or not self.file_path:
             return
-            
-        # 预加载当前页和前后几页
-        start_page = max(0, self.current_page - 2)
-        end_page = min(self.total_pages - 1, self.current_page + 2)
         
-        for page_num in range(start_page, end_page + 1):
-            if page_num not in self.page_cache:
-                self._load_page_to_cache(page_num)
+        if len(self.page_cache):
+            print(f"页面缓存统计: {self.page_cache.stats()}")
+            print(f"预取统计: {self.prefetch_planner.stats()}")
+        self.save_reading_position(self.file_path, self.current_page)
+        self.save_reading_positions()
+        
+        # 后台线程停止，恢复时从未完成的页面继续
+        if self.search_index:
+            self.search_index.stop()
+        if self.page_crops:
+            self.page_crops.stop()
+        if self.thumbnail_worker:
+            self.thumbnail_worker.stop()
+            self.thumbnail_worker = None
+        self.page_cache.pin_pages([])
+        self.sessions[self.file_path] = DocumentSession(self)
+        self.sessions.move_to_end(self.file_path)
+        
+        self.doc = None
+        self.page_cache = PageCache(self.cache_budget_mb * 1024 * 1024)
+        self.prefetch_planner = PrefetchPlanner(battery_check=battery_is_low)
+        self.search_index = None
+        self.search_query = ''
+        self.search_hits = {}
+        self.page_crops = None
+        self.thumbnails = None
+        self._thumb_textures.clear()
+        self.outline = None
+        self._outline_loading = False
+        self._shown_page = None
+        self._displayed_key = None
+        self._enforce_memory_budget()
+    
+    def _resume_document(self, session):
+        """恢复后台保留的文档，页面直接从保留的缓存显示"""
+        self.save_reading_positions()
+        del self.sessions[session.file_path]
+        session.restore(self)
+        self._shown_page = None
+        self._enforce_memory_budget()
+        print(f"恢复已打开的文档: 第 {self.current_page + 1} 页, 缓存 {len(self.page_cache)} 项")
+        
+        self._start_render_worker()
+        index = self.search_index
+        Clock.schedule_once(lambda dt: self._build_search_index(index), 1.0)
+        store = self.thumbnails
+        Clock.schedule_once(lambda dt: self._start_thumbnail_worker(store), 1.5)
+        self._start_page_crops()
+        
+        self.create_reader_interface()
+        self._render_first_page()
+        Clock.schedule_once(lambda dt: self.preload_pages(), 0)
+    
+    def _close_session(self, file_path):
+        session = self.sessions.pop(file_path, None)
+        if session:
+            session.close()
+            print(f"关闭后台文档: {file_path}")
     
-    def _load_page_to_cache(self, page_num):
-        """加载指定页面到缓存"""
+    def _enforce_memory_budget(self):
+        """在所有打开的文档之间分配页面缓存的内存预算
+        
+        后台文档的缓存合计最多占预算的一半，超出时从最久未看的文档开始淘汰，
+        预算的其余部分留给当前文档；后台文档超过数量上限时关闭最久未看的文档。
+        """
+        while len(self.sessions) > self.max_background_documents:
+            self._close_session(next(iter(self.sessions)))
+        
+        budget = int(self.cache_budget_mb * 1024 * 1024 * PRESSURE_BUDGET_SCALE[self.memory_pressure])
+        background_bytes = sum(session.page_cache.total_bytes for session in self.sessions.values())
+        for session in self.sessions.values():
+            excess = background_bytes - budget // 2
+            if excess <= 0:
+                break
+            cache = session.page_cache
+            before = cache.total_bytes
+            cache.set_budget(before - excess)
+            background_bytes -= before - cache.total_bytes
+        self.page_cache.set_budget(budget - background_bytes)
+    
+    def _start_memory_governor(self):
+        """每2秒检查一次进程内存，Android上同时接收系统的内存信号"""
+        self.memory_governor = MemoryGovernor(self.memory_limit_mb * 1024 * 1024, self._on_memory_pressure)
+        Clock.schedule_interval(lambda dt: self.memory_governor.poll(), 2.0)
+        self._trim_callbacks = register_trim_memory_callback(
+            lambda level: Clock.schedule_once(lambda dt: self.memory_governor.signal(level), 0))
+    
+    def _on_memory_pressure(self, level):
+        """内存压力等级变化时逐级释放内存
+        
+        MODERATE: 丢弃预取和之前看过的页面、后台文档的页面缓存和缩略图纹理，暂停预取；
+        HIGH: 正在显示的页面之外的缓存（预览、放大瓦片等）写入磁盘缓存后从内存中释放；
+        CRITICAL: 按较低的渲染倍数重新渲染当前页，不再叠加放大瓦片。
+        压力解除后恢复缓存预算和渲染倍数，预取在下次翻页时恢复。
+        """
+        rss = self.memory_governor.rss or 0
+        print(f"内存压力等级: {self.memory_pressure} -> {level} (常驻内存 {rss / 1048576:.0f} MB)")
+        self.memory_pressure = level
+        render_scale = LOW_MEMORY_RENDER_SCALE if level >= MEMORY_CRITICAL else 1.0
+        scale_changed = render_scale != self.render_scale
+        self.render_scale = render_scale
+        self._enforce_memory_budget()
+        
+        if level >= MEMORY_MODERATE:
+            for session in self.sessions.values():
+                session.page_cache.clear()
+            visible = self._visible_pages()
+            self.page_cache.drop(lambda key: key.page not in visible)
+            if not self.navigation_popup:
+                self._thumb_textures.clear()
+        if level >= MEMORY_HIGH:
+            self._spill_page_cache()
+        
+        if scale_changed and self.reader_layout is not None:
+            self._tile_textures = {}
+            self.pdf_display.set_tiles({})
+            if self.reader_layout.parent:
+                self.display_current_page()
+    
+    def _visible_pages(self):
+        if self.continuous_mode and self.continuous_view:
+            return set(self.continuous_view.slots)
+        return {self.current_page}
+    
+    def _spill_page_cache(self):
+        """释放正在显示的页面之外的缓存，磁盘缓存中还没有的先交给渲染线程写入"""
+        if self.continuous_mode and self.continuous_view:
+            keep = set(self._continuous_key(page_num) for page_num in self.continuous_view.slots)
+        else:
+            keep = {self._displayed_key}
+        dropped = self.page_cache.drop(lambda key: key not in keep)
+        if self.render_worker and self.fingerprint:
+            for key, img_data in dropped:
+                if not self.disk_cache.contains(self.fingerprint, key):
+                    self.render_worker.store(key, img_data)
+    
+    def _render_first_page(self):
+        """在UI线程中直接渲染目标页
+        
+        打开文件时渲染线程还要重新打开一次文档，直接用已打开的文档渲染
+        可以省去线程启动和重复打开的时间；结果交给渲染线程写入磁盘缓存。
+        """
+        if self.continuous_mode:
+            key = self._continuous_key(self.current_page)
+        else:
+            key = self._current_page_key()
+        if key in self.page_cache:
+            return
+        
         try:
-            page = self.doc[page_num]
-            mat = fitz.Matrix(2.0, 2.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # 添加到缓存
-            self.page_cache[page_num] = img_data
-            
-            # 保持缓存大小
-            if len(self.page_cache) > self.cache_size:
-                # 移除最旧的页面
-                oldest_page = next(iter(self.page_cache))
-                del self.page_cache[oldest_page]
-                
+            with tracer.span('open.first_page', page=key.page):
+                img_data = None
+                if self.fingerprint:
+                    img_data = self.disk_cache.get(self.fingerprint, key)
+                if img_data is None:
+                    img_data = render_page_image(self.doc, key, compact=(self.cache_format == 'png'))
+                    if self.render_worker:
+                        self.render_worker.store(key, img_data)
+                self.page_cache.put(key, img_data)
         except Exception as e:
-            print(f"预加载页面 {page_num} 失败: {e}")
+            # 交给正常的后台渲染流程处理
+            print(f"首页渲染失败: {e}")
     
-    def _load_half_page_to_cache(self, page_num, is_left_half):
-        """加载半边页面到缓存"""
-        try:
-            page = self.doc[page_num]
-            mat = fitz.Matrix(2.0, 2.0)
-            
-            # 获取页面尺寸
-            rect = page.rect
-            width = rect.width
-            height = rect.height
-            
-            # 计算半边页的矩形区域
-            if is_left_half:
-                clip_rect = fitz.Rect(0, 0, width/2, height)
-            else:
-                clip_rect = fitz.Rect(width/2, 0, width, height)
-            
-            pix = page.get_pixmap(matrix=mat, clip=clip_rect)
-            img_data = pix.tobytes("png")
-            
-            # 添加到半边页缓存
-            cache_key = (page_num, is_left_half)
-            self.half_page_cache[cache_key] = img_data
+    def _note_first_page(self):
+        """页面第一次显示时记录从开始打开文件到显示的耗时"""
+        if self._open_started is not None:
+            elapsed = time.perf_counter() - self._open_started
+            tracer.record('open.time_to_first_page', self._open_started, elapsed)
+            print(f"首页显示耗时: {elapsed * 1000:.0f} ms")
+            self._open_started = None
+    
+    def preload_pages(self):
+        """预加载页面到缓存（由后台线程渲染）"""
+        if not self.doc:
+            return
             
-            # 保持缓存大小
-            if len(self.half_page_cache) > self.cache_size * 2:
-                oldest_page = next(iter(self.half_page_cache))
-                del self.half_page_cache[oldest_page]
-                
-        except Exception as e:
-            print(f"预加载半边页面 {page_num} 失败: {e}")
+        # 预加载当前页和预取计划中的页面
+        self._request_page(self._page_key(self.current_page), PRIORITY_CURRENT)
+        self._preload_adjacent_pages()
+    
+    def _get_page_rect(self, page_num):
+        """获取页面尺寸（按页缓存，避免重复加载页面）"""
+        rect = self.page_rects.get(page_num)
+        if rect is None:
+            rect = self.doc[page_num].rect
+            self.page_rects[page_num] = rect
+        return rect
+    
+    def _update_view_size(self, force=False):
+        """更新页面显示区域大小（像素），变化不超过10%时保持不变，避免重新渲染"""
+        width = max(Window.width - 40, 1)
+        height = max(Window.height * 0.8 - 40, 1)
+        
+        old_size = self.view_size
+        if not force and old_size:
+            if (abs(width - old_size[0]) < old_size[0] * 0.1 and
+                    abs(height - old_size[1]) < old_size[1] * 0.1):
+                return False
+        
+        self.view_size = (width, height)
+        return True
+    
+    def _page_crop(self, page_num, side=None):
+        """自动裁边时页面（或半边）的内容区域（页面坐标），不裁剪时返回None"""
+        if self.crop_mode and self.page_crops and not self.continuous_mode:
+            return self.page_crops.get(page_num, side)
+        return None
+    
+    def _region_of(self, page_num, side=None):
+        """翻页阅读时显示的页面区域（页面坐标）：整页或半边，自动裁边时再与各自的内容区域取交集"""
+        return half_page_region(self._get_page_rect(page_num), side, self._page_crop(page_num, side))
+    
+    def _page_clip(self, page_num):
+        """光栅化的页面区域，整页时为None
+        
+        半页模式下为左右两半各自裁边后的外接矩形，两半从同一张图像中截取。
+        """
+        if self.half_page_mode:
+            left = self._region_of(page_num, 'left')
+            right = self._region_of(page_num, 'right')
+            clip = (min(left[0], right[0]), min(left[1], right[1]),
+                    max(left[2], right[2]), max(left[3], right[3]))
+        else:
+            clip = self._region_of(page_num)
+        return None if clip == tuple(self._get_page_rect(page_num)) else clip
+    
+    def _page_zoom(self, page_num, half=False):
+        """根据显示区域和适配方式计算渲染缩放倍数
+        
+        Window的尺寸是物理像素，按显示区域算出的倍数已经包含了屏幕DPI。
+        半页模式下按半边适配显示区域（两半裁边后大小不同时取较大的倍数），
+        裁边后按内容区域适配（相当于更大的倍数）。
+        """
+        sides = ('left', 'right') if half else (None,)
+        zoom = 0
+        for side in sides:
+            x0, y0, x1, y1 = self._region_of(page_num, side)
+            zoom = max(zoom, fit_zoom(x1 - x0, y1 - y0, self.view_size, self.fit_mode))
+        return zoom * self.render_scale
+    
+    def _page_key(self, page_num):
+        """生成页面的缓存键
+        
+        半页模式下整页只光栅化一次，左右两半在显示时从同一张纹理中截取；
+        自动裁边时只光栅化内容区域，半页模式下先按页面中线分开，两半再各自裁边。
+        """
+        zoom = self._page_zoom(page_num, half=self.half_page_mode)
+        return CacheKey(page_num, self._page_clip(page_num), zoom, self._page_colormode())
+    
+    def _page_colormode(self):
+        """页面的颜色模式：夜间模式通常由着色器实时处理，只有不支持着色器时才缓存反色页面"""
+        if self.night_mode and self.reader_layout and not self.pdf_display.shader_ok:
+            return 'night'
+        return 'rgb'
+    
+    def _request_page(self, key, priority):
+        """提交后台渲染请求，已缓存的页面直接跳过"""
+        if not self.render_worker or key in self.page_cache:
+            return
+        self.render_worker.submit(key, priority, self._on_page_rendered)
+    
+    def _on_page_rendered(self, worker, key, img_data, error=None):
+        """后台渲染完成，在UI线程中回调"""
+        if worker is not self.render_worker:
+            return
+        if img_data is None:
+            self._show_render_error(key, error)
+            return
+        
+        self.page_cache.put(key, img_data)
+        
+        if self.continuous_mode:
+            if key.page in self.continuous_view.slots:
+                self._fill_continuous_slot(key.page, PRIORITY_CURRENT)
+            return
+        
+        # 仍停留在这一页时才刷新显示（预览或清晰页面）
+        current_key = self._current_page_key()
+        if key.page == current_key.page and key.clip == current_key.clip:
+            self._render_page()
+    
+    def _show_render_error(self, key, error):
+        """清晰页面渲染失败时在它的位置显示错误，不再停留在预览或"加载中..."状态
+        
+        预览渲染失败时不处理，同一页的清晰页面通常也会失败并在这里报告。
+        """
+        message = f"渲染失败: {error}" if error is not None else "渲染失败"
+        if self.continuous_mode:
+            slot = self.continuous_view.slots.get(key.page)
+            if slot is not None and key == self._continuous_key(key.page):
+                slot.show_message(message, (1, 0, 0, 1), is_error=True)
+                slot.preview_source = None
+            return
+        if key == self._current_page_key():
+            self.pdf_display.show_message(message, (1, 0, 0, 1), is_error=True)
+            self._fit_page_view()
+    
+    def _deliver_from_worker(self, callback, *args):
+        """把后台线程的结果转交给UI线程"""
+        Clock.schedule_once(lambda dt: callback(*args), 0)
+    
+    def _start_render_worker(self):
+        """为当前文档启动后台渲染线程，有渲染进程池时由线程分派给各个进程"""
+        self._stop_render_worker()
+        options = dict(
+            compact=(self.cache_format == 'png'),
+            disk_cache=self.disk_cache if self.fingerprint else None,
+            fingerprint=self.fingerprint,
+            gray=self.gray_pages
+        )
+        if self.render_pool and not self.render_pool.broken:
+            self.render_worker = ProcessRenderWorker(self.file_path, self._deliver_from_worker,
+                                                     self.render_pool, **options)
+        else:
+            self.render_worker = RenderWorker(self.file_path, self._deliver_from_worker, **options)
+        self.render_worker.start()
+    
+    def _stop_render_worker(self):
+        """停止后台渲染线程"""
+        if self.render_worker:
+            self.render_worker.stop()
+            self.render_worker = None
+    
+    def stop_render_pool(self):
+        """退出时结束渲染进程"""
+        self._stop_render_worker()
+        if self.render_pool:
+            self.render_pool.shutdown()
+            self.render_pool = None
     
     def create_reader_interface(self):
+        """显示阅读界面，控件只在第一次创建，之后重复使用"""
         self.clear_widgets()
+        self.library_view = None
+        
+        if self.reader_layout is None:
+            self._build_reader_interface()
         
+        self.title_label.text = os.path.basename(self.file_path)
+        self.half_page_btn.text = '整页' if self.half_page_mode else '半页'
+        self.add_widget(self.reader_layout)
+        self.apply_theme()
+        
+        self._update_view_size(force=True)
+        self._apply_view_mode()
+        self.display_current_page()
+    
+    def _build_reader_interface(self):
+        """创建阅读界面的控件树"""
         # 主布局
         main_layout = FloatLayout()
         
         # 设置背景色
         with main_layout.canvas.before:
-            Color(*self.get_bg_color())
+            self.reader_bg_color = Color(*self.get_bg_color())
             self.reader_bg_rect = Rectangle(pos=main_layout.pos, size=main_layout.size)
         
         main_layout.bind(pos=self.update_reader_bg_rect, size=self.update_reader_bg_rect)
@@ -440,7 +2204,7 @@ class MainLayout(FloatLayout):
         
         back_btn = Button(
             text='浏览文件', 
-            size_hint_x=0.2,
+            size_hint_x=0.13,
             font_size='14sp',
             background_color=self.get_button_color(),
             color=(1, 1, 1, 1),
@@ -448,37 +2212,70 @@ class MainLayout(FloatLayout):
         )
         back_btn.bind(on_release=self.show_file_list)
         
-        title_label = Label(
+        self.title_label = Label(
             text=os.path.basename(self.file_path),
-            size_hint_x=0.4,
+            size_hint_x=0.22,
             font_size='16sp',
             color=self.get_text_color()
         )
         
-        half_page_btn = Button(
+        search_btn = Button(
+            text='搜索',
+            size_hint_x=0.13,
+            font_size='14sp',
+            background_color=self.get_button_color(),
+            color=(1, 1, 1, 1),
+            background_normal=''
+        )
+        search_btn.bind(on_release=self.show_search_popup)
+        
+        self.continuous_btn = Button(
+            text='翻页' if self.continuous_mode else '滚动',
+            size_hint_x=0.13,
+            font_size='14sp',
+            background_color=self.get_button_color(),
+            color=(1, 1, 1, 1),
+            background_normal=''
+        )
+        self.continuous_btn.bind(on_release=lambda x: self.toggle_continuous_mode())
+        
+        self.half_page_btn = Button(
             text='整页' if self.half_page_mode else '半页',
-            size_hint_x=0.2,
+            size_hint_x=0.13,
             font_size='14sp',
             background_color=self.get_button_color(),
             color=(1, 1, 1, 1),
             background_normal=''
         )
-        half_page_btn.bind(on_release=lambda x: self.toggle_half_page_mode())
+        self.half_page_btn.bind(on_release=lambda x: self.toggle_half_page_mode())
         
-        night_mode_btn = Button(
+        self.crop_btn = Button(
+            text='原边' if self.crop_mode else '裁边',
+            size_hint_x=0.13,
+            font_size='14sp',
+            background_color=self.get_button_color(),
+            color=(1, 1, 1, 1),
+            background_normal=''
+        )
+        self.crop_btn.bind(on_release=lambda x: self.toggle_crop_mode())
+        
+        self.reader_night_mode_btn = Button(
             text='夜间模式' if not self.night_mode else '日间模式',
-            size_hint_x=0.2,
+            size_hint_x=0.13,
             font_size='14sp',
             background_color=self.get_button_color(),
             color=(1, 1, 1, 1),
             background_normal=''
         )
-        night_mode_btn.bind(on_release=lambda x: self.toggle_night_mode())
+        self.reader_night_mode_btn.bind(on_release=lambda x: self.toggle_night_mode())
         
         self.top_bar.add_widget(back_btn)
-        self.top_bar.add_widget(title_label)
-        self.top_bar.add_widget(half_page_btn)
-        self.top_bar.add_widget(night_mode_btn)
+        self.top_bar.add_widget(self.title_label)
+        self.top_bar.add_widget(search_btn)
+        self.top_bar.add_widget(self.continuous_btn)
+        self.top_bar.add_widget(self.half_page_btn)
+        self.top_bar.add_widget(self.crop_btn)
+        self.top_bar.add_widget(self.reader_night_mode_btn)
         
         # 底部控制栏
         self.bottom_bar = BoxLayout(
@@ -491,7 +2288,7 @@ class MainLayout(FloatLayout):
         
         next_btn = Button(
             text='下一页', 
-            size_hint_x=0.3,
+            size_hint_x=0.25,
             font_size='14sp',
             background_color=self.get_button_color(),
             color=(1, 1, 1, 1),
@@ -501,15 +2298,25 @@ class MainLayout(FloatLayout):
         
         self.page_label = Label(
             text=f'{self.current_page + 1}/{self.total_pages}',
-            size_hint_x=0.4,
+            size_hint_x=0.3,
             font_size='16sp',
             color=self.get_text_color(),
             bold=True
         )
         
+        navigation_btn = Button(
+            text='目录',
+            size_hint_x=0.2,
+            font_size='14sp',
+            background_color=self.get_button_color(),
+            color=(1, 1, 1, 1),
+            background_normal=''
+        )
+        navigation_btn.bind(on_release=self.show_navigation_popup)
+        
         prev_btn = Button(
             text='上一页', 
-            size_hint_x=0.3,
+            size_hint_x=0.25,
             font_size='14sp',
             background_color=self.get_button_color(),
             color=(1, 1, 1, 1),
@@ -519,6 +2326,7 @@ class MainLayout(FloatLayout):
         
         self.bottom_bar.add_widget(next_btn)
         self.bottom_bar.add_widget(self.page_label)
+        self.bottom_bar.add_widget(navigation_btn)
         self.bottom_bar.add_widget(prev_btn)
         
         # PDF显示区域
@@ -531,27 +2339,172 @@ class MainLayout(FloatLayout):
         )
         
         self.scroll_view.bind(on_touch_down=self.on_scroll_view_touch_down)
+        self.scroll_view.bind(on_touch_move=self.on_scroll_view_touch_move)
         self.scroll_view.bind(on_touch_up=self.on_scroll_view_touch_up)
         
-        self.pdf_display = BoxLayout(
-            orientation='vertical',
-            size_hint=(None, None),
-            padding=10
-        )
-        self.pdf_display.bind(minimum_size=self.pdf_display.setter('size'))
-        
+        # 常驻的页面控件，翻页时只替换纹理
+        self.pdf_display = PageView(size_hint=(None, None))
         self.scroll_view.add_widget(self.pdf_display)
+        self.scroll_view.bind(size=self._fit_page_view)
         
-        self.display_current_page()
+        # 连续滚动模式的页面容器，与pdf_display二选一放在scroll_view中
+        self.continuous_view = ContinuousView(size_hint=(None, None))
+        self.scroll_view.bind(scroll_y=self._on_continuous_scroll)
+        self.scroll_view.bind(scroll_x=self._on_page_scroll, scroll_y=self._on_page_scroll)
         
         main_layout.add_widget(self.top_bar)
         main_layout.add_widget(self.bottom_bar)
         main_layout.add_widget(self.scroll_view)
         
-        self.add_widget(main_layout)
+        self.perf_hud_label = PerfHud(
+            size_hint=(None, None),
+            pos_hint={'right': 1, 'top': 0.9},
+            font_size='12sp',
+            halign='left',
+            color=(0.4, 1, 0.4, 1)
+        )
+        
+        self.reader_layout = main_layout
+        self._apply_perf_hud()
+    
+    def _apply_view_mode(self):
+        """按当前模式在scroll_view中放入单页控件或连续滚动容器"""
+        self.continuous_btn.text = '翻页' if self.continuous_mode else '滚动'
+        view = self.continuous_view if self.continuous_mode else self.pdf_display
+        if view.parent is not self.scroll_view:
+            self.scroll_view.clear_widgets()
+            self.scroll_view.add_widget(view)
+        if not self.continuous_mode:
+            self.continuous_view.release_all()
+        elif self.doc:
+            self._relayout_continuous_view()
+    
+    def _get_page_sizes(self):
+        """所有页面的尺寸，每个文档只计算一次（决定连续滚动的总高度）"""
+        if self.page_sizes is None:
+            self.page_sizes = []
+            for page_num in range(self.total_pages):
+                rect = self._get_page_rect(page_num)
+                self.page_sizes.append((rect.width, rect.height))
+        return self.page_sizes
+    
+    def _relayout_continuous_view(self):
+        """滚动区域变化后重新布局连续滚动视图，并保持当前页不变
+        
+        ScrollView会在下一帧按新尺寸修正scroll_y，这里先记下当前页，
+        下一帧布局完成后再滚动回去，期间的滚动事件不更新当前页。
+        """
+        if self._continuous_anchor is None:
+            self._continuous_anchor = self.current_page
+            Clock.schedule_once(self._finish_continuous_relayout, 0)
+    
+    def _finish_continuous_relayout(self, dt):
+        page_num, self._continuous_anchor = self._continuous_anchor, None
+        if not (self.continuous_mode and self.doc):
+            return
+        with tracer.span('layout.continuous', pages=self.total_pages):
+            self.continuous_view.set_layout(self.scroll_view.width, self.view_size[0],
+                                            self._get_page_sizes())
+        self._scroll_to_page(page_num)
+    
+    def _continuous_key(self, page_num):
+        """连续滚动模式下页面的缓存键（按宽度适配）"""
+        rect = self._get_page_rect(page_num)
+        zoom = fit_zoom(rect.width, rect.height, self.view_size, 'width') * self.render_scale
+        return CacheKey(page_num, None, zoom, self._page_colormode())
+    
+    def _scroll_to_page(self, page_num):
+        """连续滚动模式下滚动到某页顶部"""
+        view = self.continuous_view
+        scrollable = view.height - self.scroll_view.height
+        if scrollable <= 0 or not view.offsets:
+            self.scroll_view.scroll_y = 1
+            return
+        offset = view.offsets[min(page_num, len(view.offsets) - 1)]
+        self.scroll_view.scroll_y = max(0.0, min(1.0, 1 - offset / scrollable))
+        # 跳转或重新布局后页面尺寸可能已变，全部重新填充
+        self._continuous_window = None
+        self._update_continuous_view()
+    
+    def _on_continuous_scroll(self, instance, value):
+        if self.continuous_mode and self.doc and self._continuous_anchor is None:
+            # 同一帧内的多次滚动事件合并为一次更新
+            self._continuous_scroll_trigger()
+    
+    def _update_continuous_view(self):
+        """根据滚动位置为可见页面（及上下余量）分配控件，其余页面的控件回收"""
+        view = self.continuous_view
+        if not view.offsets:
+            return
+        
+        viewport = self.scroll_view.height
+        scrollable = max(view.height - viewport, 0)
+        top = (1 - self.scroll_view.scroll_y) * scrollable
+        margin = viewport * 0.5
+        
+        first = view.page_at(max(top - margin, 0))
+        last = view.page_at(top + viewport + margin)
+        visible_first = view.page_at(top)
+        visible_last = view.page_at(top + viewport)
+        pages = range(first, last + 1)
+        window = (first, last, visible_first, visible_last)
+        
+        # 页面范围变化（或控件被全部回收）时才重新分配控件和提交渲染
+        if window != self._continuous_window or len(view.slots) != len(pages):
+            self._continuous_window = window
+            view.release_except(pages)
+            self.page_cache.pin_pages(pages)
+            
+            # 离开视口的页面请求直接作废
+            if self.render_worker:
+                self.render_worker.new_generation()
+            
+            for page_num in pages:
+                visible = visible_first <= page_num <= visible_last
+                self._fill_continuous_slot(page_num, PRIORITY_CURRENT if visible else PRIORITY_PREFETCH)
+        
+        # 视口上方三分之一处的页面作为当前页
+        current = view.page_at(top + viewport / 3)
+        if current != self.current_page:
+            self.current_page = current
+            if self.file_path:
+                self.save_reading_position(self.file_path, self.current_page)
+        self.page_label.text = f'{self.current_page + 1}/{self.total_pages}'
+    
+    def _fill_continuous_slot(self, page_num, priority):
+        """为页面控件设置纹理，未缓存时先显示预览并提交渲染"""
+        slot = self.continuous_view.acquire(page_num)
+        slot.set_highlights(self._page_highlights(page_num, None))
+        key = self._continuous_key(page_num)
+        if slot.page_key == key:
+            return
+        
+        display_size = (self.continuous_view.page_width, slot.height)
+        img_data = self.page_cache.get(key)
+        if img_data is not None:
+            slot.set_page(create_page_texture(img_data), display_size)
+            slot.page_key = key
+            slot.preview_source = None
+            self._note_first_page()
+            return
+        
+        self._request_page(key, priority)
+        preview = self.page_cache.find_any(page_num, None) or self._thumbnail_preview(key)
+        if preview is not None:
+            if preview is not slot.preview_source:
+                slot.set_page(create_page_texture(preview), display_size)
+                slot.preview_source = preview
+        elif slot.texture is None:
+            slot.show_message('加载中...', self.get_text_color())
     
     def on_scroll_view_touch_down(self, instance, touch):
         """处理PDF显示区域的触摸按下事件"""
+        if self.continuous_mode:
+            # 连续滚动模式下触摸交给ScrollView处理滚动，这里只记录起点用于判断点击
+            if instance.collide_point(*touch.pos):
+                touch.ud['reader_tap_start'] = (touch.x, touch.y, touch.time_start)
+            return False
+        
         if instance.collide_point(*touch.pos):
             top_bar_clicked = (hasattr(self, 'top_bar') and 
                               self.top_bar.collide_point(*touch.pos) and 
@@ -562,14 +2515,58 @@ class MainLayout(FloatLayout):
                                  self.bottom_bar.opacity > 0)
             
             if not top_bar_clicked and not bottom_bar_clicked:
+                if touch.is_mouse_scrolling:
+                    # 鼠标滚轮缩放
+                    if touch.button == 'scrolldown':
+                        self._set_user_zoom(self.user_zoom * 1.25, touch.pos)
+                    elif touch.button == 'scrollup':
+                        self._set_user_zoom(self.user_zoom / 1.25, touch.pos)
+                    return True
+                
+                self._active_touches[touch.uid] = touch
+                if len(self._active_touches) == 2:
+                    # 第二根手指按下，开始双指缩放
+                    first, second = self._active_touches.values()
+                    self._pinch = (max(first.distance(second.pos), 1), self.user_zoom)
+                    first.ud['reader_pinch'] = True
+                    second.ud['reader_pinch'] = True
+                
                 self.touch_start_x = touch.x
                 self.touch_start_y = touch.y
                 self.touch_start_time = touch.time_start
                 return True
         return False
 
+    def on_scroll_view_touch_move(self, instance, touch):
+        """双指缩放，放大后单指拖动页面"""
+        if self.continuous_mode or touch.uid not in self._active_touches:
+            return False
+        
+        if self._pinch and len(self._active_touches) == 2:
+            first, second = self._active_touches.values()
+            start_distance, start_zoom = self._pinch
+            center = ((first.x + second.x) / 2, (first.y + second.y) / 2)
+            self._set_user_zoom(start_zoom * first.distance(second.pos) / start_distance, center)
+        elif self.user_zoom > 1 and not touch.ud.get('reader_pinch'):
+            self._pan_page(touch.dx, touch.dy)
+        return True
+
     def on_scroll_view_touch_up(self, instance, touch):
         """处理PDF显示区域的触摸释放事件"""
+        if self.continuous_mode:
+            start = touch.ud.pop('reader_tap_start', None)
+            if start and abs(touch.x - start[0]) < 20 and abs(touch.y - start[1]) < 20 \
+                    and touch.time_end - start[2] < 0.5:
+                self.toggle_controls()
+            return False
+        
+        self._active_touches.pop(touch.uid, None)
+        if touch.ud.get('reader_pinch'):
+            # 双指缩放结束，不当作点击或滑动翻页
+            if not self._active_touches:
+                self._pinch = None
+            return True
+        
         if instance.collide_point(*touch.pos) and hasattr(self, 'touch_start_x'):
             delta_x = touch.x - self.touch_start_x
             delta_y = touch.y - self.touch_start_y
@@ -579,7 +2576,9 @@ class MainLayout(FloatLayout):
                 self.toggle_controls()
                 return True
             
-            if abs(delta_x) > self.swipe_threshold and abs(delta_y) < self.swipe_threshold * 2:
+            # 放大后拖动用于移动页面，不翻页
+            if self.user_zoom <= 1 and \
+                    abs(delta_x) > self.swipe_threshold and abs(delta_y) < self.swipe_threshold * 2:
                 if delta_x > 0:
                     self.previous_page(None)
                 else:
@@ -598,155 +2597,334 @@ class MainLayout(FloatLayout):
             self.reader_bg_rect.size = instance.size
     
     def display_current_page(self):
-        self.pdf_display.clear_widgets()
-        
         if not self.doc:
             return
         
+        if self.continuous_mode:
+            self.continuous_view.release_all()
+            if self._continuous_anchor is None:
+                Clock.schedule_once(lambda dt: self._update_continuous_view(), 0)
+            return
+        
+        # 用户已经翻到新页面，丢弃还未开始的旧渲染请求
+        if self.render_worker:
+            self.render_worker.new_generation()
+        
         try:
             Clock.schedule_once(lambda dt: self._render_page(), 0)
             
         except Exception as e:
             print(f"显示页面错误: {e}")
-            error_label = Label(
-                text=f"错误: {str(e)}", 
-                font_size='14sp',
-                color=(1, 0, 0, 1)
-            )
-            self.pdf_display.add_widget(error_label)
+            self.pdf_display.show_message(f"错误: {str(e)}", (1, 0, 0, 1), is_error=True)
+    
+    def _current_page_key(self):
+        """当前显示内容的缓存键"""
+        if self.half_page_mode and not hasattr(self, 'current_half_page'):
+            self.current_half_page = 'right'
+        return self._page_key(self.current_page)
     
     def _render_page(self):
         try:
-            self.pdf_display.clear_widgets()
+            key = self._current_page_key()
+            page_num = key.page
             
-            if self.half_page_mode:
-                if not hasattr(self, 'current_half_page'):
-                    self.current_half_page = 'right'
-                
-                is_left_half = (self.current_half_page == 'left')
-                cache_key = (self.current_page, is_left_half)
-                
-                if cache_key in self.half_page_cache:
-                    img_data = self.half_page_cache[cache_key]
-                    print(f"从缓存加载半边页面 {self.current_page + 1} ({self.current_half_page})")
-                else:
-                    self._load_half_page_to_cache(self.current_page, is_left_half)
-                    img_data = self.half_page_cache.get(cache_key)
-                    print(f"渲染半边页面 {self.current_page + 1} ({self.current_half_page})")
-                
-                half_page_indicator = "左" if is_left_half else "右"
-                self.page_label.text = f'{self.current_page + 1}/{self.total_pages} ({half_page_indicator})'
-                
+            if not self.half_page_mode:
+                self.page_label.text = f'{page_num + 1}/{self.total_pages}'
             else:
-                if self.current_page in self.page_cache:
-                    img_data = self.page_cache[self.current_page]
-                    print(f"从缓存加载页面 {self.current_page + 1}")
-                else:
-                    page = self.doc[self.current_page]
-                    mat = fitz.Matrix(2.0, 2.0)
-                    pix = page.get_pixmap(matrix=mat)
-                    img_data = pix.tobytes("png")
-                    self.page_cache[self.current_page] = img_data
-                    print(f"渲染页面 {self.current_page + 1}, 尺寸: {pix.width}x{pix.height}")
-                
-                self.page_label.text = f'{self.current_page + 1}/{self.total_pages}'
-            
-            if not img_data:
-                raise Exception("无法获取页面图像数据")
+                half_page_indicator = "左" if self.current_half_page == 'left' else "右"
+                self.page_label.text = f'{page_num + 1}/{self.total_pages} ({half_page_indicator})'
             
-            from kivy.core.image import Image as CoreImage
-            from io import BytesIO
+            # 当前页及相邻页不参与淘汰（裁边时按各页显示用的裁剪区域固定）
+            self.page_cache.pin_regions((pinned, self._page_clip(pinned))
+                                        for pinned in range(max(page_num - 1, 0),
+                                                            min(page_num + 2, self.total_pages)))
+            self._displayed_key = key
             
-            data = BytesIO(img_data)
-            core_image = CoreImage(data, ext='png')
+            img_data = self.page_cache.get(key)
             
-            pdf_image = Image(
-                texture=core_image.texture,
-                keep_ratio=True,
-                allow_stretch=False,
-                size_hint=(None, None)
-            )
-            
-            display_width = Window.width - 40
-            ratio = display_width / core_image.texture.width
-            display_height = core_image.texture.height * ratio
-            
-            max_display_height = Window.height * 0.8 - 40
-            if display_height > max_display_height:
-                ratio = max_display_height / core_image.texture.height
-                display_width = core_image.texture.width * ratio
-                display_height = max_display_height
-            
-            pdf_image.size = (display_width, display_height)
-            
-            horizontal_center_layout = BoxLayout(
-                orientation='horizontal',
-                size_hint=(None, None),
-                size=(Window.width, max(display_height, Window.height * 0.8 - 40)),
-                padding=0
-            )
-            
-            if display_width < Window.width:
-                left_spacer = BoxLayout(size_hint_x=None, width=(Window.width - display_width) / 2)
-                horizontal_center_layout.add_widget(left_spacer)
-            
-            vertical_center_layout = BoxLayout(
-                orientation='vertical',
-                size_hint=(None, None),
-                size=(display_width, max(display_height, Window.height * 0.8 - 40)),
-                padding=0
-            )
-            
-            if display_height < Window.height * 0.8 - 40:
-                top_spacer = BoxLayout(size_hint_y=None, height=(Window.height * 0.8 - 40 - display_height) / 2)
-                vertical_center_layout.add_widget(top_spacer)
-            
-            vertical_center_layout.add_widget(pdf_image)
-            
-            if display_height < Window.height * 0.8 - 40:
-                bottom_spacer = BoxLayout(size_hint_y=None, height=(Window.height * 0.8 - 40 - display_height) / 2)
-                vertical_center_layout.add_widget(bottom_spacer)
-            
-            horizontal_center_layout.add_widget(vertical_center_layout)
-            
-            if display_width < Window.width:
-                right_spacer = BoxLayout(size_hint_x=None, width=(Window.width - display_width) / 2)
-                horizontal_center_layout.add_widget(right_spacer)
-            
-            self.pdf_display.add_widget(horizontal_center_layout)
-            
-            self.scroll_view.scroll_y = 1
+            if img_data is None:
+                # 未缓存：先显示已有的低分辨率版本（或快速渲染一个预览），清晰页面到达后再替换
+                tracer.count('page.miss')
+                self.prefetch_planner.note_display(page_num, False)
+                self._request_page(key, PRIORITY_CURRENT)
+                preview = self.page_cache.find_any(key.page, key.clip) or self._thumbnail_preview(key)
+                if preview is None:
+                    self.render_worker.submit(preview_key(key), PRIORITY_PREVIEW,
+                                              self._on_page_rendered, persist=False)
+                    # 同一页换了显示区域（例如裁边结果刚算出来）时保留原来的画面
+                    if not self._shown_page or self._shown_page[0] != page_num:
+                        self._show_placeholder()
+                else:
+                    self._show_page_image(preview)
+                return
             
-            print("页面渲染完成")
+            tracer.count('page.hit')
+            self.prefetch_planner.note_display(page_num, True)
+            self._show_page_image(img_data)
             
-            Clock.schedule_once(lambda dt: self._preload_adjacent_pages(), 0.1)
+            self._preload_adjacent_pages()
             
         except Exception as e:
             print(f"渲染错误: {e}")
             traceback.print_exc()
-            error_label = Label(
-                text=f"渲染失败: {str(e)}", 
-                font_size='14sp',
-                color=(1, 0, 0, 1)
-            )
-            self.pdf_display.add_widget(error_label)
+            self.pdf_display.show_message(f"渲染失败: {str(e)}", (1, 0, 0, 1), is_error=True)
     
-    def _preload_adjacent_pages(self):
-        """预加载相邻页面"""
+    def _show_placeholder(self):
+        """页面渲染完成前显示的占位内容"""
+        self.pdf_display.show_message('加载中...', self.get_text_color())
+        self._fit_page_view()
+    
+    def _fit_page_view(self, *args):
+        """页面控件尺寸跟随滚动区域"""
+        self.pdf_display.fit_to(self.scroll_view.width, self.scroll_view.height)
+        if self.continuous_mode and self.doc:
+            self._relayout_continuous_view()
+    
+    def _show_page_image(self, img_data):
+        """显示页面图像（只替换纹理，不重建控件）"""
+        with tracer.span('layout.page'):
+            self._layout_page_image(img_data)
+        self._note_first_page()
+    
+    def _layout_page_image(self, img_data):
+        # 换页（或显示区域变化）后恢复适配大小，同一页的预览替换为清晰页面时保持缩放和滚动位置
+        # 从磁盘缓存预览时文档还没有打开，不知道页面区域
+        region = self._page_region() if self.doc else None
+        shown_page = (self.current_page, region)
+        new_page = shown_page != self._shown_page
+        if new_page:
+            self._shown_page = shown_page
+            self.user_zoom = 1.0
+            self._tile_textures = {}
+            self.pdf_display.set_tiles({})
+        
+        # 同一页面图像（例如半页模式翻到另一半）不重复上传纹理
+        if img_data is not self._texture_source:
+            self._page_texture = create_page_texture(img_data)
+            self._texture_source = img_data
+        texture = self._page_texture
+        
         if self.half_page_mode:
-            current_cache_key = (self.current_page, self.current_half_page == 'left')
-            opposite_cache_key = (self.current_page, self.current_half_page != 'left')
-            
-            if opposite_cache_key not in self.half_page_cache:
-                self._load_half_page_to_cache(self.current_page, self.current_half_page != 'left')
-        else:
-            if self.current_page < self.total_pages - 1 and (self.current_page + 1) not in self.page_cache:
-                self._load_page_to_cache(self.current_page + 1)
-            
-            if self.current_page > 0 and (self.current_page - 1) not in self.page_cache:
-                self._load_page_to_cache(self.current_page - 1)
+            # 从整页纹理中截取半边，不复制像素（从磁盘缓存预览时还不知道页面区域，按中线截取）
+            if region is not None:
+                clip = self._current_page_key().clip or tuple(self._get_page_rect(self.current_page))
+                half = region
+            else:
+                clip = (0, 0, 1, 1)
+                half = half_page_region(clip, self.current_half_page)
+            texture = texture.get_region(*half_page_pixels(texture.width, texture.height, clip, half))
+        
+        # 按显示区域计算显示尺寸，预览纹理会被拉伸到同样大小
+        display_width, max_display_height = self.view_size
+        ratio = display_width / texture.width
+        display_height = texture.height * ratio
+        
+        if self.fit_mode == 'page' and display_height > max_display_height:
+            ratio = max_display_height / texture.height
+            display_width = texture.width * ratio
+            display_height = max_display_height
+        
+        self._fit_display_size = (display_width, display_height)
+        self._display_region = region
+        self.pdf_display.set_page(texture, (display_width * self.user_zoom,
+                                            display_height * self.user_zoom))
+        self.pdf_display.set_highlights(self._page_highlights(self.current_page, self._display_region))
+        self._fit_page_view()
+        
+        if new_page:
+            self.scroll_view.scroll_x = 0
+            self.scroll_view.scroll_y = 1
+        self._update_tiles()
+    
+    def _page_region(self):
+        """当前显示的页面区域（页面坐标），半页模式下为左半或右半，裁边时在内容区域内取"""
+        return self._region_of(self.current_page, self.current_half_page if self.half_page_mode else None)
+    
+    def _set_user_zoom(self, zoom, focus=None):
+        """设置放大倍数，focus（窗口坐标）下的页面内容保持不动
+        
+        缩放过程中只拉伸已有纹理，停止变化后再按新的倍数请求清晰瓦片。
+        """
+        zoom = min(max(zoom, 1.0), MAX_USER_ZOOM)
+        page_view = self.pdf_display
+        if page_view.texture is None or abs(zoom - self.user_zoom) < 0.001:
+            return
+        
+        scroll_view = self.scroll_view
+        if focus is None:
+            focus = scroll_view.center
+        focus_x = focus[0] - scroll_view.x
+        focus_y = scroll_view.top - focus[1]
+        
+        # 缩放前焦点在页面上的比例位置
+        left, top = self._page_offset_in_viewport()
+        width, height = page_view.display_size
+        u = (focus_x - left) / width
+        v = (focus_y - top) / height
+        
+        self.user_zoom = zoom
+        fit_width, fit_height = self._fit_display_size
+        page_view.set_page(page_view.texture, (fit_width * zoom, fit_height * zoom))
+        self._fit_page_view()
+        
+        # 滚动到让同一位置回到焦点下
+        width, height = page_view.display_size
+        page_left = page_view.page_rect.pos[0] - page_view.x
+        page_top = page_view.top - page_view.page_rect.pos[1] - height
+        x_range = page_view.width - scroll_view.width
+        y_range = page_view.height - scroll_view.height
+        view_left = page_left + u * width - focus_x
+        view_top = page_top + v * height - focus_y
+        scroll_view.scroll_x = min(max(view_left / x_range, 0), 1) if x_range > 0 else 0
+        scroll_view.scroll_y = 1 - min(max(view_top / y_range, 0), 1) if y_range > 0 else 1
+        self._update_tiles_trigger()
+    
+    def _page_offset_in_viewport(self):
+        """页面显示区域左上角相对视口左上角的位置（像素，y向下）"""
+        page_view = self.pdf_display
+        scroll_view = self.scroll_view
+        view_left = scroll_view.scroll_x * max(page_view.width - scroll_view.width, 0)
+        view_top = (1 - scroll_view.scroll_y) * max(page_view.height - scroll_view.height, 0)
+        page_left = page_view.page_rect.pos[0] - page_view.x
+        page_top = page_view.top - page_view.page_rect.pos[1] - page_view.display_size[1]
+        return page_left - view_left, page_top - view_top
+    
+    def _pan_page(self, dx, dy):
+        """放大后拖动页面"""
+        page_view = self.pdf_display
+        scroll_view = self.scroll_view
+        x_range = page_view.width - scroll_view.width
+        y_range = page_view.height - scroll_view.height
+        if x_range > 0:
+            scroll_view.scroll_x = min(max(scroll_view.scroll_x - dx / x_range, 0), 1)
+        if y_range > 0:
+            scroll_view.scroll_y = min(max(scroll_view.scroll_y - dy / y_range, 0), 1)
+    
+    def _on_page_scroll(self, instance, value):
+        if not self.continuous_mode and self.user_zoom > 1:
+            self._update_tiles_trigger()
+    
+    def _update_tiles(self):
+        """放大时为视口内的区域叠加清晰瓦片
+        
+        瓦片按2的幂次的渲染倍数分层（瓦片金字塔），每个瓦片是页面的一个裁剪区域，
+        和整页共用页面缓存的内存预算。瓦片未到达前显示拉伸后的整页纹理。
+        """
+        page_view = self.pdf_display
+        if self.continuous_mode or not self.doc or page_view.texture is None \
+                or self._display_region is None:
+            return
+        
+        x0, y0, x1, y1 = self._display_region
+        width, height = page_view.display_size
+        needed_zoom = width / (x1 - x0)
+        base_key = self._current_page_key()
+        if needed_zoom <= base_key.zoom * 1.05 or self.render_scale < 1:
+            # 整页纹理已经足够清晰（内存紧张降低了渲染倍数时不叠加瓦片）
+            if self.render_worker and self._tile_requests:
+                self.render_worker.cancel(self._tile_requests)
+                self._tile_requests = set()
+            if self._tile_textures:
+                self._tile_textures = {}
+                page_view.set_tiles({})
+            return
+        level = min(2 ** math.ceil(math.log2(needed_zoom)), MAX_TILE_ZOOM)
+        
+        # 视口内可见的页面区域（页面坐标）
+        left, top = self._page_offset_in_viewport()
+        scale = (x1 - x0) / width
+        visible_x0 = x0 + max(-left, 0) * scale
+        visible_x1 = x0 + min(self.scroll_view.width - left, width) * scale
+        visible_y0 = y0 + max(-top, 0) * scale
+        visible_y1 = y0 + min(self.scroll_view.height - top, height) * scale
+        if visible_x1 <= visible_x0 or visible_y1 <= visible_y0:
+            return
+        
+        rect = self._get_page_rect(base_key.page)
+        step = TILE_SIZE / level
+        colormode = self._page_colormode()
+        tiles = {}
+        requested = set()
+        for row in range(int((visible_y0 - rect.y0) // step), int(math.ceil((visible_y1 - rect.y0) / step))):
+            for col in range(int((visible_x0 - rect.x0) // step), int(math.ceil((visible_x1 - rect.x0) / step))):
+                clip = (max(rect.x0 + col * step, x0), max(rect.y0 + row * step, y0),
+                        min(rect.x0 + (col + 1) * step, x1), min(rect.y0 + (row + 1) * step, y1))
+                key = CacheKey(base_key.page, clip, level, colormode)
+                texture = self._tile_textures.get(key)
+                if texture is None:
+                    img_data = self.page_cache.get(key)
+                    if img_data is None:
+                        if self.render_worker:
+                            self.render_worker.submit(key, PRIORITY_CURRENT, self._on_tile_rendered,
+                                                      persist=False)
+                            requested.add(key)
+                        continue
+                    texture = create_page_texture(img_data)
+                box = ((clip[0] - x0) / (x1 - x0), (clip[1] - y0) / (y1 - y0),
+                       (clip[2] - x0) / (x1 - x0), (clip[3] - y0) / (y1 - y0))
+                tiles[key] = (texture, box)
+        
+        # 只作废离开视口的瓦片请求，整页和预取请求不受影响
+        if self.render_worker:
+            self.render_worker.cancel(self._tile_requests - requested)
+        self._tile_requests = requested
+        
+        self._tile_textures = dict((key, tile[0]) for key, tile in tiles.items())
+        page_view.set_tiles(tiles)
+    
+    def _on_tile_rendered(self, worker, key, img_data, error=None):
+        """瓦片渲染完成，在UI线程中回调（失败时继续显示拉伸后的整页纹理）"""
+        self._tile_requests.discard(key)
+        if worker is not self.render_worker or img_data is None:
+            return
+        self.page_cache.put(key, img_data)
+        if not self.continuous_mode and key.page == self.current_page:
+            self._update_tiles_trigger()
+    
+    def on_window_resize(self, window, width, height):
+        """窗口尺寸变化明显时才按新尺寸重新渲染"""
+        if self.doc and self.reader_layout and self._update_view_size():
+            if self.continuous_mode:
+                self._relayout_continuous_view()
+            else:
+                self.display_current_page()
+    
+    def _preload_adjacent_pages(self):
+        """按预取计划预加载翻页方向上的页面"""
+        if self.memory_pressure >= MEMORY_MODERATE:
+            return
+        # 半页模式下两半来自同一次渲染，每页翻两次（右 → 左 → 下一页右）
+        turns_per_page = 2 if self.half_page_mode else 1
+        # 预取的页面不超过缓存预算的三分之一，避免互相淘汰；
+        # 灰度页面只占RGB的三分之一，省下的内存用来多预取（最少预取的页数按比例增加）
+        max_ahead = min_ahead = None
+        img_data = self._texture_source
+        if img_data is not None and img_data.nbytes:
+            max_ahead = max(1, int(self.page_cache.budget_bytes / 3 / img_data.nbytes))
+            min_ahead = min(max_ahead, self.prefetch_planner.min_ahead * 3 // img_data.n)
+        
+        plan = self.prefetch_planner.plan(self.current_page, self.total_pages, turns_per_page=turns_per_page,
+                                          max_ahead=max_ahead, min_ahead=min_ahead)
+        for page_num, priority in plan:
+            key = self._page_key(page_num)
+            if key not in self.page_cache:
+                self.prefetch_planner.note_prefetch(page_num)
+                self._request_page(key, priority)
+        
+        # 有多个渲染进程时，空闲的进程继续把后面的页面预渲染到磁盘缓存
+        if self.render_pool and not self.render_pool.broken and self.render_worker and self.prerender_pages > 0:
+            last = min(self.total_pages, self.current_page + 1 + self.prerender_pages)
+            self.render_worker.prerender([self._page_key(page_num)
+                                          for page_num in range(self.current_page + 1, last)])
     
     def next_page(self, instance):
+        if self.continuous_mode:
+            if self.current_page < self.total_pages - 1:
+                self._scroll_to_page(self.current_page + 1)
+            return
+        
+        self.prefetch_planner.record_turn(1)
+        
         if self.half_page_mode and hasattr(self, 'current_half_page'):
             if self.current_half_page == 'right':
                 self.current_half_page = 'left'
@@ -766,6 +2944,13 @@ class MainLayout(FloatLayout):
                     self.save_reading_position(self.file_path, self.current_page)
     
     def previous_page(self, instance):
+        if self.continuous_mode:
+            if self.current_page > 0:
+                self._scroll_to_page(self.current_page - 1)
+            return
+        
+        self.prefetch_planner.record_turn(-1)
+        
         if self.half_page_mode and hasattr(self, 'current_half_page'):
             if self.current_half_page == 'left':
                 self.current_half_page = 'right'
@@ -784,6 +2969,535 @@ class MainLayout(FloatLayout):
                 if self.file_path:
                     self.save_reading_position(self.file_path, self.current_page)
     
+    def _start_search_index(self):
+        """加载当前文档的搜索索引，未完成时在后台继续建立"""
+        self._stop_search_index()
+        self.search_query = ''
+        self.search_hits = {}
+        index_path = None
+        if self.fingerprint:
+            index_path = os.path.join(self.search_index_dir, self.fingerprint + '.jsonl')
+        self.search_index = SearchIndex(index_path)
+        # 稍后开始，先让第一页渲染完成
+        index = self.search_index
+        Clock.schedule_once(lambda dt: self._build_search_index(index), 1.0)
+    
+    def _build_search_index(self, index):
+        if index is not self.search_index or not self.file_path:
+            return
+        index.build(self.file_path, self._on_search_index_progress, self._on_search_index_progress)
+    
+    def _stop_search_index(self):
+        if self.search_index:
+            self.search_index.stop()
+            self.search_index = None
+    
+    def _start_thumbnails(self):
+        """加载当前文档已保存的缩略图，稍后在后台从当前页开始生成缺少的缩略图"""
+        self._stop_thumbnails()
+        self.thumbnails = ThumbnailStore(self.thumbnail_dir, self.fingerprint)
+        store = self.thumbnails
+        Clock.schedule_once(lambda dt: self._start_thumbnail_worker(store), 1.5)
+    
+    def _start_thumbnail_worker(self, store):
+        if store is not self.thumbnails or not self.file_path:
+            return
+        self.thumbnail_worker = ThumbnailWorker(
+            self.file_path, store,
+            lambda pages: Clock.schedule_once(lambda dt: self._on_thumbnails_generated(store, pages), 0)
+        )
+        self.thumbnail_worker.start(self.current_page)
+    
+    def _stop_thumbnails(self):
+        if self.thumbnail_worker:
+            self.thumbnail_worker.stop()
+            self.thumbnail_worker = None
+        self.thumbnails = None
+        self._thumb_textures.clear()
+        self.outline = None
+        self._outline_loading = False
+    
+    def thumbnail_texture(self, page_num):
+        """页面缩略图的纹理（所在图集纹理的一个区域），还没有生成时返回None"""
+        region = self.thumbnails.region(page_num) if self.thumbnails else None
+        if region is None:
+            return None
+        index, x, y, width, height = region
+        texture = self._thumb_textures.get(index)
+        if texture is None:
+            snapshot = self.thumbnails.atlas_pixels(index)
+            if snapshot is None:
+                return None
+            atlas_width, atlas_height, pixels = snapshot
+            with tracer.span('texture.thumbnail_atlas', atlas=index):
+                texture = Texture.create(size=(atlas_width, atlas_height), colorfmt='rgb')
+                texture.blit_buffer(pixels, colorfmt='rgb', bufferfmt='ubyte')
+            self._thumb_textures[index] = texture
+            while len(self._thumb_textures) > MAX_THUMBNAIL_TEXTURES:
+                self._thumb_textures.popitem(last=False)
+        else:
+            self._thumb_textures.move_to_end(index)
+        # 图集像素从上到下排列，截取区域后再翻转
+        texture = texture.get_region(x, y, width, height)
+        texture.flip_vertical()
+        return texture
+    
+    def _on_thumbnails_generated(self, store, pages):
+        """新生成的缩略图直接写入已上传的图集纹理，刷新面板中可见的格子"""
+        if store is not self.thumbnails:
+            return
+        for page_num in pages:
+            index, cell = store.locate(page_num)
+            texture = self._thumb_textures.get(index)
+            pixels = store.cell_pixels(page_num) if texture is not None else None
+            if pixels is not None:
+                texture.blit_buffer(pixels, size=THUMB_CELL, colorfmt='rgb', bufferfmt='ubyte',
+                                    pos=ThumbnailAtlas.cell_origin(cell))
+        if self.thumbnail_view:
+            for cell in self.thumbnail_view.layout_manager.children:
+                cell.update_thumbnail()
+    
+    def _thumbnail_preview(self, key):
+        """用缩略图作为页面的低分辨率预览放入页面缓存，没有缩略图时返回None"""
+        if not self.thumbnails or key.colormode != 'rgb':
+            return None
+        img_data = self.thumbnails.image(key.page)
+        if img_data is None:
+            return None
+        rect = self._get_page_rect(key.page)
+        scale = img_data.width / rect.width
+        if key.clip:
+            x0, y0, x1, y1 = key.clip
+            img_data = img_data.crop((x0 - rect.x0) * scale, (y0 - rect.y0) * scale,
+                                     (x1 - rect.x0) * scale, (y1 - rect.y0) * scale)
+        self.page_cache.put(CacheKey(key.page, key.clip, scale, key.colormode), img_data)
+        return img_data
+    
+    def show_navigation_popup(self, instance=None):
+        """显示缩略图和目录面板"""
+        if not self.doc:
+            return
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        
+        tabs = BoxLayout(size_hint_y=0.08, spacing=10)
+        for text, tab in (('缩略图', 'thumbnails'), ('目录', 'outline')):
+            tab_btn = Button(
+                text=text,
+                font_size='14sp',
+                background_color=self.get_button_color(),
+                color=(1, 1, 1, 1),
+                background_normal=''
+            )
+            tab_btn.bind(on_release=lambda x, tab=tab: self._show_navigation_tab(tab))
+            tabs.add_widget(tab_btn)
+        content.add_widget(tabs)
+        
+        self.navigation_status = Label(size_hint_y=0.06, font_size='14sp', color=self.get_text_color())
+        content.add_widget(self.navigation_status)
+        
+        self.navigation_body = BoxLayout()
+        content.add_widget(self.navigation_body)
+        
+        self.thumbnail_view = RecycleView()
+        thumbnail_grid = RecycleGridLayout(
+            cols=4,
+            default_size=(None, 150),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=6
+        )
+        thumbnail_grid.bind(minimum_height=thumbnail_grid.setter('height'))
+        self.thumbnail_view.add_widget(thumbnail_grid)
+        self.thumbnail_view.viewclass = ThumbnailCell
+        self.thumbnail_view.data = [{
+            'text': str(page_num + 1),
+            'page_num': page_num,
+            'reader': self,
+            'font_size': '12sp',
+            'background_color': (0.5, 0.5, 0.5, 0.25),
+            'color': self.get_text_color(),
+            'background_normal': ''
+        } for page_num in range(self.total_pages)]
+        self.thumbnail_view.bind(scroll_y=lambda instance, value: self._thumbnail_focus_trigger())
+        
+        self.outline_view = RecycleView()
+        outline_list = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 44),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=2
+        )
+        outline_list.bind(minimum_height=outline_list.setter('height'))
+        self.outline_view.add_widget(outline_list)
+        self.outline_view.viewclass = OutlineRow
+        
+        close_btn = Button(
+            text='关闭',
+            size_hint_y=0.08,
+            background_color=self.get_button_color(),
+            color=(1, 1, 1, 1),
+            background_normal=''
+        )
+        content.add_widget(close_btn)
+        
+        self.navigation_popup = Popup(
+            title='页面导航',
+            content=content,
+            size_hint=(0.9, 0.85),
+            background_color=self.get_bg_color(),
+            title_color=self.get_text_color(),
+            separator_color=self.get_button_color()
+        )
+        close_btn.bind(on_release=self.navigation_popup.dismiss)
+        self.navigation_popup.bind(on_dismiss=self._on_navigation_popup_dismiss)
+        self._show_navigation_tab('thumbnails')
+        self.navigation_popup.open()
+        Clock.schedule_once(lambda dt: self._scroll_thumbnails_to(self.current_page), 0)
+    
+    def _on_navigation_popup_dismiss(self, popup):
+        self.navigation_popup = None
+        self.thumbnail_view = None
+        self.outline_view = None
+    
+    def _show_navigation_tab(self, tab):
+        self.navigation_body.clear_widgets()
+        if tab == 'thumbnails':
+            self.navigation_body.add_widget(self.thumbnail_view)
+            self.navigation_status.text = f'第 {self.current_page + 1} / {self.total_pages} 页'
+        else:
+            self.navigation_body.add_widget(self.outline_view)
+            self._load_outline()
+    
+    def _scroll_thumbnails_to(self, page_num):
+        """让缩略图面板显示包含page_num的一行"""
+        view = self.thumbnail_view
+        if not view:
+            return
+        grid = view.layout_manager
+        rows = int(math.ceil(self.total_pages / grid.cols))
+        scrollable = grid.height - view.height
+        if rows <= 1 or scrollable <= 0:
+            return
+        row_height = grid.height / rows
+        view.scroll_y = 1 - min(max((page_num // grid.cols) * row_height / scrollable, 0), 1)
+        self._focus_thumbnails()
+    
+    def _focus_thumbnails(self):
+        """缩略图先从面板中可见的页面开始生成"""
+        if not self.thumbnail_view or not self.thumbnail_worker:
+            return
+        pages = [cell.page_num for cell in self.thumbnail_view.layout_manager.children]
+        if pages:
+            self.thumbnail_worker.focus(min(pages))
+    
+    def _load_outline(self):
+        """第一次打开目录时在后台线程读取"""
+        if self.outline is not None:
+            self._fill_outline()
+            return
+        self.navigation_status.text = '正在加载目录...'
+        if self._outline_loading:
+            return
+        self._outline_loading = True
+        file_path = self.file_path
+        
+        def load():
+            try:
+                doc = fitz.open(file_path)
+                outline = doc.get_toc(simple=True)
+                doc.close()
+            except Exception as e:
+                print(f"读取目录失败: {e}")
+                outline = []
+            Clock.schedule_once(lambda dt: self._on_outline_loaded(file_path, outline), 0)
+        
+        thread = threading.Thread(target=load, name='Outline')
+        thread.daemon = True
+        thread.start()
+    
+    def _on_outline_loaded(self, file_path, outline):
+        if file_path != self.file_path:
+            return
+        self._outline_loading = False
+        self.outline = outline
+        if self.outline_view and self.outline_view.parent:
+            self._fill_outline()
+    
+    def _fill_outline(self):
+        rows = []
+        for level, title, page in self.outline:
+            if page < 1:
+                continue
+            rows.append({
+                'text': '    ' * (level - 1) + f'{title}  ·  {page}',
+                'page_num': page - 1,
+                'reader': self,
+                'font_size': '14sp',
+                'background_color': self.get_button_color(),
+                'color': (1, 1, 1, 1),
+                'background_normal': ''
+            })
+        self.outline_view.data = rows
+        self.navigation_status.text = f'共 {len(rows)} 个目录项' if rows else '此文档没有目录'
+    
+    def _start_page_crops(self):
+        """裁边模式下加载当前文档的页边裁剪记录，从当前页开始在后台计算缺少的页面"""
+        if not self.crop_mode:
+            return
+        if self.page_crops is None:
+            index_path = None
+            if self.fingerprint:
+                index_path = os.path.join(self.page_crop_dir, self.fingerprint + '.json')
+            self.page_crops = PageCropIndex(index_path)
+            self.page_crops.load()
+        index = self.page_crops
+        index.build(self.file_path, self.current_page,
+                    lambda done, total: Clock.schedule_once(lambda dt: self._on_page_crops_progress(index), 0))
+    
+    def _stop_page_crops(self):
+        if self.page_crops:
+            self.page_crops.stop()
+            self.page_crops = None
+    
+    def _on_page_crops_progress(self, index):
+        """当前页的裁边结果到达后按新的显示区域重新显示"""
+        if index is not self.page_crops or not self.doc or self.continuous_mode:
+            return
+        if self._displayed_key is not None and self._current_page_key() != self._displayed_key:
+            if self.render_worker:
+                self.render_worker.new_generation()
+            self._render_page()
+    
+    def _on_search_index_progress(self, done, total):
+        """索引线程每完成一批页面（以及结束时）调用"""
+        Clock.schedule_once(lambda dt: self._refresh_search_results(), 0)
+    
+    def _refresh_search_results(self):
+        if self.search_popup and self.search_query:
+            self._run_search()
+        else:
+            self._update_search_status()
+    
+    def show_search_popup(self, instance=None):
+        """显示搜索弹窗"""
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        
+        self.search_input = TextInput(
+            text=self.search_query,
+            multiline=False,
+            size_hint_y=0.12,
+            font_size='16sp',
+            hint_text='输入要搜索的文字'
+        )
+        self.search_input.bind(text=lambda instance, value: self._search_trigger())
+        self.search_input.bind(on_text_validate=lambda instance: self._run_search())
+        content.add_widget(self.search_input)
+        
+        self.search_status = Label(size_hint_y=0.08, font_size='14sp', color=self.get_text_color())
+        content.add_widget(self.search_status)
+        
+        self.search_results_view = RecycleView()
+        result_list = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 50),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=2
+        )
+        result_list.bind(minimum_height=result_list.setter('height'))
+        self.search_results_view.add_widget(result_list)
+        self.search_results_view.viewclass = SearchResultRow
+        content.add_widget(self.search_results_view)
+        
+        close_btn = Button(
+            text='关闭',
+            size_hint_y=0.1,
+            background_color=self.get_button_color(),
+            color=(1, 1, 1, 1),
+            background_normal=''
+        )
+        content.add_widget(close_btn)
+        
+        self.search_popup = Popup(
+            title='搜索',
+            content=content,
+            size_hint=(0.9, 0.8),
+            background_color=self.get_bg_color(),
+            title_color=self.get_text_color(),
+            separator_color=self.get_button_color()
+        )
+        close_btn.bind(on_release=self.search_popup.dismiss)
+        self.search_popup.bind(on_dismiss=self._on_search_popup_dismiss)
+        self.search_popup.open()
+        self.search_input.focus = True
+        self._run_search()
+    
+    def _on_search_popup_dismiss(self, popup):
+        self.search_popup = None
+    
+    def _run_search(self):
+        """按输入框中的文字搜索并更新结果列表和页面高亮"""
+        if self.search_popup:
+            self.search_query = self.search_input.text.strip()
+        if not self.search_index:
+            return
+        
+        with tracer.span('search.query'):
+            results = self.search_index.search(self.search_query) if self.search_query else []
+        self.search_hits = dict(results)
+        if self.search_popup:
+            self.search_results_view.data = [{
+                'text': f'第 {page_num + 1} 页 · {len(boxes)} 处',
+                'page_num': page_num,
+                'reader': self,
+                'font_size': '14sp',
+                'background_color': self.get_button_color(),
+                'color': (1, 1, 1, 1),
+                'background_normal': ''
+            } for page_num, boxes in results]
+            self.search_results_view.scroll_y = 1
+        self._update_search_status()
+        self._refresh_highlights()
+    
+    def _update_search_status(self):
+        if not self.search_popup or not self.search_index:
+            return
+        index = self.search_index
+        if self.search_query:
+            status = f'找到 {len(self.search_hits)} 页'
+        else:
+            status = ''
+        if not index.complete:
+            status += f'（正在建立索引 {len(index.pages)}/{index.total_pages or self.total_pages} 页）'
+        self.search_status.text = status
+    
+    def jump_to_search_result(self, page_num):
+        """跳转到搜索结果所在页面"""
+        if self.search_popup:
+            self.search_popup.dismiss()
+        if not self.doc or page_num >= self.total_pages:
+            return
+        
+        half_page = 'right'
+        if self.half_page_mode:
+            # 跳到第一处结果所在的半边
+            rect = self._get_page_rect(page_num)
+            x0, y0, x1, y1 = self.search_hits.get(page_num, [[rect.x1, 0, rect.x1, 0]])[0]
+            half_page = 'left' if (x0 + x1) / 2 < (rect.x0 + rect.x1) / 2 else 'right'
+        self.jump_to_page(page_num, half_page)
+    
+    def jump_to_page(self, page_num, half_page='right'):
+        """跳转到指定页面（缩略图、目录和搜索结果共用）
+        
+        清晰页面渲染完成前先显示拉伸的缩略图（见_thumbnail_preview）。
+        """
+        if self.navigation_popup:
+            self.navigation_popup.dismiss()
+        if not self.doc or not 0 <= page_num < self.total_pages:
+            return
+        
+        if self.continuous_mode:
+            self._scroll_to_page(page_num)
+            return
+        
+        self.current_page = page_num
+        if self.half_page_mode:
+            self.current_half_page = half_page
+        self.save_reading_position(self.file_path, self.current_page)
+        self.display_current_page()
+    
+    def _page_highlights(self, page_num, region):
+        """页面上搜索结果的高亮框，换算为在显示区域region（页面坐标，None为整页）中的比例位置"""
+        boxes = self.search_hits.get(page_num)
+        if not boxes:
+            return []
+        if region is None:
+            rect = self._get_page_rect(page_num)
+            region = (rect.x0, rect.y0, rect.x1, rect.y1)
+        x0, y0, x1, y1 = region
+        highlights = []
+        for bx0, by0, bx1, by1 in boxes:
+            if bx1 <= x0 or bx0 >= x1:
+                continue
+            highlights.append(((max(bx0, x0) - x0) / (x1 - x0), (by0 - y0) / (y1 - y0),
+                               (min(bx1, x1) - x0) / (x1 - x0), (by1 - y0) / (y1 - y0)))
+        return highlights
+    
+    def _refresh_highlights(self):
+        """搜索结果变化后更新正在显示的页面的高亮，不需要重新渲染"""
+        if not self.reader_layout or not self.doc:
+            return
+        if self.continuous_mode:
+            for page_num, slot in self.continuous_view.slots.items():
+                slot.set_highlights(self._page_highlights(page_num, None))
+        elif self._display_region is not None and self._shown_page \
+                and self._shown_page[0] == self.current_page:
+            self.pdf_display.set_highlights(
+                self._page_highlights(self.current_page, self._display_region))
+    
+    def _setup_instrumentation(self):
+        """按配置启用性能埋点，写跟踪文件时每5秒写入一次"""
+        if self.perf_trace:
+            tracer.enable(self.perf_trace_file)
+            Clock.schedule_interval(lambda dt: tracer.flush(), 5.0)
+        elif self.perf_hud:
+            tracer.enable()
+    
+    def on_key_down(self, window, key, scancode, codepoint, modifiers):
+        # F12切换性能面板
+        if key == 293:
+            self.toggle_perf_hud()
+            return True
+        return False
+    
+    def toggle_perf_hud(self):
+        self.perf_hud = not self.perf_hud
+        if self.perf_hud and not tracer.enabled:
+            tracer.enable()
+        self.save_config()
+        self._apply_perf_hud()
+    
+    def _apply_perf_hud(self):
+        """显示或隐藏性能面板，显示时才统计帧时间"""
+        if not self.reader_layout:
+            return
+        hud = self.perf_hud_label
+        if self.perf_hud:
+            if hud.parent is None:
+                self.reader_layout.add_widget(hud)
+            if self._hud_event is None:
+                self._hud_frames = []
+                self._hud_event = Clock.schedule_interval(self._on_hud_frame, 0)
+        else:
+            if hud.parent is not None:
+                hud.parent.remove_widget(hud)
+            if self._hud_event is not None:
+                self._hud_event.cancel()
+                self._hud_event = None
+    
+    def _on_hud_frame(self, dt):
+        """每帧记录帧时间，积累约半秒后刷新一次面板"""
+        self._hud_frames.append(dt)
+        if sum(self._hud_frames) < 0.5:
+            return
+        frames = self._hud_frames
+        self._hud_frames = []
+        
+        cache = self.page_cache.stats()
+        prefetch = self.prefetch_planner.stats()
+        lines = [
+            f'帧 {sum(frames) / len(frames) * 1000:.1f} ms  最长 {max(frames) * 1000:.0f} ms',
+            f'缓存 {cache["entries"]} 项 {cache["bytes"] / 1048576:.0f}/{cache["budget"] / 1048576:.0f} MB',
+            f'缓存命中 {cache["hit_ratio"] * 100:.0f}%  预取命中 {prefetch["hit_ratio"] * 100:.0f}%',
+            f'内存 {(self.memory_governor.rss or 0) / 1048576:.0f}/{self.memory_limit_mb} MB  压力 {self.memory_pressure}',
+        ]
+        for name, label in (('render.pixmap', '渲染'), ('texture.upload', '上传'), ('layout.page', '布局')):
+            stats = tracer.span_stats(name)
+            if stats:
+                lines.append(f'{label} {stats["last_ms"]:.1f} ms  平均 {stats["total_ms"] / stats["count"]:.1f} ms')
+        self.perf_hud_label.text = '\n'.join(lines)
+    
     def show_message(self, message):
         """显示消息弹窗"""
         content = BoxLayout(orientation='vertical', padding=20, spacing=20)
@@ -812,9 +3526,8 @@ if __name__ == '__main__':
     Window.size = (400, 600)
     Window.clearcolor = (1, 1, 1, 1)
     
-    try:
-        import fitz
-    except ImportError:
+    # 只检查是否安装，PyMuPDF在第一次打开文档时才导入
+    if importlib.util.find_spec('fitz') is None:
         print("请安装PyMuPDF: pip install PyMuPDF")
         exit(1)
         
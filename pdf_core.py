@@ -0,0 +1,1539 @@
+"""PDF页面处理流程（不依赖Kivy界面）
+
+打开文档、光栅化、内存/磁盘缓存、预取计划、后台渲染线程（桌面版可用多进程）、缩略图图集和半页切分都在这里，
+阅读界面（main.py）只负责把结果显示出来；benchmark.py也直接使用这个模块，
+不需要显示设备就可以测量性能。
+"""
+import importlib
+import json
+import os
+import sys
+import math
+import time
+import hashlib
+import struct
+import zlib
+import threading
+import itertools
+import queue
+from collections import OrderedDict, namedtuple
+
+from perf import tracer
+
+
+class LazyModule(object):
+    """第一次访问属性时才导入的模块
+
+    PyMuPDF导入要100ms左右，启动时从磁盘缓存显示上次的页面用不到它，
+    延迟到第一次打开文档（通常在后台线程中）时再导入。
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with tracer.span('import.' + self._name):
+                self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+fitz = LazyModule('fitz')  # PyMuPDF
+
+# 像素通道数与Kivy纹理格式的对应关系
+PIXEL_COLORFMTS = {1: 'luminance', 3: 'rgb', 4: 'rgba'}
+
+# 渲染缩放倍数的范围，以及低分辨率预览相对于清晰渲染的比例
+MIN_RENDER_ZOOM = 0.25
+MAX_RENDER_ZOOM = 4.0
+PREVIEW_SCALE = 0.3
+
+
+# 自动裁边：探测内容区域用的渲染倍数、判定为内容的灰度阈值、内容区域外保留的页边（点），
+# 以及裁掉的面积不到这个比例时不裁剪
+CROP_PROBE_ZOOM = 0.25
+CROP_DARK_LEVEL = 200
+CROP_PADDING = 6
+CROP_MIN_GAIN = 0.1
+
+# 灰度值到“是否为内容”的映射，用bytes.translate一次处理整张探测图
+_CROP_DARK_TABLE = bytes(1 if level < CROP_DARK_LEVEL else 0 for level in range(256))
+
+# 每个渲染线程/进程缓存的页面显示列表的内存上限（估算值）
+DISPLAY_LIST_BUDGET = 32 * 1024 * 1024
+
+# 渲染请求优先级（数字越小越先处理）
+PRIORITY_PREVIEW = 0
+PRIORITY_CURRENT = 1
+PRIORITY_PREFETCH = 2
+# 整本书后台预渲染（只写磁盘缓存）和写盘任务的优先级
+PRIORITY_BACKGROUND = PRIORITY_PREFETCH + 50
+PRIORITY_STORE = PRIORITY_PREFETCH + 100
+
+
+class PageImage(object):
+    """渲染后的页面图像
+
+    默认直接保存pixmap的原始采样数据（memoryview，零拷贝），
+    也可以选择以PNG格式紧凑存储，使用时再解码。
+    """
+
+    def __init__(self, width, height, n, samples=None, png=None, pixmap=None):
+        self.width = width
+        self.height = height
+        self.n = n
+        self.samples = samples
+        self.png = png
+        # 保持对pixmap的引用，保证memoryview指向的内存有效
+        self._pixmap = pixmap
+
+    @classmethod
+    def from_pixmap(cls, pix, compact=False):
+        """从fitz.Pixmap创建，compact为True时以PNG存储"""
+        if compact:
+            return cls(pix.width, pix.height, pix.n, png=pix.tobytes("png"))
+        samples = getattr(pix, 'samples_mv', None)
+        if samples is None:
+            samples = pix.samples
+        return cls(pix.width, pix.height, pix.n, samples=samples, pixmap=pix)
+
+    @property
+    def colorfmt(self):
+        return PIXEL_COLORFMTS[self.n]
+
+    @property
+    def nbytes(self):
+        """占用的内存字节数"""
+        if self.samples is not None:
+            return self.width * self.height * self.n
+        return len(self.png) if self.png else 0
+
+    def crop(self, x0, y0, x1, y1):
+        """截取像素区域，返回新的PageImage（只用于原始像素存储）"""
+        x0, y0 = max(int(x0), 0), max(int(y0), 0)
+        x1, y1 = min(int(math.ceil(x1)), self.width), min(int(math.ceil(y1)), self.height)
+        if x1 <= x0 or y1 <= y0:
+            return self
+        row_bytes = self.width * self.n
+        # 按行切片memoryview，只复制截取的部分，不复制整页像素
+        samples = memoryview(self.samples).cast('B')
+        if x0 == 0 and x1 == self.width:
+            data = bytes(samples[y0 * row_bytes:y1 * row_bytes])
+        else:
+            data = b''.join(samples[row * row_bytes + x0 * self.n:row * row_bytes + x1 * self.n]
+                            for row in range(y0, y1))
+        return PageImage(x1 - x0, y1 - y0, self.n, samples=data)
+
+    def get_samples(self):
+        """获取原始像素数据，PNG存储时临时解码"""
+        if self.samples is not None:
+            return self.samples
+        pix = fitz.Pixmap(self.png)
+        return pix.samples
+
+
+# 缓存键：页码、裁剪区域（None为整页，否则为页面坐标 (x0, y0, x1, y1)）、缩放倍数、颜色模式
+CacheKey = namedtuple('CacheKey', ['page', 'clip', 'zoom', 'colormode'])
+
+
+class PageCache(object):
+    """按字节预算限制的LRU页面缓存
+
+    命中时把条目移到末尾，超出预算时从最久未使用的条目开始淘汰，
+    被固定（pin）的页面区域（当前页及相邻页，按页码和裁剪区域区分）不会被淘汰，
+    同一页的缩放瓦片裁剪区域不同，仍可淘汰。
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # 固定的 (页码, 裁剪区域)
+        self._pinned = set()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """获取缓存的页面图像并更新LRU顺序"""
+        img_data = self._entries.get(key)
+        if img_data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return img_data
+
+    def put(self, key, img_data):
+        """添加页面图像，超出预算时淘汰旧条目"""
+        self.remove(key)
+        self._entries[key] = img_data
+        self.total_bytes += img_data.nbytes
+        self._evict()
+
+    def remove(self, key):
+        img_data = self._entries.pop(key, None)
+        if img_data is not None:
+            self.total_bytes -= img_data.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self._pinned = set()
+        self.total_bytes = 0
+
+    def find_any(self, page, clip):
+        """查找同一页面区域任意缩放倍数的缓存（取最清晰的），用作预览，不计入统计"""
+        best = None
+        for key, img_data in self._entries.items():
+            if key.page == page and key.clip == clip:
+                if best is None or key.zoom > best[0]:
+                    best = (key.zoom, img_data)
+        return best[1] if best else None
+
+    def pin_pages(self, pages):
+        """固定这些页面的整页缓存条目（任意缩放倍数），替换之前的固定集合"""
+        self.pin_regions((page, None) for page in pages)
+
+    def pin_regions(self, regions):
+        """固定这些 (页码, 裁剪区域) 的缓存条目（任意缩放倍数），替换之前的固定集合
+
+        自动裁边时整页的缓存键也带有裁剪区域，要按显示用的区域固定。
+        """
+        self._pinned = set(regions)
+        self._evict()
+
+    def set_budget(self, budget_bytes):
+        """调整字节预算，超出新预算的部分立即淘汰"""
+        self.budget_bytes = max(0, budget_bytes)
+        self._evict()
+
+    def drop(self, predicate):
+        """释放predicate(key)为True的条目（内存紧张时使用，不计入淘汰统计），返回释放的[(键, 页面图像)]"""
+        dropped = [(key, img_data) for key, img_data in self._entries.items() if predicate(key)]
+        for key, img_data in dropped:
+            self.remove(key)
+        return dropped
+
+    def _evict(self):
+        if self.total_bytes <= self.budget_bytes:
+            return
+        for key in list(self._entries):
+            if self.total_bytes <= self.budget_bytes:
+                break
+            if (key.page, key.clip) in self._pinned:
+                continue
+            self.remove(key)
+            self.evictions += 1
+
+    def stats(self):
+        """缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'budget': self.budget_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+# 内存压力等级
+MEMORY_NORMAL = 0
+MEMORY_MODERATE = 1
+MEMORY_HIGH = 2
+MEMORY_CRITICAL = 3
+
+# 进程常驻内存达到上限的这些比例时分别进入 MODERATE / HIGH / CRITICAL
+MEMORY_THRESHOLDS = (0.7, 0.85, 1.0)
+
+
+def process_rss_bytes():
+    """进程的常驻内存（字节），读取/proc/self/statm（Linux/Android），不支持的平台返回None"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class MemoryGovernor(object):
+    """根据进程内存和系统的内存信号给出内存压力等级
+
+    poll()读取进程常驻内存，按占上限的比例得出等级；等级下降时阈值低hysteresis比例，
+    避免在阈值附近来回切换。系统的内存信号（Android的onTrimMemory）通过signal()报告，
+    hold_seconds内等级不低于信号的等级。simulate()强制指定等级，用于在桌面上测试。
+    等级变化时调用on_change(等级)，poll()/signal()/simulate()都应在同一线程中调用。
+    """
+
+    def __init__(self, limit_bytes, on_change, hold_seconds=30.0, hysteresis=0.1, rss_reader=process_rss_bytes):
+        self.limit_bytes = limit_bytes
+        self.on_change = on_change
+        self.hold_seconds = hold_seconds
+        self.hysteresis = hysteresis
+        self.rss_reader = rss_reader
+        self.level = MEMORY_NORMAL
+        self.rss = None
+        self._signal_level = MEMORY_NORMAL
+        self._signal_time = None
+        self._simulated = None
+
+    def rss_level(self, rss):
+        level = MEMORY_NORMAL
+        for index, fraction in enumerate(MEMORY_THRESHOLDS):
+            threshold = self.limit_bytes * fraction
+            if index < self.level:
+                threshold *= 1 - self.hysteresis
+            if rss >= threshold:
+                level = index + 1
+        return level
+
+    def poll(self, now=None):
+        """读取内存占用并更新压力等级"""
+        now = time.time() if now is None else now
+        self.rss = self.rss_reader()
+        if self._simulated is not None:
+            level = self._simulated
+        else:
+            level = MEMORY_NORMAL
+            if self.rss and self.limit_bytes:
+                level = self.rss_level(self.rss)
+            if self._signal_time is not None:
+                if now - self._signal_time < self.hold_seconds:
+                    level = max(level, self._signal_level)
+                else:
+                    self._signal_time = None
+        if level != self.level:
+            self.level = level
+            tracer.count('memory.pressure_change')
+            self.on_change(level)
+        return level
+
+    def signal(self, level, now=None):
+        """系统报告内存紧张，立即生效"""
+        now = time.time() if now is None else now
+        self._signal_level = level
+        self._signal_time = now
+        return self.poll(now)
+
+    def simulate(self, level):
+        """测试用：强制指定压力等级，level为None时恢复按实际内存判断"""
+        self._simulated = level
+        return self.poll()
+
+
+class DisplayListCache(object):
+    """最近使用页面的显示列表（fitz.DisplayList）
+
+    page.get_pixmap()每次都重新解析、解释页面内容流。同一页常常要渲染多次
+    （预览、清晰页面、缩放瓦片、缩略图、夜间模式），从缓存的显示列表光栅化
+    只需解析一次，对扫描页还省去了重复解码图片。
+    显示列表的实际占用无法直接获取，按内容流长度和页面上图片的像素数估算，
+    超出预算时淘汰最久未使用的页面。显示列表属于打开它的文档，只能在同一线程中使用，
+    关闭文档前要先clear()。
+    detect_gray为True时还在gray_pages中按页记录页面是否只有灰度内容（由render_page_image()
+    检查每页第一次的渲染结果得出），之后这些页面直接渲染为8位灰度。
+    """
+
+    def __init__(self, budget_bytes=DISPLAY_LIST_BUDGET, detect_gray=False):
+        self.budget_bytes = budget_bytes
+        self.detect_gray = detect_gray
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self.gray_pages = {}
+
+    def get(self, doc, page_num):
+        entry = self._entries.get(page_num)
+        if entry is not None:
+            self._entries.move_to_end(page_num)
+            self.hits += 1
+            return entry[0]
+        
+        self.misses += 1
+        page = doc[page_num]
+        with tracer.span('render.displaylist', page=page_num):
+            display_list = page.get_displaylist()
+        size = self._estimate_bytes(doc, page)
+        self._entries[page_num] = (display_list, size)
+        self.total_bytes += size
+        while self.total_bytes > self.budget_bytes and len(self._entries) > 1:
+            self.total_bytes -= self._entries.popitem(last=False)[1][1]
+        return display_list
+
+    @staticmethod
+    def _estimate_bytes(doc, page):
+        size = 0
+        try:
+            for xref in page.get_contents():
+                kind, length = doc.xref_get_key(xref, 'Length')
+                if kind == 'int':
+                    size += int(length) * 4
+            for image in page.get_images():
+                width, height, colorspace = image[2], image[3], image[5]
+                channels = 1 if 'Gray' in colorspace else (4 if 'CMYK' in colorspace else 3)
+                size += width * height * channels
+        except Exception:
+            pass
+        return max(size, 64 * 1024)
+
+    def clear(self):
+        self._entries.clear()
+        self.gray_pages.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+            'gray_pages': sum(1 for gray in self.gray_pages.values() if gray),
+        }
+
+
+def gray_samples(pix):
+    """RGB像素的三个通道完全相同（只有灰度内容）时返回单通道的像素数据，否则返回None
+
+    黑字白底的文字页和灰度扫描页渲染结果的三个通道完全相同，
+    任何彩色内容（彩色文字、图片、链接下划线）都会留下通道不相等的像素。
+    """
+    samples = pix.samples
+    red = samples[0::3]
+    if red == samples[1::3] and red == samples[2::3]:
+        return red
+    return None
+
+
+def render_page_image(doc, key, compact=False, display_lists=None):
+    """按缓存键渲染页面（或页面的裁剪区域），提供display_lists时从缓存的显示列表光栅化
+
+    显示列表缓存开启了灰度检测时，只有灰度内容的页面以8位灰度渲染（上传为luminance纹理），
+    占用的内存只有RGB的三分之一，光栅化也更快。每页第一次按RGB渲染并检查结果，
+    不需要额外的探测渲染（探测图会让扫描页的图片按另一种缩小比例再解码一次）。
+    """
+    mat = fitz.Matrix(key.zoom, key.zoom)
+    clip_rect = fitz.Rect(key.clip) if key.clip else None
+    gray = False
+    if display_lists is not None:
+        source = display_lists.get(doc, key.page)
+        if display_lists.detect_gray:
+            gray = display_lists.gray_pages.get(key.page)
+    else:
+        source = doc[key.page]
+    with tracer.span('render.pixmap', page=key.page, zoom=key.zoom):
+        pix = source.get_pixmap(matrix=mat, clip=clip_rect,
+                                colorspace=fitz.csGRAY if gray else fitz.csRGB, alpha=False)
+    if gray is None:
+        with tracer.span('render.gray_check', page=key.page):
+            samples = gray_samples(pix)
+        if samples is not None:
+            pix = fitz.Pixmap(fitz.csGRAY, pix.width, pix.height, samples, False)
+        # 裁剪区域只有灰度不代表整页没有彩色，只记录整页的结果和发现彩色的结果
+        if key.clip is None or samples is None:
+            display_lists.gray_pages[key.page] = samples is not None
+    if key.colormode == 'night':
+        # 不支持着色器时的后备方案：缓存一份反色的页面
+        pix.invert_irect(pix.irect)
+    with tracer.span('render.encode', compact=compact):
+        return PageImage.from_pixmap(pix, compact=compact)
+
+
+def content_bbox(page, zoom=CROP_PROBE_ZOOM, halves=False):
+    """页面内容区域（页面坐标 (x0, y0, x1, y1)），用于自动裁掉空白页边
+
+    以低分辨率灰度渲染页面，找出含有非白色像素的行和列（扫描页没有可用的文字和图形位置，
+    像素扫描对所有页面都适用）。每行/列至少两个深色像素才算内容，忽略零星的噪点。
+    空白页或页边太窄不值得裁剪时返回None。
+    halves为True时返回 (整页, 左半, 右半)：先按页面中线分成两半，再各自探测内容区域
+    （双页扫描的两页页边不同），只渲染一次。
+    """
+    rect = page.rect
+    with tracer.span('crop.probe', page=page.number):
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    mask = pix.samples.translate(_CROP_DARK_TABLE)
+    full = _mask_bbox(mask, pix, 0, pix.width, rect, zoom, tuple(rect))
+    if not halves:
+        return full
+    middle = pix.width // 2
+    left = _mask_bbox(mask, pix, 0, middle, rect, zoom, half_page_region(rect, 'left'))
+    right = _mask_bbox(mask, pix, middle, pix.width, rect, zoom, half_page_region(rect, 'right'))
+    return full, left, right
+
+
+def _mask_bbox(mask, pix, col0, col1, rect, zoom, bounds):
+    """在探测图像的[col0, col1)列中找内容区域，换算为页面坐标并限制在bounds内"""
+    height, stride = pix.height, pix.stride
+    rows = [y for y in range(height) if mask.count(1, y * stride + col0, y * stride + col1) >= 2]
+    if not rows:
+        return None
+    top, bottom = rows[0], rows[-1] + 1
+    # 只在有内容的行之间统计列
+    band = mask[top * stride:bottom * stride]
+    cols = [x for x in range(col0, col1) if band[x::stride].count(1) >= 2]
+    if not cols:
+        return None
+    
+    bx0, by0, bx1, by1 = bounds
+    x0 = max(bx0, rect.x0 + cols[0] / zoom - CROP_PADDING)
+    y0 = max(by0, rect.y0 + top / zoom - CROP_PADDING)
+    x1 = min(bx1, rect.x0 + (cols[-1] + 1) / zoom + CROP_PADDING)
+    y1 = min(by1, rect.y0 + bottom / zoom + CROP_PADDING)
+    if (x1 - x0) * (y1 - y0) > (bx1 - bx0) * (by1 - by0) * (1 - CROP_MIN_GAIN):
+        return None
+    return (round(x0, 1), round(y0, 1), round(x1, 1), round(y1, 1))
+
+
+def file_fingerprint(file_path, block_size=65536):
+    """文件指纹：文件大小 + 修改时间 + 首尾数据块的哈希"""
+    stat = os.stat(file_path)
+    digest = hashlib.sha1(f"{stat.st_size}:{int(stat.st_mtime)}".encode('utf-8'))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(block_size))
+        if stat.st_size > block_size:
+            f.seek(max(stat.st_size - block_size, block_size))
+            digest.update(f.read(block_size))
+    return digest.hexdigest()[:20]
+
+
+def open_document(file_path):
+    """打开PDF文档"""
+    with tracer.span('fitz.open'):
+        return fitz.open(file_path)
+
+
+def fit_zoom(page_width, page_height, view_size, fit_mode='page', half=False):
+    """根据显示区域和适配方式计算渲染缩放倍数
+    
+    view_size为显示区域的像素尺寸，按它算出的倍数已经包含了屏幕DPI。
+    半页模式下按半边页面适配显示区域。
+    """
+    if half:
+        page_width = page_width / 2
+    view_width, view_height = view_size
+    
+    zoom = view_width / page_width
+    if fit_mode == 'page':
+        zoom = min(zoom, view_height / page_height)
+    
+    # 按1/16向上取整，尺寸的微小差异不会产生新的缓存键
+    zoom = math.ceil(zoom * 16) / 16.0
+    return min(max(zoom, MIN_RENDER_ZOOM), MAX_RENDER_ZOOM)
+
+
+def preview_key(key):
+    """低分辨率预览的缓存键"""
+    zoom = max(math.floor(key.zoom * PREVIEW_SCALE * 16) / 16.0, MIN_RENDER_ZOOM)
+    return key._replace(zoom=zoom)
+
+
+def half_page_region(rect, side, crop=None):
+    """半页模式下显示的页面区域（页面坐标），side为'left'或'right'，None为整页
+
+    总是按页面中线分成两半，crop为这一半（或整页）的内容区域，给出时与之取交集。
+    """
+    x0, y0, x1, y1 = rect
+    if side == 'left':
+        x1 = (x0 + x1) / 2
+    elif side == 'right':
+        x0 = (x0 + x1) / 2
+    if crop:
+        cx0, cy0, cx1, cy1 = crop
+        if cx0 < x1 and cx1 > x0 and cy0 < y1 and cy1 > y0:
+            x0, y0, x1, y1 = max(x0, cx0), max(y0, cy0), min(x1, cx1), min(y1, cy1)
+    return (x0, y0, x1, y1)
+
+
+def half_page_pixels(width, height, clip, region):
+    """渲染clip区域（页面坐标）得到的图像中，region对应的像素区域 (x, y, 宽, 高)
+
+    用于纹理的get_region，y从图像底边算起（与上下翻转后的页面纹理一致）。
+    """
+    cx0, cy0, cx1, cy1 = clip
+    scale_x = width / (cx1 - cx0)
+    scale_y = height / (cy1 - cy0)
+    px0 = min(max(int(round((region[0] - cx0) * scale_x)), 0), width - 1)
+    px1 = min(max(int(round((region[2] - cx0) * scale_x)), px0 + 1), width)
+    py0 = min(max(int(round((region[1] - cy0) * scale_y)), 0), height - 1)
+    py1 = min(max(int(round((region[3] - cy0) * scale_y)), py0 + 1), height)
+    return (px0, height - py1, px1 - px0, py1 - py0)
+
+
+# 磁盘缓存格式版本，格式变化时递增，旧版本的文件会被忽略
+DISK_CACHE_VERSION = 1
+DISK_CACHE_MAGIC = b'PDFC'
+DISK_CACHE_HEADER = struct.Struct('<4sHIIBI')
+
+
+class DiskPageCache(object):
+    """磁盘上的二级页面缓存
+
+    按文件指纹和缓存键保存渲染结果（zlib压缩的原始像素），
+    超出容量时按最近使用时间淘汰。写入先写临时文件再重命名，保证原子性。
+    """
+
+    def __init__(self, root, budget_bytes):
+        self.root = os.path.join(root, f"v{DISK_CACHE_VERSION}")
+        self.budget_bytes = budget_bytes
+        self.total_bytes = 0
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _entry_name(self, fingerprint, key):
+        clip = 'full' if key.clip is None else '_'.join('%g' % v for v in key.clip)
+        return f"{fingerprint}_{key.page}_{key.zoom:g}_{clip}_{key.colormode}.page"
+
+    def _ensure_index(self):
+        """首次使用时扫描缓存目录，按修改时间建立LRU顺序"""
+        if self._index is not None:
+            return
+        self._index = OrderedDict()
+        self.total_bytes = 0
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            entries = []
+            for entry in os.scandir(self.root):
+                if entry.name.endswith('.tmp'):
+                    os.remove(entry.path)
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+            for mtime, name, size in sorted(entries):
+                self._index[name] = size
+                self.total_bytes += size
+        except OSError as e:
+            print(f"扫描磁盘缓存失败: {e}")
+
+    def _read(self, name):
+        path = os.path.join(self.root, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, width, height, n, key_len = DISK_CACHE_HEADER.unpack_from(data)
+        if magic != DISK_CACHE_MAGIC or version != DISK_CACHE_VERSION:
+            return None, None
+        offset = DISK_CACHE_HEADER.size
+        key_data = json.loads(data[offset:offset + key_len].decode('utf-8'))
+        clip = tuple(key_data['clip']) if key_data['clip'] else None
+        key = CacheKey(key_data['page'], clip, key_data['zoom'], key_data['colormode'])
+        samples = zlib.decompress(data[offset + key_len:])
+        os.utime(path, None)
+        return key, PageImage(width, height, n, samples=samples)
+
+    def get(self, fingerprint, key):
+        """读取缓存的页面图像，不存在或版本不符时返回None"""
+        name = self._entry_name(fingerprint, key)
+        with self._lock:
+            self._ensure_index()
+            if name not in self._index:
+                return None
+            self._index.move_to_end(name)
+        try:
+            with tracer.span('disk.page_read'):
+                return self._read(name)[1]
+        except (OSError, ValueError, struct.error, zlib.error) as e:
+            print(f"读取磁盘缓存失败: {e}")
+            self._forget(name)
+            return None
+
+    def find_latest(self, fingerprint, page):
+        """查找某页最近使用的任意缩放倍数的缓存，返回 (缓存键, 页面图像)"""
+        prefix = f"{fingerprint}_{page}_"
+        with self._lock:
+            self._ensure_index()
+            names = [name for name in self._index if name.startswith(prefix)]
+        for name in reversed(names):
+            try:
+                key, img_data = self._read(name)
+                if img_data is not None:
+                    return key, img_data
+            except (OSError, ValueError, struct.error, zlib.error):
+                self._forget(name)
+        return None, None
+
+    def contains(self, fingerprint, key):
+        with self._lock:
+            self._ensure_index()
+            return self._entry_name(fingerprint, key) in self._index
+
+    def put(self, fingerprint, key, img_data):
+        """写入页面图像（原子写入），超出容量时淘汰最久未使用的条目"""
+        name = self._entry_name(fingerprint, key)
+        key_data = json.dumps({
+            'page': key.page,
+            'clip': list(key.clip) if key.clip else None,
+            'zoom': key.zoom,
+            'colormode': key.colormode,
+        }).encode('utf-8')
+        header = DISK_CACHE_HEADER.pack(DISK_CACHE_MAGIC, DISK_CACHE_VERSION,
+                                        img_data.width, img_data.height, img_data.n, len(key_data))
+        with tracer.span('disk.page_encode'):
+            body = zlib.compress(img_data.get_samples(), 1)
+        
+        with self._lock:
+            self._ensure_index()
+            path = os.path.join(self.root, name)
+            tmp_path = path + '.tmp'
+            try:
+                with tracer.span('disk.page_write', bytes=len(body)):
+                    with open(tmp_path, 'wb') as f:
+                        f.write(header)
+                        f.write(key_data)
+                        f.write(body)
+                    os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"写入磁盘缓存失败: {e}")
+                return
+            
+            size = len(header) + len(key_data) + len(body)
+            self.total_bytes += size - self._index.pop(name, 0)
+            self._index[name] = size
+            
+            while self.total_bytes > self.budget_bytes and len(self._index) > 1:
+                oldest, oldest_size = self._index.popitem(last=False)
+                self.total_bytes -= oldest_size
+                try:
+                    os.remove(os.path.join(self.root, oldest))
+                except OSError:
+                    pass
+
+    def _forget(self, name):
+        with self._lock:
+            size = self._index.pop(name, None)
+            if size is not None:
+                self.total_bytes -= size
+        try:
+            os.remove(os.path.join(self.root, name))
+        except OSError:
+            pass
+
+
+# 缩略图：每页缩略图放在固定大小的格子（像素）里，多页拼在一张图集中，
+# 界面为每个图集只上传一张纹理。图集按文件指纹保存在磁盘上
+THUMB_CELL = (72, 96)
+ATLAS_COLUMNS = 14
+ATLAS_ROWS = 10
+ATLAS_CELLS = ATLAS_COLUMNS * ATLAS_ROWS
+THUMBNAIL_VERSION = 1
+THUMBNAIL_MAGIC = b'PDFT'
+THUMBNAIL_HEADER = struct.Struct('<4sHHHHH')
+THUMBNAIL_SIZES = struct.Struct(f'<{ATLAS_CELLS * 2}H')
+
+
+class ThumbnailAtlas(object):
+    """一张缩略图图集：ATLAS_COLUMNS x ATLAS_ROWS个格子的RGB像素，行从上到下
+
+    每页的缩略图放在格子左上角，sizes记录各格子中缩略图的实际大小（(0, 0)表示还没有生成）。
+    """
+
+    def __init__(self, index, pixels=None, sizes=None):
+        self.index = index
+        self.width = ATLAS_COLUMNS * THUMB_CELL[0]
+        self.height = ATLAS_ROWS * THUMB_CELL[1]
+        self.pixels = pixels if pixels is not None else bytearray(b'\xff') * (self.width * self.height * 3)
+        self.sizes = sizes if sizes is not None else [(0, 0)] * ATLAS_CELLS
+        self.dirty = False
+
+    @staticmethod
+    def cell_origin(cell):
+        """格子左上角在图集中的位置（像素，y从上往下）"""
+        return (cell % ATLAS_COLUMNS) * THUMB_CELL[0], (cell // ATLAS_COLUMNS) * THUMB_CELL[1]
+
+    def has(self, cell):
+        return self.sizes[cell][0] > 0
+
+    def region(self, cell):
+        """格子中缩略图的区域 (x, y, 宽, 高)，还没有生成时返回None"""
+        width, height = self.sizes[cell]
+        if not width:
+            return None
+        x, y = self.cell_origin(cell)
+        return x, y, width, height
+
+    def put(self, cell, pix):
+        """把fitz.Pixmap（RGB，不超过格子大小）写入格子，格子其余部分为白色"""
+        x, y = self.cell_origin(cell)
+        cell_width, cell_height = THUMB_CELL
+        row_bytes = self.width * 3
+        blank = b'\xff' * (cell_width * 3)
+        samples = pix.samples
+        for row in range(cell_height):
+            offset = (y + row) * row_bytes + x * 3
+            self.pixels[offset:offset + cell_width * 3] = blank
+            if row < pix.height:
+                self.pixels[offset:offset + pix.width * 3] = samples[row * pix.stride:row * pix.stride + pix.width * 3]
+        self.sizes[cell] = (pix.width, pix.height)
+        self.dirty = True
+
+    def cell_pixels(self, cell):
+        """整个格子的像素（上传纹理用）"""
+        x, y = self.cell_origin(cell)
+        cell_width, cell_height = THUMB_CELL
+        row_bytes = self.width * 3
+        return b''.join(bytes(self.pixels[(y + row) * row_bytes + x * 3:(y + row) * row_bytes + (x + cell_width) * 3])
+                        for row in range(cell_height))
+
+    def image(self, cell):
+        """格子中的缩略图，返回PageImage，还没有生成时返回None"""
+        region = self.region(cell)
+        if region is None:
+            return None
+        x, y, width, height = region
+        row_bytes = self.width * 3
+        samples = b''.join(bytes(self.pixels[(y + row) * row_bytes + x * 3:(y + row) * row_bytes + (x + width) * 3])
+                           for row in range(height))
+        return PageImage(width, height, 3, samples=samples)
+
+    def to_bytes(self):
+        header = THUMBNAIL_HEADER.pack(THUMBNAIL_MAGIC, THUMBNAIL_VERSION, THUMB_CELL[0], THUMB_CELL[1],
+                                       ATLAS_COLUMNS, ATLAS_ROWS)
+        sizes = THUMBNAIL_SIZES.pack(*[value for size in self.sizes for value in size])
+        return header + sizes + zlib.compress(bytes(self.pixels), 1)
+
+    @staticmethod
+    def read_sizes(data):
+        """从文件开头读取各格子的缩略图大小，格式不符时返回None"""
+        magic, version, cell_width, cell_height, columns, rows = THUMBNAIL_HEADER.unpack_from(data)
+        if (magic != THUMBNAIL_MAGIC or version != THUMBNAIL_VERSION or (cell_width, cell_height) != THUMB_CELL
+                or (columns, rows) != (ATLAS_COLUMNS, ATLAS_ROWS)):
+            return None
+        values = THUMBNAIL_SIZES.unpack_from(data, THUMBNAIL_HEADER.size)
+        return list(zip(values[0::2], values[1::2]))
+
+    @classmethod
+    def from_bytes(cls, index, data):
+        sizes = cls.read_sizes(data)
+        if sizes is None:
+            return None
+        pixels = bytearray(zlib.decompress(data[THUMBNAIL_HEADER.size + THUMBNAIL_SIZES.size:]))
+        return cls(index, pixels, sizes)
+
+
+class ThumbnailStore(object):
+    """一个文档的缩略图图集
+
+    内存中只保留最近使用的几张图集，其余在需要时从磁盘读取；
+    各图集中已生成的格子在打开时从文件头读取，不用解压像素。
+    """
+
+    def __init__(self, root, fingerprint, max_loaded=6):
+        self.root = os.path.join(root, f"v{THUMBNAIL_VERSION}", fingerprint) if fingerprint else None
+        self.max_loaded = max_loaded
+        self._sizes = {}
+        self._atlases = OrderedDict()
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _path(self, index):
+        return os.path.join(self.root, f"atlas_{index}.thumb")
+
+    def _scan(self):
+        if not self.root or not os.path.isdir(self.root):
+            return
+        header_size = THUMBNAIL_HEADER.size + THUMBNAIL_SIZES.size
+        for name in os.listdir(self.root):
+            if not (name.startswith('atlas_') and name.endswith('.thumb')):
+                continue
+            try:
+                with open(os.path.join(self.root, name), 'rb') as f:
+                    sizes = ThumbnailAtlas.read_sizes(f.read(header_size))
+                if sizes is not None:
+                    self._sizes[int(name[6:-6])] = sizes
+            except (OSError, ValueError, struct.error) as e:
+                print(f"读取缩略图失败: {e}")
+
+    @staticmethod
+    def locate(page_num):
+        """页码对应的 (图集序号, 格子序号)"""
+        return divmod(page_num, ATLAS_CELLS)
+
+    def has(self, page_num):
+        index, cell = self.locate(page_num)
+        sizes = self._sizes.get(index)
+        return sizes is not None and sizes[cell][0] > 0
+
+    def region(self, page_num):
+        """缩略图在图集中的区域 (图集序号, x, y, 宽, 高)，还没有生成时返回None"""
+        index, cell = self.locate(page_num)
+        sizes = self._sizes.get(index)
+        if sizes is None or not sizes[cell][0]:
+            return None
+        x, y = ThumbnailAtlas.cell_origin(cell)
+        return (index, x, y) + tuple(sizes[cell])
+
+    def atlas(self, index, create=False):
+        """取得图集（需要时从磁盘加载），不存在且create为False时返回None"""
+        with self._lock:
+            atlas = self._atlases.get(index)
+            if atlas is not None:
+                self._atlases.move_to_end(index)
+                return atlas
+            if index in self._sizes and self.root:
+                try:
+                    with open(self._path(index), 'rb') as f:
+                        atlas = ThumbnailAtlas.from_bytes(index, f.read())
+                except (OSError, ValueError, struct.error, zlib.error) as e:
+                    print(f"读取缩略图失败: {e}")
+            if atlas is None:
+                if not create:
+                    return None
+                atlas = ThumbnailAtlas(index)
+            self._atlases[index] = atlas
+            while len(self._atlases) > self.max_loaded:
+                oldest_index, oldest = self._atlases.popitem(last=False)
+                if oldest.dirty:
+                    self._write(oldest)
+            return atlas
+
+    def put(self, page_num, pix):
+        index, cell = self.locate(page_num)
+        atlas = self.atlas(index, create=True)
+        with self._lock:
+            atlas.put(cell, pix)
+            self._sizes[index] = atlas.sizes
+            if self._atlases.get(index) is not atlas:
+                # 取得图集之后它又被其他线程挤出了内存，直接写盘
+                self._write(atlas)
+        return atlas
+
+    def image(self, page_num):
+        """页面的缩略图（PageImage），还没有生成时返回None"""
+        if not self.has(page_num):
+            return None
+        index, cell = self.locate(page_num)
+        atlas = self.atlas(index)
+        if atlas is None:
+            return None
+        with self._lock:
+            return atlas.image(cell)
+
+    def atlas_pixels(self, index):
+        """整张图集的 (宽, 高, 像素) 快照（上传纹理用），图集不存在时返回None
+
+        像素在锁内复制，不会读到缩略图线程写了一半的格子。
+        """
+        atlas = self.atlas(index)
+        if atlas is None:
+            return None
+        with self._lock:
+            return atlas.width, atlas.height, bytes(atlas.pixels)
+
+    def cell_pixels(self, page_num):
+        index, cell = self.locate(page_num)
+        atlas = self.atlas(index)
+        if atlas is None:
+            return None
+        with self._lock:
+            return atlas.cell_pixels(cell)
+
+    def save(self):
+        """写入有变化的图集"""
+        with self._lock:
+            for atlas in self._atlases.values():
+                if atlas.dirty:
+                    self._write(atlas)
+
+    def _write(self, atlas):
+        atlas.dirty = False
+        if not self.root:
+            return
+        path = self._path(atlas.index)
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with tracer.span('disk.thumbnail_write', atlas=atlas.index):
+                with open(tmp_path, 'wb') as f:
+                    f.write(atlas.to_bytes())
+                os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"保存缩略图失败: {e}")
+
+
+class ThumbnailWorker(object):
+    """后台生成缩略图的线程
+
+    从指定页开始向后（到末尾后再从头）生成还没有的缩略图，focus()可以把生成位置
+    移到用户正在浏览的地方。每生成一批调用on_update(页码列表)，回调在工作线程中执行。
+    """
+
+    def __init__(self, file_path, store, on_update, batch_size=10):
+        self.file_path = file_path
+        self.store = store
+        self.on_update = on_update
+        self.batch_size = batch_size
+        self._focus = None
+        self._running = False
+
+    def start(self, start_page=0):
+        self._focus = start_page
+        self._running = True
+        thread = threading.Thread(target=self._run, name='Thumbnails')
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def focus(self, page_num):
+        self._focus = page_num
+
+    def _run(self):
+        try:
+            doc = fitz.open(self.file_path)
+        except Exception as e:
+            print(f"缩略图线程打开文件失败: {e}")
+            return
+        
+        total = len(doc)
+        remaining = set(page_num for page_num in range(total) if not self.store.has(page_num))
+        cursor = 0
+        batch = []
+        while self._running and remaining:
+            if self._focus is not None:
+                cursor, self._focus = min(max(self._focus, 0), total - 1), None
+            while cursor not in remaining:
+                cursor = (cursor + 1) % total
+            page_num = cursor
+            remaining.discard(page_num)
+            try:
+                page = doc[page_num]
+                rect = page.rect
+                zoom = min(THUMB_CELL[0] / rect.width, THUMB_CELL[1] / rect.height)
+                with tracer.span('render.thumbnail', page=page_num):
+                    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                self.store.put(page_num, pix)
+                batch.append(page_num)
+            except Exception as e:
+                print(f"生成缩略图 {page_num + 1} 失败: {e}")
+            
+            if len(batch) >= self.batch_size or not remaining:
+                self.store.save()
+                if self._running:
+                    self.on_update(batch)
+                batch = []
+            # 让出GIL，避免和页面渲染争抢
+            time.sleep(0.001)
+        
+        self.store.save()
+        doc.close()
+
+
+class PrefetchPlanner(object):
+    """根据翻页方向和速度决定预取哪些页面
+
+    翻页间隔取指数平均得到翻页速度，按速度估算接下来几秒会翻到的页数，
+    在翻页方向上多预取，反方向只保留一页。用户长时间不翻页或电量低时不再预取。
+    半页模式下每页要翻两次，按页计算的速度减半。
+    同时统计预取命中情况：显示的页面是否已经由预取渲染好。
+    """
+
+    def __init__(self, min_ahead=2, max_ahead=8, lookahead_seconds=3.0, idle_seconds=60.0,
+                 battery_check=None, battery_interval=60.0):
+        self.min_ahead = min_ahead
+        self.max_ahead = max_ahead
+        self.lookahead_seconds = lookahead_seconds
+        self.idle_seconds = idle_seconds
+        self.battery_check = battery_check
+        self.battery_interval = battery_interval
+        self.direction = 1
+        self.turn_interval = None
+        self.last_turn_time = None
+        self._battery_low = False
+        self._battery_checked = None
+        self._prefetched = set()
+        self._last_displayed = None
+        self.issued = 0
+        self.hits = 0
+        self.late = 0
+        self.misses = 0
+
+    def reset(self):
+        """打开新文档时清除翻页记录（统计保留）"""
+        self.direction = 1
+        self.turn_interval = None
+        self.last_turn_time = None
+        self._prefetched = set()
+        self._last_displayed = None
+
+    def record_turn(self, direction, now=None):
+        """记录一次翻页，direction为1（向后）或-1（向前）"""
+        now = time.time() if now is None else now
+        if self.last_turn_time is not None:
+            interval = min(now - self.last_turn_time, self.idle_seconds)
+            if direction != self.direction or self.turn_interval is None:
+                # 方向改变后重新估计速度
+                self.turn_interval = interval
+            else:
+                self.turn_interval = self.turn_interval * 0.6 + interval * 0.4
+        self.direction = direction
+        self.last_turn_time = now
+
+    def velocity(self):
+        """翻页速度（次/秒）"""
+        if not self.turn_interval:
+            return 0.0
+        return 1.0 / max(self.turn_interval, 0.05)
+
+    def is_idle(self, now=None):
+        now = time.time() if now is None else now
+        return self.last_turn_time is not None and now - self.last_turn_time >= self.idle_seconds
+
+    def is_battery_low(self, now=None):
+        """battery_check为None时不检测电量"""
+        if self.battery_check is None:
+            return False
+        now = time.time() if now is None else now
+        if self._battery_checked is None or now - self._battery_checked >= self.battery_interval:
+            self._battery_low = bool(self.battery_check())
+            self._battery_checked = now
+        return self._battery_low
+
+    def lookahead(self, turns_per_page=1, max_ahead=None, min_ahead=None):
+        """翻页方向上预取的页数
+        
+        min_ahead覆盖默认的下限，max_ahead进一步收紧上限（例如按页面占用的内存调整），
+        结果不超过self.max_ahead。
+        """
+        pages_per_second = self.velocity() / turns_per_page
+        ahead = max(min_ahead or self.min_ahead, int(math.ceil(pages_per_second * self.lookahead_seconds)))
+        if max_ahead:
+            return min(ahead, self.max_ahead, max_ahead)
+        return min(ahead, self.max_ahead)
+
+    def plan(self, current_page, total_pages, turns_per_page=1, max_ahead=None, min_ahead=None, now=None):
+        """返回按优先级排列的 [(页码, 优先级)]"""
+        if self.is_idle(now) or self.is_battery_low(now):
+            return []
+        
+        ahead = self.lookahead(turns_per_page, max_ahead, min_ahead)
+        pages = []
+        for distance in range(1, ahead + 1):
+            page_num = current_page + self.direction * distance
+            if 0 <= page_num < total_pages:
+                pages.append((page_num, PRIORITY_PREFETCH + distance - 1))
+        behind = current_page - self.direction
+        if 0 <= behind < total_pages:
+            pages.append((behind, PRIORITY_PREFETCH + ahead))
+        return pages
+
+    def note_prefetch(self, page_num):
+        """记录提交了预取请求的页面"""
+        if page_num not in self._prefetched:
+            self._prefetched.add(page_num)
+            self.issued += 1
+
+    def note_display(self, page_num, cached):
+        """记录页面显示时是否已经在缓存中，同一页多次刷新只统计一次"""
+        if page_num == self._last_displayed:
+            return
+        self._last_displayed = page_num
+        if page_num in self._prefetched:
+            self._prefetched.discard(page_num)
+            if cached:
+                self.hits += 1
+            else:
+                self.late += 1
+        elif not cached:
+            self.misses += 1
+
+    def stats(self):
+        """预取统计：hits预取后命中，late已预取但还没渲染完，misses没有预取"""
+        displayed = self.hits + self.late + self.misses
+        return {
+            'issued': self.issued,
+            'hits': self.hits,
+            'late': self.late,
+            'misses': self.misses,
+            'hit_ratio': (self.hits / displayed) if displayed else 0.0,
+            'direction': self.direction,
+            'velocity': round(self.velocity(), 2),
+        }
+
+
+class RenderWorker(object):
+    """后台渲染线程
+
+    PyMuPDF的文档对象不能跨线程共享，因此工作线程自己打开一份fitz.Document。
+    请求按优先级处理（数字越小越优先），每次翻页递增generation，
+    用户已经离开的页面的请求会被直接丢弃。渲染结果通过deliver回调交回UI线程，
+    回调参数为 (worker, key, 页面图像, 错误)，渲染失败时页面图像为None、错误为异常对象。
+    提供了磁盘缓存时先查磁盘，新渲染的页面先交回UI线程，再以最低优先级写入磁盘。
+    gray为True时只有灰度内容的页面渲染为8位灰度。
+    """
+
+    def __init__(self, file_path, deliver, compact=False, disk_cache=None, fingerprint=None, gray=False):
+        self.file_path = file_path
+        self.deliver = deliver
+        self.compact = compact
+        self.disk_cache = disk_cache
+        self.fingerprint = fingerprint
+        self.display_lists = DisplayListCache(detect_gray=gray)
+        self.generation = 0
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = {}
+        # 后台预渲染的页面，不随翻页作废
+        self._background = set()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        self._running = True
+        thread = threading.Thread(target=self._run, name='RenderWorker')
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._running = False
+        self._queue.put((-1, -1, None))
+
+    def new_generation(self):
+        """开始新一代请求，之前排队的请求全部作废"""
+        with self._lock:
+            self.generation += 1
+            self._pending.clear()
+        return self.generation
+
+    def cancel(self, keys):
+        """作废这些键还在排队的请求（其他请求不受影响）"""
+        with self._lock:
+            for key in keys:
+                self._pending.pop(key, None)
+
+    def submit(self, key, priority, callback, persist=True):
+        """提交渲染请求，key为CacheKey，persist为False时结果不写入磁盘缓存"""
+        with self._lock:
+            queued = self._pending.get(key)
+            if queued is not None and queued[0] <= priority:
+                return False
+            seq = next(self._seq)
+            self._pending[key] = (priority, seq)
+            self._queue.put((priority, seq, (self.generation, key, callback, persist)))
+        return True
+
+    def store(self, key, img_data):
+        """把UI线程已经渲染好的页面交给工作线程写入磁盘缓存（优先级最低，不随翻页作废）"""
+        if self.disk_cache:
+            self._queue.put((PRIORITY_STORE, next(self._seq), (None, key, None, img_data)))
+
+    def prerender(self, keys):
+        """把页面预渲染到磁盘缓存（优先级低于翻页预取，不随翻页作废，结果不交回UI线程）"""
+        if not self.disk_cache:
+            return
+        with self._lock:
+            for key in keys:
+                if key in self._background:
+                    continue
+                self._background.add(key)
+                self._queue.put((PRIORITY_BACKGROUND, next(self._seq), (-1, key, None, True)))
+
+    def _finish(self, key, callback, persist, img_data, error=None):
+        """先把结果交回UI线程，写磁盘（压缩和写文件）排到队列最后，不占用翻页的关键路径"""
+        if error is not None:
+            tracer.count('render.error')
+        if self._running and callback is not None:
+            self.deliver(callback, self, key, img_data, error)
+        if persist and self.disk_cache and img_data is not None:
+            self.store(key, img_data)
+    
+    def _take(self, seq, generation, key):
+        """检查取出的请求是否仍然有效"""
+        with self._lock:
+            if generation == -1:
+                self._background.discard(key)
+                return not self.disk_cache.contains(self.fingerprint, key)
+            if generation != self.generation:
+                return False
+            queued = self._pending.get(key)
+            if queued is None or queued[1] != seq:
+                return False
+            del self._pending[key]
+            return True
+
+    def _run(self):
+        try:
+            doc = fitz.open(self.file_path)
+        except Exception as e:
+            print(f"渲染线程打开文件失败: {e}")
+            return
+        
+        while self._running:
+            priority, seq, job = self._queue.get()
+            if job is None:
+                break
+            
+            generation, key, callback, persist = job
+            if generation is None:
+                # store()提交的写盘任务，persist中是页面图像
+                self.disk_cache.put(self.fingerprint, key, persist)
+                continue
+            if not self._take(seq, generation, key):
+                continue
+            
+            img_data = error = None
+            if self.disk_cache:
+                img_data = self.disk_cache.get(self.fingerprint, key)
+            
+            if img_data is None:
+                try:
+                    img_data = render_page_image(doc, key, compact=self.compact,
+                                                 display_lists=self.display_lists)
+                except Exception as e:
+                    error = e
+            else:
+                persist = False
+            
+            self._finish(key, callback, persist, img_data, error)
+        
+        self.display_lists.clear()
+        doc.close()
+
+
+# 渲染进程中打开的文档（每个进程只保留最近使用的一份）、它的显示列表和已连接的共享内存
+_process_docs = {}
+_process_display_lists = DisplayListCache()
+_process_segments = OrderedDict()
+
+
+def _process_init():
+    # fork出来的子进程继承了父进程的埋点状态，子进程中不记录
+    tracer.enabled = False
+
+
+def _process_ping():
+    return os.getpid()
+
+
+def _process_segment(name):
+    from multiprocessing import shared_memory
+    
+    segment = _process_segments.get(name)
+    if segment is None:
+        # 主进程扩容时会换成新的共享内存，旧的只需要在这里断开
+        while len(_process_segments) >= 8:
+            _process_segments.popitem(last=False)[1].close()
+        segment = _process_segments[name] = shared_memory.SharedMemory(name=name)
+    return segment
+
+
+def _process_render(file_path, key, compact, gray, segment_name, segment_size):
+    """在渲染进程中光栅化页面
+
+    像素数据写入主进程分配的共享内存，放不下时另建一块更大的共享内存，
+    只把共享内存的名字和尺寸传回主进程。
+    """
+    from multiprocessing import shared_memory
+    
+    doc = _process_docs.get(file_path)
+    if doc is None:
+        _process_display_lists.clear()
+        for old_doc in _process_docs.values():
+            old_doc.close()
+        _process_docs.clear()
+        doc = _process_docs[file_path] = fitz.open(file_path)
+    
+    _process_display_lists.detect_gray = gray
+    img_data = render_page_image(doc, key, compact=compact, display_lists=_process_display_lists)
+    data = img_data.png if compact else img_data.samples
+    size = len(data) if compact else img_data.nbytes
+    if size <= segment_size:
+        _process_segment(segment_name).buf[:size] = data
+        name = segment_name
+    else:
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        segment.buf[:size] = data
+        name = segment.name
+        segment.close()
+    return name, size, img_data.width, img_data.height, img_data.n, compact
+
+
+class RenderProcessPool(object):
+    """多进程渲染池（桌面版）
+
+    PyMuPDF光栅化是CPU密集型的，渲染时大部分时间持有GIL，多线程无法利用多核。
+    每个渲染进程自己打开一份文档，渲染结果通过共享内存传回，不经过pickle。
+    共享内存由主进程分配、每个请求借用一块，用完放回重复使用（每次新建共享内存的开销比光栅化一页文字还大）。
+    只使用fork方式创建进程（spawn会在子进程中重新导入界面模块），
+    因此要在创建窗口和OpenGL上下文、启动其他线程之前调用create()，子进程不继承图形驱动的状态。
+    不支持fork或没有共享内存的平台（Android、Windows）上create()返回None，继续使用线程渲染。
+    """
+
+    # 共享内存块的初始大小，放不下的页面会换成更大的一块
+    SEGMENT_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, processes, executor):
+        self.processes = processes
+        self.broken = False
+        self._executor = executor
+        self._segments = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, processes):
+        if processes < 1:
+            return None
+        try:
+            import multiprocessing
+            from multiprocessing import resource_tracker, shared_memory
+            from concurrent.futures import ProcessPoolExecutor
+            if 'fork' not in multiprocessing.get_all_start_methods() or not sys.platform.startswith('linux'):
+                return None
+            # 先在主进程启动共享内存的资源跟踪进程，子进程继承后与主进程共用同一个
+            resource_tracker.ensure_running()
+            # 确认系统支持共享内存（部分容器没有挂载/dev/shm）
+            probe = shared_memory.SharedMemory(create=True, size=1)
+            probe.close()
+            probe.unlink()
+            executor = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork'),
+                                           initializer=_process_init)
+            pool = cls(processes, executor)
+            # fork方式在第一次提交任务时一次创建全部进程，这里只触发fork，不等子进程就绪
+            executor.submit(_process_ping)
+            return pool
+        except Exception as e:
+            print(f"多进程渲染不可用，使用线程渲染: {e}")
+            return None
+
+    def _take_segment(self):
+        from multiprocessing import shared_memory
+        
+        with self._lock:
+            if self._segments:
+                return self._segments.pop()
+        return shared_memory.SharedMemory(create=True, size=self.SEGMENT_BYTES)
+
+    def _return_segment(self, segment):
+        with self._lock:
+            self._segments.append(segment)
+
+    def submit(self, file_path, key, compact, callback, gray=False):
+        """提交渲染请求，完成后在渲染池的管理线程中调用callback(img_data, error)"""
+        segment = self._take_segment()
+        try:
+            future = self._executor.submit(_process_render, file_path, key, compact, gray,
+                                           segment.name, segment.size)
+        except Exception:
+            self._return_segment(segment)
+            raise
+        future.add_done_callback(lambda future: self._on_done(future, segment, callback))
+
+    def _on_done(self, future, segment, callback):
+        from multiprocessing import shared_memory
+        
+        try:
+            name, size, width, height, n, compact = future.result()
+            if name != segment.name:
+                # 页面比共享内存大，渲染进程另建了一块，以后就用这一块
+                larger = shared_memory.SharedMemory(name=name)
+                segment.close()
+                segment.unlink()
+                segment = larger
+            data = bytes(segment.buf[:size])
+        except Exception as e:
+            self._return_segment(segment)
+            callback(None, e)
+            return
+        self._return_segment(segment)
+        if compact:
+            callback(PageImage(width, height, n, png=data), None)
+        else:
+            callback(PageImage(width, height, n, samples=data), None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            segments, self._segments = self._segments, []
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+
+class ProcessRenderWorker(RenderWorker):
+    """把渲染分派到多进程渲染池的后台线程
+
+    请求队列、优先级、generation和磁盘缓存的处理与RenderWorker相同，
+    调度线程只负责分派：同时交给渲染池的请求不超过进程数，其余留在优先级队列中，
+    这样翻页后新的请求仍然排在旧的预取前面。渲染池出错时退回在本线程中渲染。
+    """
+
+    def __init__(self, file_path, deliver, pool, **kwargs):
+        super(ProcessRenderWorker, self).__init__(file_path, deliver, **kwargs)
+        self.pool = pool
+        self._slots = threading.Semaphore(pool.processes)
+        self._doc = None
+
+    def _render_locally(self, key):
+        if self._doc is None:
+            self._doc = fitz.open(self.file_path)
+        return render_page_image(self._doc, key, compact=self.compact, display_lists=self.display_lists)
+
+    def _on_rendered(self, job, img_data, error):
+        """渲染进程完成（在渲染池的管理线程中回调）"""
+        self._slots.release()
+        generation, key, callback, persist = job
+        if error is not None:
+            # 渲染进程异常退出等，改在调度线程中渲染
+            print(f"渲染进程失败，改用线程渲染: {error}")
+            self.pool.broken = True
+            with self._lock:
+                seq = next(self._seq)
+                if generation == -1:
+                    self._background.add(key)
+                else:
+                    self._pending[key] = (PRIORITY_CURRENT, seq)
+                self._queue.put((PRIORITY_CURRENT, seq, job))
+            return
+        self._finish(key, callback, persist, img_data)
+
+    def _run(self):
+        while self._running:
+            self._slots.acquire()
+            priority, seq, job = self._queue.get()
+            if job is None:
+                break
+            
+            generation, key, callback, persist = job
+            if generation is None:
+                self.disk_cache.put(self.fingerprint, key, persist)
+                self._slots.release()
+                continue
+            if not self._take(seq, generation, key):
+                self._slots.release()
+                continue
+            
+            img_data = None
+            if self.disk_cache and generation != -1:
+                img_data = self.disk_cache.get(self.fingerprint, key)
+            if img_data is None and not self.pool.broken:
+                try:
+                    self.pool.submit(self.file_path, key, self.compact,
+                                     lambda img_data, error, job=job: self._on_rendered(job, img_data, error),
+                                     gray=self.display_lists.detect_gray)
+                    continue
+                except Exception as e:
+                    print(f"渲染进程不可用，改用线程渲染: {e}")
+                    self.pool.broken = True
+            
+            self._slots.release()
+            if img_data is None:
+                try:
+                    img_data = self._render_locally(key)
+                except Exception as e:
+                    self._finish(key, callback, False, None, e)
+                    continue
+                self._finish(key, callback, persist, img_data)
+            else:
+                self._finish(key, callback, False, img_data)
+        
+        self.display_lists.clear()
+        if self._doc is not None:
+            self._doc.close()
@@ -0,0 +1,160 @@
+"""性能埋点（不依赖Kivy界面）
+
+热点路径用tracer.span()计时、tracer.count()计数。未启用时span()直接返回一个
+共享的空对象，count()只做一次属性判断，几乎没有开销。
+启用后每个span记录一条事件（字段与Chrome trace event的"X"事件相同），
+按名称汇总次数、总耗时、最近一次和最大耗时，供性能面板显示；
+调用flush()把积累的事件以JSON Lines格式追加到跟踪文件，文件超过大小上限时轮转。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NullSpan(object):
+    """未启用埋点时使用的空span"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'fields', 'start')
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.tracer.record(self.name, self.start, time.perf_counter() - self.start, self.fields)
+        return False
+
+
+class Tracer(object):
+    """span计时和计数器
+
+    trace_path为None时只在内存中汇总（性能面板用），不写跟踪文件。
+    """
+
+    def __init__(self, max_events=20000):
+        self.enabled = False
+        self.trace_path = None
+        self.max_bytes = 2 * 1024 * 1024
+        self.backups = 3
+        self.counters = {}
+        self.spans = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self, trace_path=None, max_bytes=None, backups=None):
+        self.trace_path = trace_path
+        if max_bytes:
+            self.max_bytes = max_bytes
+        if backups is not None:
+            self.backups = backups
+        self.enabled = True
+
+    def disable(self):
+        self.flush()
+        self.enabled = False
+
+    def span(self, name, **fields):
+        """with tracer.span('render.pixmap', page=3): ..."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, fields)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name, start, duration, fields=None):
+        """记录一次耗时（秒），start为time.perf_counter()的值"""
+        if not self.enabled:
+            return
+        duration_ms = duration * 1000
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = {'count': 0, 'total_ms': 0.0, 'last_ms': 0.0, 'max_ms': 0.0}
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['last_ms'] = duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            if self.trace_path:
+                self._events.append({
+                    'name': name,
+                    'ph': 'X',
+                    'ts': int((start - self._origin) * 1000000),
+                    'dur': int(duration * 1000000),
+                    'tid': threading.current_thread().name,
+                    'args': fields or {},
+                })
+
+    def span_stats(self, name):
+        with self._lock:
+            stats = self.spans.get(name)
+            return dict(stats) if stats else None
+
+    def snapshot(self):
+        """计数器和span汇总的副本"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'spans': dict((name, dict(stats)) for name, stats in self.spans.items()),
+            }
+
+    def flush(self):
+        """把积累的事件追加写入跟踪文件（超过大小上限时先轮转）"""
+        if not self.trace_path:
+            return
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        if not events:
+            return
+        try:
+            self._rotate()
+            with open(self.trace_path, 'a', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+        except OSError as e:
+            print(f"写入性能跟踪文件失败: {e}")
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.trace_path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = f'{self.trace_path}.{i}'
+            if os.path.exists(older):
+                os.replace(older, f'{self.trace_path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.trace_path, self.trace_path + '.1')
+        else:
+            os.remove(self.trace_path)
+
+
+# 全局的埋点对象，pdf_core和界面共用
+tracer = Tracer()
@@ -0,0 +1,144 @@
+"""main.py中的搜索索引和内存压力的逐级处理（需要Kivy和PyMuPDF，没有时跳过）"""
+import os
+import time
+
+import pytest
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+pytest.importorskip('kivy')
+fitz = pytest.importorskip('fitz')
+
+import main  # noqa: E402
+from kivy.clock import Clock  # noqa: E402
+from pdf_core import MEMORY_NORMAL, MEMORY_MODERATE, MEMORY_HIGH, MEMORY_CRITICAL  # noqa: E402
+
+
+def pump(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        Clock.tick()
+        time.sleep(0.01)
+
+
+def make_pdf(path, pages=12):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {page_num + 1} hello world", fontsize=20)
+    doc.save(path)
+    doc.close()
+
+
+def test_search_index_round_trip(tmp_path):
+    index_path = str(tmp_path / 'index.jsonl')
+    index = main.SearchIndex(index_path)
+    index.total_pages = 3
+    index._index_page(0, [(10, 20, 110, 40, 'Hello'), (120, 20, 220, 40, 'world')])
+    index._index_page(1, [(10, 20, 110, 40, 'hello')])
+    index._save()
+    index._index_page(2, [(10, 20, 110, 40, 'World')])
+    index._save()
+
+    loaded = main.SearchIndex(index_path)
+    loaded._load()
+    assert loaded.total_pages == 3
+    assert loaded.complete
+    assert loaded.words == index.words
+    assert [page for page, boxes in loaded.search('hello')] == [0, 1]
+    assert [page for page, boxes in loaded.search('hello wor')] == [0]
+
+
+def test_search_index_reindexes_truncated_segment(tmp_path):
+    index_path = str(tmp_path / 'index.jsonl')
+    index = main.SearchIndex(index_path)
+    index.total_pages = 2
+    index._index_page(0, [(10, 20, 110, 40, 'hello')])
+    index._save()
+    with open(index_path, 'a', encoding='utf-8') as f:
+        f.write('{"pages": [1], "wor')
+
+    loaded = main.SearchIndex(index_path)
+    loaded._load()
+    assert loaded.pages == {0}
+    loaded._index_page(1, [(10, 20, 110, 40, 'world')])
+    loaded._save()
+
+    reloaded = main.SearchIndex(index_path)
+    reloaded._load()
+    assert reloaded.pages == {0, 1}
+    assert [page for page, boxes in reloaded.search('world')] == [1]
+
+
+def test_memory_pressure_steps_and_restore(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_path = str(tmp_path / 'doc.pdf')
+    make_pdf(file_path)
+    layout = main.MainLayout()
+    try:
+        layout.load_pdf_file(file_path)
+        pump(1.0)
+        full_budget = layout.cache_budget_mb * 1024 * 1024
+        assert layout.page_cache.budget_bytes == full_budget
+
+        layout.memory_governor.simulate(MEMORY_MODERATE)
+        assert layout.memory_pressure == MEMORY_MODERATE
+        assert layout.page_cache.budget_bytes == full_budget // 2
+        assert set(key.page for key in layout.page_cache._entries) <= {layout.current_page}
+        # 预取暂停
+        issued = layout.prefetch_planner.issued
+        layout._preload_adjacent_pages()
+        assert layout.prefetch_planner.issued == issued
+
+        layout.memory_governor.simulate(MEMORY_HIGH)
+        assert layout.page_cache.budget_bytes == full_budget // 4
+        assert set(layout.page_cache._entries) <= {layout._displayed_key}
+
+        layout.memory_governor.simulate(MEMORY_CRITICAL)
+        assert layout.render_scale == main.LOW_MEMORY_RENDER_SCALE
+        pump(1.0)
+        low_zoom = layout._displayed_key.zoom
+        assert low_zoom == pytest.approx(layout._current_page_key().zoom)
+
+        layout.memory_governor.simulate(None)
+        assert layout.memory_pressure == MEMORY_NORMAL
+        assert layout.render_scale == 1.0
+        assert layout.page_cache.budget_bytes == full_budget
+        pump(1.0)
+        assert layout._displayed_key.zoom == pytest.approx(low_zoom / main.LOW_MEMORY_RENDER_SCALE)
+        # 预取在下次翻页时恢复
+        layout.next_page(None)
+        pump(0.5)
+        assert layout.prefetch_planner.issued > issued
+    finally:
+        layout.show_file_list()
+        layout.stop_render_pool()
+
+
+def test_library_index_rereads_files_changed_in_unchanged_directory(tmp_path):
+    library = tmp_path / 'books'
+    library.mkdir()
+    pdf_path = str(library / 'book.pdf')
+    make_pdf(pdf_path, pages=3)
+    index = main.LibraryIndex(str(tmp_path / 'library.json'), [str(library)])
+    batches = []
+    index._scan(batches.extend, lambda: None, 50)
+    assert index.files[pdf_path]['pages'] == 3
+
+    # 原地替换文件内容：目录的修改时间不变
+    dir_mtime = os.stat(library).st_mtime
+    make_pdf(pdf_path + '.new', pages=5)
+    with open(pdf_path + '.new', 'rb') as src, open(pdf_path, 'wb') as dst:
+        dst.write(src.read())
+    os.remove(pdf_path + '.new')
+    os.utime(library, (dir_mtime, dir_mtime))
+    os.utime(pdf_path, (dir_mtime + 10, dir_mtime + 10))
+
+    batches.clear()
+    index._scan(batches.extend, lambda: None, 50)
+    assert index.files[pdf_path]['pages'] == 5
+    assert [path for path, info in batches] == [pdf_path]
+
+    # 没有变化时不再报告
+    batches.clear()
+    index._scan(batches.extend, lambda: None, 50)
+    assert batches == []
@@ -0,0 +1,188 @@
+"""pdf_core中不依赖界面的部分"""
+import os
+import struct
+
+from pdf_core import (
+    PRIORITY_PREFETCH, CacheKey, PageCache, PageImage, DiskPageCache, PrefetchPlanner,
+    MemoryGovernor, MEMORY_NORMAL, MEMORY_MODERATE, MEMORY_HIGH, MEMORY_CRITICAL,
+    DISK_CACHE_VERSION,
+)
+
+
+def make_image(width=100, height=100, n=3):
+    return PageImage(width, height, n, samples=bytes(width * height * n))
+
+
+def test_page_cache_keeps_pinned_cropped_page_under_pressure():
+    crop = (42.0, 30.0, 550.0, 800.0)
+    current = CacheKey(5, crop, 1.5, 'rgb')
+    tile = CacheKey(5, (42.0, 30.0, 170.0, 158.0), 4, 'rgb')
+    cache = PageCache(budget_bytes=make_image().nbytes * 3)
+    cache.put(current, make_image())
+    cache.put(tile, make_image())
+    cache.pin_regions([(5, crop)])
+    for page in range(10, 20):
+        cache.put(CacheKey(page, None, 1.5, 'rgb'), make_image())
+    assert current in cache
+    assert tile not in cache
+    assert cache.total_bytes <= cache.budget_bytes + make_image().nbytes
+
+
+def test_page_cache_pin_pages_only_protects_full_pages():
+    cache = PageCache(budget_bytes=make_image().nbytes * 2)
+    full = CacheKey(1, None, 1.0, 'rgb')
+    cropped = CacheKey(1, (10.0, 10.0, 90.0, 90.0), 1.0, 'rgb')
+    cache.put(full, make_image())
+    cache.put(cropped, make_image())
+    cache.pin_pages([1])
+    cache.put(CacheKey(2, None, 1.0, 'rgb'), make_image())
+    cache.put(CacheKey(3, None, 1.0, 'rgb'), make_image())
+    assert full in cache
+    assert cropped not in cache
+
+
+def test_page_cache_budget_evicts_least_recently_used():
+    cache = PageCache(budget_bytes=make_image().nbytes * 2)
+    first, second, third = (CacheKey(page, None, 1.0, 'rgb') for page in range(3))
+    cache.put(first, make_image())
+    cache.put(second, make_image())
+    assert cache.get(first) is not None
+    cache.put(third, make_image())
+    assert second not in cache
+    assert first in cache and third in cache
+    assert cache.evictions == 1
+    cache.set_budget(make_image().nbytes)
+    assert len(cache) == 1 and third in cache
+
+
+def test_page_cache_drop_is_not_counted_as_eviction():
+    cache = PageCache(budget_bytes=make_image().nbytes * 4)
+    for page in range(3):
+        cache.put(CacheKey(page, None, 1.0, 'rgb'), make_image())
+    dropped = cache.drop(lambda key: key.page != 1)
+    assert sorted(key.page for key, img_data in dropped) == [0, 2]
+    assert len(cache) == 1
+    assert cache.total_bytes == make_image().nbytes
+    assert cache.evictions == 0
+
+
+def test_memory_governor_levels_follow_rss_with_hysteresis():
+    rss = [0]
+    changes = []
+    governor = MemoryGovernor(1000, changes.append, rss_reader=lambda: rss[0])
+    rss[0] = 700
+    assert governor.poll(now=0) == MEMORY_MODERATE
+    rss[0] = 1000
+    assert governor.poll(now=1) == MEMORY_CRITICAL
+    # 降级时阈值低10%：降到85%以下但还在76.5%以上时保持HIGH
+    rss[0] = 840
+    assert governor.poll(now=2) == MEMORY_HIGH
+    rss[0] = 600
+    assert governor.poll(now=3) == MEMORY_NORMAL
+    assert changes == [MEMORY_MODERATE, MEMORY_CRITICAL, MEMORY_HIGH, MEMORY_NORMAL]
+
+
+def test_memory_governor_signal_holds_level():
+    governor = MemoryGovernor(1000, lambda level: None, hold_seconds=30, rss_reader=lambda: 100)
+    assert governor.signal(MEMORY_HIGH, now=0) == MEMORY_HIGH
+    assert governor.poll(now=10) == MEMORY_HIGH
+    assert governor.poll(now=31) == MEMORY_NORMAL
+
+
+def test_memory_governor_simulate_and_restore():
+    changes = []
+    governor = MemoryGovernor(1000, changes.append, rss_reader=lambda: 100)
+    for level in (MEMORY_MODERATE, MEMORY_HIGH, MEMORY_CRITICAL):
+        assert governor.simulate(level) == level
+    assert governor.simulate(None) == MEMORY_NORMAL
+    assert changes == [MEMORY_MODERATE, MEMORY_HIGH, MEMORY_CRITICAL, MEMORY_NORMAL]
+
+
+def test_prefetch_planner_follows_direction_and_caps_lookahead():
+    planner = PrefetchPlanner(min_ahead=2, max_ahead=8, lookahead_seconds=3.0, idle_seconds=60.0)
+    assert planner.plan(5, 100, now=0) == [(6, PRIORITY_PREFETCH), (7, PRIORITY_PREFETCH + 1),
+                                           (4, PRIORITY_PREFETCH + 2)]
+    # 快速向前翻页：预取的页数按速度增加，但不超过max_ahead
+    for step in range(10):
+        planner.record_turn(-1, now=step * 0.1)
+    plan = planner.plan(50, 100, now=1.0)
+    assert [page for page, priority in plan] == list(range(49, 41, -1)) + [51]
+    assert planner.lookahead(max_ahead=3) == 3
+    assert planner.plan(1, 100, now=1.0)[:2] == [(0, PRIORITY_PREFETCH), (2, PRIORITY_PREFETCH + 8)]
+
+
+def test_prefetch_planner_pauses_when_idle_or_battery_low():
+    planner = PrefetchPlanner(idle_seconds=60.0)
+    planner.record_turn(1, now=0)
+    assert planner.plan(3, 10, now=61) == []
+    low = PrefetchPlanner(battery_check=lambda: True)
+    assert low.plan(3, 10, now=0) == []
+
+
+def test_prefetch_planner_counts_hits_and_misses():
+    planner = PrefetchPlanner()
+    planner.note_prefetch(4)
+    planner.note_prefetch(5)
+    planner.note_display(4, cached=True)
+    planner.note_display(4, cached=True)
+    planner.note_display(5, cached=False)
+    planner.note_display(9, cached=False)
+    stats = planner.stats()
+    assert (stats['issued'], stats['hits'], stats['late'], stats['misses']) == (2, 1, 1, 1)
+
+
+def test_disk_page_cache_round_trip(tmp_path):
+    cache = DiskPageCache(str(tmp_path), 1024 * 1024)
+    key = CacheKey(3, (10.0, 20.0, 300.0, 400.0), 1.5, 'gray')
+    img_data = PageImage(4, 2, 1, samples=bytes(range(8)))
+    cache.put('abc', key, img_data)
+    assert cache.contains('abc', key)
+    assert not cache.contains('other', key)
+    loaded = cache.get('abc', key)
+    assert (loaded.width, loaded.height, loaded.n) == (4, 2, 1)
+    assert bytes(loaded.samples) == bytes(range(8))
+    assert cache.find_latest('abc', 3)[0] == key
+    # 写入通过临时文件替换，不留下.tmp文件
+    assert not [name for name in os.listdir(cache.root) if name.endswith('.tmp')]
+
+
+def test_disk_page_cache_ignores_other_versions_and_leftover_tmp(tmp_path):
+    cache = DiskPageCache(str(tmp_path), 1024 * 1024)
+    key = CacheKey(0, None, 1.0, 'rgb')
+    cache.put('abc', key, make_image(10, 10))
+    path = os.path.join(cache.root, cache._entry_name('abc', key))
+    with open(path, 'r+b') as f:
+        data = bytearray(f.read())
+        struct.pack_into('<H', data, 4, DISK_CACHE_VERSION + 1)
+        f.seek(0)
+        f.write(data)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(b'partial')
+    reopened = DiskPageCache(str(tmp_path), 1024 * 1024)
+    assert reopened.get('abc', key) is None
+    assert not os.path.exists(path + '.tmp')
+    # 不同版本的缓存放在各自的目录中
+    assert reopened.root.endswith(f"v{DISK_CACHE_VERSION}")
+
+
+def test_disk_page_cache_evicts_oldest_over_budget(tmp_path):
+    cache = DiskPageCache(str(tmp_path), 1)
+    first = CacheKey(0, None, 1.0, 'rgb')
+    second = CacheKey(1, None, 1.0, 'rgb')
+    cache.put('abc', first, make_image(10, 10))
+    cache.put('abc', second, make_image(10, 10))
+    assert not cache.contains('abc', first)
+    assert cache.contains('abc', second)
+    assert len(os.listdir(cache.root)) == 1
+
+
+def test_page_image_crop_copies_only_the_region():
+    width, height, n = 6, 4, 3
+    samples = bytes(range(width * height * n))
+    expected = b''.join(samples[row * width * n + 2 * n:row * width * n + 5 * n] for row in range(1, 3))
+    for source in (samples, memoryview(samples), bytearray(samples)):
+        cropped = PageImage(width, height, n, samples=source).crop(2, 1, 5, 3)
+        assert (cropped.width, cropped.height) == (3, 2)
+        assert cropped.samples == expected
+    rows = PageImage(width, height, n, samples=memoryview(samples)).crop(0, 1, width, 3)
+    assert rows.samples == samples[width * n:3 * width * n]